@@ -0,0 +1,71 @@
+"""
+Contention benchmark for chain allocation.
+
+PRODUCERS threads call HalogenEvents.chain() (and a few new_context_chain()) at the same time.
+Measures the total allocation rate and checks that no chain was handed out twice. The old
+allocator (a class level lock around every allocation) is measured for comparison.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/chains.py
+"""
+
+import threading, time
+
+from halogen.base import HalogenEvents
+from halogen.base.chain import Chain
+
+
+PRODUCERS = 16
+CHAINS = 50_000
+CONTEXT_EVERY = 100
+
+
+class LegacyAllocator():
+	"How chains used to be allocated."
+	_lock = threading.Lock()
+	_intern_chain = Chain(0, 0)
+	_current_context = 0
+
+	@classmethod
+	def chain(cls) -> Chain:
+		chain = cls._intern_chain
+		with cls._lock:
+			cls._intern_chain = Chain(0, chain.flow + 1)
+		return chain
+
+	@classmethod
+	def new_context_chain(cls) -> Chain:
+		with cls._lock: cls._current_context += 1
+		return Chain(cls._current_context, 0)
+
+
+def run(chain, new_context_chain) -> tuple[float, int, int]:
+	results: list[list[Chain]] = [[] for _ in range(PRODUCERS)]
+	barrier = threading.Barrier(PRODUCERS + 1)
+
+	def produce(out: list[Chain]):
+		barrier.wait()
+		for i in range(CHAINS):
+			out.append(new_context_chain() if i % CONTEXT_EVERY == 0 else chain())
+
+	threads = [threading.Thread(target = produce, args = (out,)) for out in results]
+	for t in threads: t.start()
+
+	barrier.wait()
+	start = time.perf_counter()
+	for t in threads: t.join()
+	elapsed = time.perf_counter() - start
+
+	chains = [c for out in results for c in out]
+	unique = len(set((c.context, c.flow) for c in chains))
+	return len(chains) / elapsed, len(chains), unique
+
+
+def main():
+	for label, allocator in (("legacy", LegacyAllocator), ("current", HalogenEvents)):
+		rate, total, unique = run(allocator.chain, allocator.new_context_chain)
+		status = "OK" if unique == total else f"DUPLICATES: {total - unique}"
+		print(f"{label:<8} {PRODUCERS} threads: {rate:12,.0f} chains/s  unique: {status}")
+
+
+if __name__ == "__main__":
+	main()
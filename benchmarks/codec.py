@@ -0,0 +1,78 @@
+"""
+Benchmark for the event codecs.
+
+Encodes and decodes an event of every type a client and the server send each other, the way it
+was done before the codecs (asdict + json.dumps, json.loads + the type lookup) and with the json
+and binary codecs. Prints the time per event and the size of the message.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/codec.py
+"""
+
+import json, time
+from dataclasses import asdict
+from collections.abc import Callable
+
+from halogen.base import HalogenEvents, Chain
+from halogen.modules.server.codec import JSON, BINARY, decode
+
+
+N = 20_000
+
+
+def events() -> list[HalogenEvents.Event]:
+	chain = Chain(4, 12)
+	t = HalogenEvents.make_timestamp()
+	return [
+		HalogenEvents.UserInputEvent("halogen.ctl/cli", t, chain, "What is on my calendar today?"),
+		HalogenEvents.CommandEvent("halogen.ctl/cli", t, chain, "core", "stats", ["show"]),
+		HalogenEvents.CommandExecutedEvent("command", t, chain, ("core", "stats", ["show"]), True, "x" * 800),
+		HalogenEvents.ConfirmationEvent("tasks", t, chain, "Delete the file?", ["yes", "no"], None),
+		HalogenEvents.ErrorEvent("server", t, chain, "Something went wrong."),
+		HalogenEvents.AIResponseEvent(
+			"model", t, chain, "Here is what I found. " * 20, {"mood" : "happy", "sources" : ["a", "b"]}
+		),
+		HalogenEvents.ClientActivationEvent("server", t, chain, "Client successfully registered"),
+		HalogenEvents.TaskCompletionEvent("tasks", t, chain, "files", "read_file", ["notes.txt"], True, "y" * 4000)
+	]
+
+
+def old_encode(event: HalogenEvents.Event) -> bytes:
+	return json.dumps({"type" : event.__class__.__name__, "payload" : asdict(event)}).encode()
+
+
+def old_decode(message: bytes) -> HalogenEvents.Event:
+	d = json.loads(message)
+	chain = d["payload"].pop("chain")
+	event_type = HalogenEvents.serialize(d["type"])
+	return event_type(**d["payload"], chain = Chain(chain["context"], chain["flow"]))
+
+
+def per_call(func: Callable, arg) -> float:
+	start = time.perf_counter()
+	for _ in range(N): func(arg)
+	return (time.perf_counter() - start) / N * 1e9
+
+
+def main():
+	ways = (
+		("asdict+json", old_encode, old_decode),
+		("json codec", JSON.encode, decode),
+		("binary codec", BINARY.encode, decode)
+	)
+
+	print(f"{'event':<22} {'':<13} {'encode':>9} {'decode':>9} {'bytes':>7}")
+
+	for event in events():
+		name = type(event).__name__
+		for label, encode, dec in ways:
+			message = encode(event)
+			assert type(dec(message)) is type(event)
+			print(
+				f"{name:<22} {label:<13} {per_call(encode, event):>7.0f}ns " \
+				f"{per_call(dec, message):>7.0f}ns {len(message):>7}"
+			)
+			name = ""
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,131 @@
+"""
+Benchmark for the core main loop.
+
+Measures:
+1) How many times an idle core wakes up per second.
+2) How long the core takes to act on a ShutdownEvent while the bus is flooded with 10k events/s.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/core_loop.py
+"""
+
+import threading, time, queue
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.core import HalogenCore
+from halogen.core.dispatch import DispatchTable
+
+
+FLOOD_RATE = 10_000
+IDLE_SECONDS = 2.0
+
+
+class StubManager():
+	"Stands in for HalogenModuleManager so the loop can run without any modules."
+
+	def start_modules(self, dev = False): pass
+	def end_modules(self): return None
+	def __init__(self, core: HalogenCore):
+		self.dispatch_table = DispatchTable([(t, core.handle) for t in core.core_events])
+
+
+def make_core() -> HalogenCore:
+	core = HalogenCore()
+	core.is_running = True
+	core.shutdown_requested = False
+	core.restart_requested = False
+	core.config = HalogenConfig("linux", Path("."), {}, False)
+	core.runtime = "threads"
+	core.batch_size = 64
+	core.manager = StubManager(core)
+	return core
+
+
+def log_event() -> HalogenEvents.LogEvent:
+	return HalogenEvents.LogEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.Chain(0, 0), "debug", "flood"
+	)
+
+
+def shutdown_event() -> HalogenEvents.ShutdownEvent:
+	return HalogenEvents.ShutdownEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.Chain(0, 0), False, "benchmark"
+	)
+
+
+def flood(emit, stop: threading.Event):
+	"Emits events at roughly FLOOD_RATE per second in small bursts."
+	burst = 100
+	interval = burst / FLOOD_RATE
+	next_burst = time.perf_counter()
+	while not stop.is_set():
+		for _ in range(burst): emit(log_event())
+		next_burst += interval
+		delay = next_burst - time.perf_counter()
+		if delay > 0: time.sleep(delay)
+
+
+def idle_wakeups() -> float:
+	core = make_core()
+	wakeups = 0
+	receive_batch = core.eventbus.receive_batch
+
+	def counting_receive(*args, **kwargs):
+		nonlocal wakeups
+		wakeups += 1
+		return receive_batch(*args, **kwargs)
+
+	core.eventbus.receive_batch = counting_receive
+
+	t = threading.Thread(target = core.run)
+	t.start()
+	time.sleep(IDLE_SECONDS)
+	core.eventbus.emit(shutdown_event())
+	t.join()
+
+	# the final wakeup is the shutdown event itself
+	return (wakeups - 1) / IDLE_SECONDS
+
+
+def shutdown_latency() -> float:
+	core = make_core()
+	stop = threading.Event()
+
+	producer = threading.Thread(target = flood, args = (core.eventbus.emit, stop))
+	t = threading.Thread(target = core.run)
+	t.start()
+	producer.start()
+
+	time.sleep(1.0)
+	start = time.perf_counter()
+	core.eventbus.emit(shutdown_event())
+	t.join()
+	latency = time.perf_counter() - start
+
+	stop.set()
+	producer.join()
+	return latency
+
+
+def legacy_idle_wakeups() -> float:
+	"The old loop polled a queue.Queue with a 50ms timeout."
+	events: queue.Queue = queue.Queue()
+	wakeups = 0
+	end = time.perf_counter() + IDLE_SECONDS
+	while time.perf_counter() < end:
+		try:
+			events.get(True, 0.05)
+		except queue.Empty:
+			pass
+		wakeups += 1
+	return wakeups / IDLE_SECONDS
+
+
+def main():
+	print(f"legacy idle wakeups/s : {legacy_idle_wakeups():.1f}")
+	print(f"idle wakeups/s        : {idle_wakeups():.1f}")
+	print(f"shutdown latency under {FLOOD_RATE} events/s : {shutdown_latency() * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+	main()
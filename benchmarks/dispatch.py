@@ -0,0 +1,129 @@
+"""
+Benchmark of the per-event dispatch overhead in the core.
+
+Compares the old pass_events (core event list scan, defined events check, then the module list
+lookup) against the compiled DispatchTable, with MODULES no-op modules subscribed to a few events
+each. After a warmup, the three variants are run in turn RUNS times and the best run of each is
+reported, in nanoseconds per dispatched event.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/dispatch.py
+"""
+
+import time
+from collections.abc import Callable
+
+from halogen.base import HalogenEvents
+from halogen.core.dispatch import DispatchTable
+
+
+EVENTS = 100_000
+MODULES = 6
+RUNS = 15
+
+
+def noop(event: HalogenEvents.Event): pass
+
+
+def make_events() -> list[HalogenEvents.Event]:
+	chain = HalogenEvents.Chain(0, 0)
+	ts = HalogenEvents.make_timestamp()
+	return [
+		HalogenEvents.LogEvent("bench", ts, chain, "debug", "message"),
+		HalogenEvents.UserInputEvent("bench", ts, chain, "hello"),
+		HalogenEvents.AIResponseEvent("bench", ts, chain, "hi", {}),
+		HalogenEvents.TaskEvent("bench", ts, chain, "ns", "task", []),
+		HalogenEvents.InitCompleteEvent("bench", ts, chain)
+	]
+
+
+def subscriptions() -> list[tuple[type[HalogenEvents.Event], object]]:
+	subscribed = [
+		HalogenEvents.LogEvent,
+		HalogenEvents.UserInputEvent,
+		HalogenEvents.AIResponseEvent,
+		HalogenEvents.TaskEvent
+	]
+	# every module gets its own function so they are not merged as duplicates
+	return [(event, lambda e: None) for _ in range(MODULES) for event in subscribed]
+
+
+Run = Callable[[], float]
+
+
+def legacy() -> Run:
+	core_events = [HalogenEvents.ShutdownEvent, HalogenEvents.RestartEvent]
+	dispatch_map: dict = {}
+	for event, deliver in subscriptions():
+		dispatch_map.setdefault(event, []).append(deliver)
+
+	def pass_events(event):
+		event_type = type(event)
+		if event_type in core_events: noop(event)
+		if event_type not in dispatch_map.keys(): return
+		for deliver in dispatch_map[event_type]: deliver(event)
+
+	return lambda: measure(pass_events)
+
+
+def table() -> Run:
+	subs = [(HalogenEvents.ShutdownEvent, noop), (HalogenEvents.RestartEvent, noop)]
+	table = DispatchTable(subs + subscriptions())
+
+	def pass_events(event):
+		for deliver in table[type(event)]: deliver(event)
+
+	return lambda: measure(pass_events)
+
+
+def baseline() -> Run:
+	"Just calling the handlers, the part both versions have to do anyway."
+	dispatch_map: dict = {}
+	for event, deliver in subscriptions():
+		dispatch_map.setdefault(event, []).append(deliver)
+
+	handlers = [dispatch_map.get(type(e), []) for e in make_events()]
+	events = make_events()
+	n = EVENTS // len(events)
+
+	def run() -> float:
+		start = time.perf_counter()
+		for _ in range(n):
+			for event, targets in zip(events, handlers):
+				for deliver in targets: deliver(event)
+		return (time.perf_counter() - start) / (n * len(events)) * 1e9
+
+	return run
+
+
+def measure(pass_events) -> float:
+	events = make_events()
+	n = EVENTS // len(events)
+
+	start = time.perf_counter()
+	for _ in range(n):
+		for event in events: pass_events(event)
+	return (time.perf_counter() - start) / (n * len(events)) * 1e9
+
+
+def best(runs: list[Run]) -> list[float]:
+	"The best time of every variant, run in turn so they all see the same noise."
+	for run in runs: run() # warmup
+
+	times: list[list[float]] = [[] for _ in runs]
+	for _ in range(RUNS):
+		for run, results in zip(runs, times):
+			results.append(run())
+
+	return [min(results) for results in times]
+
+
+def main():
+	base, old, new = best([baseline(), legacy(), table()])
+	print(f"best of {RUNS} runs")
+	print(f"handler calls only : {base:7.1f} ns/event")
+	print(f"legacy dispatch    : {old:7.1f} ns/event ({old - base:6.1f} ns overhead)")
+	print(f"dispatch table     : {new:7.1f} ns/event ({new - base:6.1f} ns overhead)")
+
+
+if __name__ == "__main__":
+	main()
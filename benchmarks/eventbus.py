@@ -0,0 +1,111 @@
+"""
+Microbenchmark for the EventBus.
+
+Pushes LogEvents through the bus from a number of producer threads into a single consumer and
+reports events/second for the old queue.Queue based bus, the current bus with receive() and the
+current bus with receive_batch().
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/eventbus.py
+"""
+
+import threading, time
+from pathlib import Path
+from queue import Queue, Empty
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.core.eventbus import EventBus
+
+
+EVENTS = 200_000
+BATCH = 64
+
+
+class LegacyEventBus():
+	"The bus before it was rewritten: a queue.Queue plus a second lock for the counter."
+
+	def __init__(self) -> None:
+		self.events: Queue[HalogenEvents.Event] = Queue()
+		self.lock = threading.Lock()
+		self._count = 0 
+
+	def emit(self, event: HalogenEvents.Event):
+		if isinstance(event, HalogenEvents.Event):
+			self.events.put(event)
+			with self.lock: self._count += 1
+
+	def receive(self, timeout: float) -> HalogenEvents.Event | None:
+		try:
+			event = self.events.get(True, timeout)
+			with self.lock: self._count -= 1
+		except Empty:
+			event = None
+		return event
+
+
+def make_bus() -> EventBus:
+	"The bus is made large enough that nothing is shed during the run."
+	bus = EventBus()
+	bus.configure(HalogenConfig("linux", Path("."), {"core" : {"capacity" : EVENTS}}, False))
+	return bus
+
+
+def produce(emit, n: int):
+	event = HalogenEvents.LogEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.Chain(0, 0), "debug", "message"
+	)
+	for _ in range(n): emit(event)
+
+
+def run(consume, emit, producers: int) -> float:
+	per_producer = EVENTS // producers
+	threads = [
+		threading.Thread(target = produce, args = (emit, per_producer)) for _ in range(producers)
+	]
+
+	start = time.perf_counter()
+	for t in threads: t.start()
+	consume(per_producer * producers)
+	elapsed = time.perf_counter() - start
+
+	for t in threads: t.join()
+	return (per_producer * producers) / elapsed
+
+
+def legacy(producers: int) -> float:
+	bus = LegacyEventBus()
+
+	def consume(n):
+		for _ in range(n): bus.receive(1)
+
+	return run(consume, bus.emit, producers)
+
+
+def single(producers: int) -> float:
+	bus = make_bus()
+
+	def consume(n):
+		for _ in range(n): bus.receive(1)
+
+	return run(consume, bus.emit, producers)
+
+
+def batched(producers: int) -> float:
+	bus = make_bus()
+
+	def consume(n):
+		while n > 0: n -= len(bus.receive_batch(BATCH, 1))
+
+	return run(consume, bus.emit, producers)
+
+
+def main():
+	print(f"{'producers':>10} {'legacy':>12} {'receive':>12} {'batch':>12}   (events/s)")
+	for producers in (1, 4, 16):
+		print(
+			f"{producers:>10} {legacy(producers):>12,.0f} "
+			f"{single(producers):>12,.0f} {batched(producers):>12,.0f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,109 @@
+"""
+Benchmark for the event representation.
+
+Measures, for a LogEvent and an AIResponseEvent:
+1) How many bytes a single event takes in memory (measured with tracemalloc over many events).
+2) How many events can be constructed per second, timestamp included.
+
+The old representation (plain frozen dataclasses with a strftime timestamp on every event) is
+measured for comparison.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/events.py
+"""
+
+import time, tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+
+from halogen.base import HalogenEvents
+
+
+EVENTS = 100_000
+MESSAGE = "Something happened in some module."
+EXTRAS: dict = {}
+
+
+@dataclass(frozen = True)
+class LegacyEvent():
+	sender: str
+	timestamp: str
+	chain: HalogenEvents.Chain
+
+
+@dataclass(frozen = True)
+class LegacyLogEvent(LegacyEvent):
+	level: str
+	message: str
+
+
+@dataclass(frozen = True)
+class LegacyAIResponseEvent(LegacyEvent):
+	message: str
+	extras: dict
+
+
+def legacy_timestamp() -> str:
+	return datetime.now().strftime("%H:%M:%S")
+
+
+def legacy_log(chain: HalogenEvents.Chain) -> LegacyLogEvent:
+	return LegacyLogEvent("bench", legacy_timestamp(), chain, "debug", MESSAGE)
+
+
+def legacy_response(chain: HalogenEvents.Chain) -> LegacyAIResponseEvent:
+	return LegacyAIResponseEvent("bench", legacy_timestamp(), chain, MESSAGE, EXTRAS)
+
+
+def log(chain: HalogenEvents.Chain) -> HalogenEvents.LogEvent:
+	return HalogenEvents.LogEvent("bench", HalogenEvents.make_timestamp(), chain, "debug", MESSAGE)
+
+
+def response(chain: HalogenEvents.Chain) -> HalogenEvents.AIResponseEvent:
+	return HalogenEvents.AIResponseEvent(
+		"bench", HalogenEvents.make_timestamp(), chain, MESSAGE, EXTRAS
+	)
+
+
+def bytes_per_event(make) -> float:
+	"Memory held by the events themselves. The chain, strings and extras inside are shared."
+	chain = HalogenEvents.Chain(0, 0)
+	make(chain)
+
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	events = [make(chain) for _ in range(EVENTS)]
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+
+	# the list holding them is not part of an event
+	list_size = events.__sizeof__()
+	return (after - before - list_size) / len(events)
+
+
+def events_per_second(make) -> float:
+	chain = HalogenEvents.Chain(0, 0)
+	start = time.perf_counter()
+	for _ in range(EVENTS): make(chain)
+	return EVENTS / (time.perf_counter() - start)
+
+
+def main():
+	cases = (
+		("legacy LogEvent", legacy_log),
+		("LogEvent", log),
+		("legacy AIResponseEvent", legacy_response),
+		("AIResponseEvent", response)
+	)
+
+	for label, make in cases:
+		print(
+			f"{label:<24} {bytes_per_event(make):7.1f} bytes/event " \
+			f"{events_per_second(make):12,.0f} events/s"
+		)
+
+	ts = HalogenEvents.make_timestamp()
+	print(f"formatted timestamp: {HalogenEvents.format_timestamp(ts)}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,72 @@
+"""
+Benchmark for the event journal.
+
+Records EVENTS events (a mix of logs, inputs and responses) the old dev mode way (reopening
+events.log and writing str(event) for each one) and through the EventJournal. The per event cost
+is what the core thread pays. The total includes closing the journal, which waits until everything
+is on disk. The journal is then read back.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/journal.py
+"""
+
+import time, tempfile
+from pathlib import Path
+
+from halogen.base import HalogenEvents
+from halogen.core.journal import EventJournal, read_journal
+
+
+EVENTS = 100_000
+
+
+def make_events() -> list[HalogenEvents.Event]:
+	events = []
+	for i in range(EVENTS):
+		chain = HalogenEvents.Chain(i % 7, i)
+		ts = HalogenEvents.make_timestamp()
+		match i % 3:
+			case 0: events.append(HalogenEvents.LogEvent("bench", ts, chain, "info", "Something happened."))
+			case 1: events.append(HalogenEvents.UserInputEvent("bench", ts, chain, "What time is it?"))
+			case 2: events.append(HalogenEvents.AIResponseEvent("model", ts, chain, "It is noon.", {}))
+	return events
+
+
+def legacy(path: Path, events: list[HalogenEvents.Event]) -> tuple[float, float]:
+	start = time.perf_counter()
+	for event in events:
+		with open(path, "a+") as file:
+			file.write(f"{event.__str__()}\n")
+	elapsed = time.perf_counter() - start
+	return elapsed, elapsed
+
+
+def journal(path: Path, events: list[HalogenEvents.Event]) -> tuple[float, float]:
+	journal = EventJournal(path, capacity = EVENTS)
+
+	start = time.perf_counter()
+	for event in events: journal.record(event)
+	recorded = time.perf_counter() - start
+
+	journal.close()
+	return recorded, time.perf_counter() - start
+
+
+def main():
+	events = make_events()
+	directory = Path(tempfile.mkdtemp())
+
+	for label, run, name in (("legacy", legacy, "events.log"), ("journal", journal, "events.journal")):
+		path = directory / name
+		core_thread, total = run(path, events)
+		print(
+			f"{label:<8} {core_thread / EVENTS * 1e6:6.2f} us/event on the core thread, " \
+			f"{EVENTS / total:10,.0f} events/s to disk, {path.stat().st_size / EVENTS:5.1f} bytes/event"
+		)
+
+	start = time.perf_counter()
+	n = sum(1 for _ in read_journal(directory / "events.journal"))
+	print(f"read back {n} records at {n / (time.perf_counter() - start):,.0f} records/s")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,64 @@
+"""
+Benchmark for the logging overhead of a single user input.
+
+Runs the command handler on INPUTS command events, with the bus left undrained, and measures the
+time per input and how many LogEvents ended up queued. At level 'debug' every log is made and
+queued, which is what used to happen at every level. At level 'info' the debug logs are skipped
+before their message is even formatted.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/log_level.py
+"""
+
+import time
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig, Chain
+from halogen.core.eventbus import EventBus
+from halogen.modules import HalogenCommandHandler
+
+
+INPUTS = 50_000
+
+
+def make_handler(bus: EventBus) -> HalogenCommandHandler:
+	handler = HalogenCommandHandler(bus.emit, HalogenConfig("linux", Path("."), {}, False))
+
+	def echo(args: list[str], chain: Chain) -> tuple[bool, str]:
+		return (True, " ".join(args) * 20)
+
+	handler.define(HalogenEvents.CommandRegisterEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "bench", "echo", "", echo
+	))
+	return handler
+
+
+def per_input(level: str) -> tuple[float, int]:
+	HalogenEvents.set_log_level(level)
+
+	bus = EventBus()
+	bus.capacity = INPUTS * 4
+	handler = make_handler(bus)
+
+	events = [
+		HalogenEvents.CommandEvent(
+			"bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "bench", "echo", ["some", "args"]
+		)
+		for _ in range(INPUTS)
+	]
+
+	start = time.perf_counter()
+	for event in events: handler.handle(event)
+	elapsed = time.perf_counter() - start
+
+	logs = sum(isinstance(e, HalogenEvents.LogEvent) for e in bus.drain())
+	return elapsed / INPUTS, logs
+
+
+def main():
+	for level in ("debug", "info"):
+		seconds, logs = per_input(level)
+		print(f"level = {level:<6} {seconds * 1e6:6.2f} us/input, {logs / INPUTS:.1f} LogEvents queued/input")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for log rotation.
+
+Writes LINES log lines through a HalogenWriter, without rotation and then rotating every
+ROTATE_BYTES and keeping ARCHIVES gzip archives. Measures the producer side (lines/s and the
+latency of single writes) and checks what ends up on disk.
+
+Rotating and compressing happen on the writer's own threads, so a write never waits on them. They
+still compete with the producer for the GIL though, so with rotation the slowest writes can be
+slower and more writes stall for over a millisecond. Both are printed rather than assumed.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/log_rotation.py
+"""
+
+import time, tempfile, gzip
+from pathlib import Path
+
+from halogen.base import HalogenWriter, LogRotation
+
+
+LINES = 500_000
+ROTATE_BYTES = 4 * 1024 * 1024
+ARCHIVES = 3
+LINE = "[12:00:00] [INFO] (Bench) Something happened in some module.\n"
+
+
+def run(rotation: LogRotation | None) -> tuple[float, list[float], Path]:
+	directory = Path(tempfile.mkdtemp())
+	path = directory / "halogen.log"
+	writer = HalogenWriter.open(path, rotation = rotation, capacity = LINES)
+
+	latencies = [0.0] * LINES
+	start = time.perf_counter()
+	for i in range(LINES):
+		t = time.perf_counter()
+		writer.write(LINE)
+		latencies[i] = time.perf_counter() - t
+	elapsed = time.perf_counter() - start
+
+	writer.close()
+	latencies.sort()
+	return LINES / elapsed, latencies, path
+
+
+def main():
+	for label, rotation in (("no rotation", None), ("rotation", LogRotation(ROTATE_BYTES, 0, ARCHIVES, "gzip"))):
+		rate, latencies, path = run(rotation)
+		archives = sorted(p for p in path.parent.iterdir() if p != path)
+
+		p99, p999 = latencies[int(LINES * 0.99)], latencies[int(LINES * 0.999)]
+		stalls = sum(1 for t in latencies if t > 1e-3)
+
+		print(f"{label:<12} {rate:12,.0f} lines/s")
+		print(
+			f"{'':<12} write p99 {p99 * 1e6:.1f} us, p99.9 {p999 * 1e6:.1f} us, " \
+			f"slowest {latencies[-1] * 1e3:.1f} ms, {stalls} over 1 ms"
+		)
+		print(f"{'':<12} current file: {path.stat().st_size / 1024 / 1024:.1f} MB, archives: {len(archives)}")
+
+		for archive in archives:
+			with gzip.open(archive) as file:
+				size = len(file.read())
+			print(f"{'':<12} {archive.name}: {archive.stat().st_size / 1024:.0f} KB ({size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+	main()
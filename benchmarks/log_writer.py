@@ -0,0 +1,65 @@
+"""
+Benchmark for writing log lines.
+
+Writes LINES log lines to a file and to a (null) terminal, the old way (reopening the file for
+every line and printing every line) and through HalogenWriter. The producer rate is how fast the
+logger itself can go. The total includes closing the writer, which waits until everything is on
+disk.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/log_writer.py
+"""
+
+import time, tempfile, os
+from pathlib import Path
+
+from halogen.base import HalogenWriter
+
+
+LINES = 100_000
+LINE = "[12:00:00] [INFO] (Bench) Something happened in some module.\n"
+
+
+def legacy(path: Path, terminal) -> tuple[float, float]:
+	start = time.perf_counter()
+	for _ in range(LINES):
+		with open(path, "a+") as file:
+			file.write(LINE)
+		print(LINE[:-1], file = terminal)
+	elapsed = time.perf_counter() - start
+	return elapsed, elapsed
+
+
+def buffered(path: Path, terminal) -> tuple[float, float]:
+	file_writer = HalogenWriter.open(path)
+	terminal_writer = HalogenWriter(terminal, owns_stream = False)
+
+	start = time.perf_counter()
+	for _ in range(LINES):
+		file_writer.write(LINE)
+		terminal_writer.write(LINE)
+	produced = time.perf_counter() - start
+
+	file_writer.close()
+	terminal_writer.close()
+	return produced, time.perf_counter() - start
+
+
+def main():
+	directory = Path(tempfile.mkdtemp())
+
+	with open(os.devnull, "w") as terminal:
+		for label, run in (("legacy", legacy), ("buffered", buffered)):
+			path = directory / f"{label}.log"
+			produced, total = run(path, terminal)
+
+			with open(path) as file:
+				written = sum(1 for _ in file)
+
+			print(
+				f"{label:<9} producer: {LINES / produced:12,.0f} lines/s  " \
+				f"total: {LINES / total:12,.0f} lines/s  written: {written}/{LINES}"
+			)
+
+
+if __name__ == "__main__":
+	main()
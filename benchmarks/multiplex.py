@@ -0,0 +1,106 @@
+"""
+Benchmark for many conversations held by a single integration.
+
+Runs a HalogenServer on its own (no core) that answers every UserInputEvent with an
+AIResponseEvent, as in server_latency.py. SESSIONS HalogenInterfaces are started, each with a
+HalogenClient of its own and then all as sessions of one HalogenConnection, and every interface
+sends ROUNDS messages one after the other from a thread of its own.
+
+Prints the threads and file descriptors it takes, the time to start all interfaces and the
+latency of the round trips for both.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/multiplex.py
+"""
+
+import os, threading, time
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.base.histogram import Histogram
+from halogen.modules.server import HalogenServer, HalogenClient, HalogenConnection, HalogenInterface
+
+
+SESSIONS = 200
+ROUNDS = 20
+
+# skip the unix socket, the server of this benchmark only listens on TCP
+NO_SOCKET = Path("/nonexistent/halogen.sock")
+
+
+class Server(HalogenServer):
+	PORT = 0 # any free port
+
+
+def answer(server: HalogenServer, event: HalogenEvents.Event):
+	match event:
+		case HalogenEvents.ClientActivationEvent():
+			server.handle(event)
+		case HalogenEvents.UserInputEvent():
+			server.handle(HalogenEvents.AIResponseEvent(
+				"bench", HalogenEvents.make_timestamp(), event.chain, event.message, {}
+			))
+
+
+def fds() -> int:
+	return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else -1
+
+
+def converse(interface: HalogenInterface, latency: Histogram, lock: threading.Lock):
+	for _ in range(ROUNDS):
+		start = time.perf_counter_ns()
+		chain = interface.send_message("ping")
+		while True:
+			event = interface.receive_event()
+			if isinstance(event, HalogenEvents.AIResponseEvent) and event.chain == chain: break
+		with lock: latency.record(time.perf_counter_ns() - start)
+
+
+def run(label: str, connection: HalogenConnection | None):
+	threads, files = threading.active_count(), fds()
+
+	start = time.perf_counter()
+	interfaces = [HalogenInterface("bench", connection) for _ in range(SESSIONS)]
+	for interface in interfaces: interface.start()
+	started = time.perf_counter() - start
+
+	print(
+		f"{label}: started {SESSIONS} in {started:.2f}s, " \
+		f"{threading.active_count() - threads} threads and {fds() - files} file descriptors more"
+	)
+
+	latency = Histogram()
+	lock = threading.Lock()
+	workers = [threading.Thread(target = converse, args = (i, latency, lock)) for i in interfaces]
+
+	start = time.perf_counter()
+	for worker in workers: worker.start()
+	for worker in workers: worker.join()
+	elapsed = time.perf_counter() - start
+
+	print(f"  {latency.count} round trips in {elapsed:.2f}s, latency {latency.summary()}")
+
+	for interface in interfaces: interface.end()
+
+
+def main():
+	server: HalogenServer
+	config = HalogenConfig("linux", Path("."), {"unix_socket" : False}, False)
+	server = Server(lambda event: answer(server, event), config)
+	server.start()
+
+	port = server.socket.getsockname()[1]
+	HalogenClient.PORT = HalogenConnection.PORT = port
+	os.environ["HALOGEN_SOCKET"] = str(NO_SOCKET)
+
+	run("a client each  ", None)
+
+	connection = HalogenConnection()
+	connection.start()
+	run("one connection ", connection)
+	connection.end()
+
+	server.end()
+
+
+if __name__ == "__main__":
+	main()
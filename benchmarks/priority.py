@@ -0,0 +1,102 @@
+"""
+Benchmark for the EventBus priority lanes.
+
+A consumer thread takes batches from the bus like the core does and spends a fixed amount of time
+on every event, as if a module was handling it. Producer threads flood the bus with LogEvents while
+AIResponseEvents are emitted every few milliseconds. Reports p50/p99 latency from emitting an
+AIResponseEvent to the consumer picking it up, with every event in a single FIFO lane and with the
+default lanes.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/priority.py
+"""
+
+import threading, time, statistics
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.core.eventbus import EventBus
+
+
+HANDLE_COST = 20e-6
+DURATION = 2.0
+RESPONSE_INTERVAL = 0.005
+
+
+def busy(seconds: float):
+	end = time.perf_counter() + seconds
+	while time.perf_counter() < end: pass
+
+
+def make_bus(fifo: bool) -> EventBus:
+	bus = EventBus()
+	priorities = {}
+	if fifo:
+		priorities = {name: "tasks" for name in EventBus.default_priorities}
+	bus.configure(HalogenConfig("linux", Path("."), {"core" : {"priorities" : priorities}}, False))
+	return bus
+
+
+def flood(bus: EventBus, stop: threading.Event, rate: int):
+	burst = 50
+	interval = burst / rate
+	ev = HalogenEvents.LogEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.Chain(0, 0), "debug", "flood"
+	)
+	next_burst = time.perf_counter()
+	while not stop.is_set():
+		for _ in range(burst): bus.emit(ev)
+		next_burst += interval
+		delay = next_burst - time.perf_counter()
+		if delay > 0: time.sleep(delay)
+
+
+def respond(bus: EventBus, stop: threading.Event):
+	while not stop.is_set():
+		ev = HalogenEvents.AIResponseEvent(
+			"bench", HalogenEvents.make_timestamp(), HalogenEvents.Chain(1, 0),
+			"response", {"sent" : time.perf_counter()}
+		)
+		bus.emit(ev)
+		time.sleep(RESPONSE_INTERVAL)
+
+
+def consume(bus: EventBus, stop: threading.Event, latencies: list[float]):
+	while not stop.is_set():
+		for ev in bus.receive_batch(64, 0.1):
+			if isinstance(ev, HalogenEvents.AIResponseEvent):
+				latencies.append(time.perf_counter() - ev.extras["sent"])
+			busy(HANDLE_COST)
+
+
+def run(fifo: bool, log_rate: int) -> tuple[float, float]:
+	bus = make_bus(fifo)
+	stop = threading.Event()
+	latencies: list[float] = []
+
+	threads = [
+		threading.Thread(target = consume, args = (bus, stop, latencies)),
+		threading.Thread(target = respond, args = (bus, stop)),
+		threading.Thread(target = flood, args = (bus, stop, log_rate))
+	]
+
+	for t in threads: t.start()
+	time.sleep(DURATION)
+	stop.set()
+	for t in threads: t.join()
+
+	latencies.sort()
+	p50 = statistics.median(latencies)
+	p99 = latencies[int(len(latencies) * 0.99) - 1]
+	return p50 * 1e3, p99 * 1e3
+
+
+def main():
+	print(f"{'logs/s':>8} {'fifo p50':>10} {'fifo p99':>10} {'lanes p50':>10} {'lanes p99':>10}   (ms)")
+	for rate in (1_000, 10_000, 40_000):
+		f50, f99 = run(True, rate)
+		l50, l99 = run(False, rate)
+		print(f"{rate:>8} {f50:>10.2f} {f99:>10.2f} {l50:>10.2f} {l99:>10.2f}")
+
+
+if __name__ == "__main__":
+	main()
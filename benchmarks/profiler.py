@@ -0,0 +1,90 @@
+"""
+Benchmark for the overhead of the sampling profiler.
+
+One thread delivers events to a module through an inline dispatcher, like the core loop, while
+IDLE other threads wait on a condition like the writers and dispatchers of a running Halogen do.
+The events/s are measured without the profiler and with it sampling at a few intervals, along
+with how long taking a single sample of all threads takes.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/profiler.py
+"""
+
+import threading, time
+from pathlib import Path
+from collections.abc import Callable
+
+from halogen.base import HalogenEvents, HalogenModule, HalogenConfig, HalogenProfiler
+from halogen.core.dispatch import InlineDispatcher
+
+
+DURATION = 2.0
+IDLE = 16
+
+
+class Counter(HalogenModule):
+
+	def __init__(self, emit_event: Callable, config: HalogenConfig) -> None:
+		super().__init__(emit_event, config)
+		self.n = 0
+
+	def start(self): pass
+	def end(self): return (True, "")
+	def handled_events(self): return [HalogenEvents.LogEvent]
+
+	def handle(self, event: HalogenEvents.Event):
+		self.n += 1
+
+
+def on_error(module, event, e):
+	raise e
+
+
+def events_per_second(dispatcher: InlineDispatcher, event: HalogenEvents.Event) -> float:
+	deliver = dispatcher.deliver
+	n = 0
+	start = time.perf_counter()
+	end = start + DURATION
+
+	while time.perf_counter() < end:
+		for _ in range(1000): deliver(event)
+		n += 1000
+
+	return n / (time.perf_counter() - start)
+
+
+def main():
+	stop = threading.Event()
+	idle = [threading.Thread(target = stop.wait, name = f"idle-{i}") for i in range(IDLE)]
+	for t in idle: t.start()
+
+	module = Counter(lambda e: None, HalogenConfig("linux", Path("."), {}, False))
+	dispatcher = InlineDispatcher(module, on_error)
+	event = HalogenEvents.LogEvent("bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "info", "")
+
+	baseline = events_per_second(dispatcher, event)
+	print(f"{'no profiler':<14} {baseline:12,.0f} events/s")
+
+	for interval in (0.01, 0.005, 0.001):
+		profiler = HalogenProfiler(interval)
+		profiler.start()
+		rate = events_per_second(dispatcher, event)
+		profiler.stop()
+
+		print(
+			f"{f'every {interval * 1000:g}ms':<14} {rate:12,.0f} events/s " \
+			f"({rate / baseline - 1:+.1%}, {profiler.samples} samples, {len(profiler.stacks)} stacks)"
+		)
+
+	# the cost of a single sample, with the profiler's thread doing nothing else
+	profiler = HalogenProfiler(0)
+	profiler.start()
+	time.sleep(DURATION / 4)
+	profiler.stop()
+	print(f"one sample of {IDLE + 2} threads: {DURATION / 4 / profiler.samples * 1e6:.1f}us")
+
+	stop.set()
+	for t in idle: t.join()
+
+
+if __name__ == "__main__":
+	main()
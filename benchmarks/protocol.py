@@ -0,0 +1,89 @@
+"""
+Benchmark for the framed wire protocol.
+
+Sends MESSAGES messages of a few sizes over a socketpair and reads them back the way the server
+and client do, once with the old reads (recv(1024), decode, splitlines) and once with
+FrameReader. The old reads lose every message a read cuts through, even small ones sent back to
+back, so the lost messages are shown for them instead of the throughput.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/protocol.py
+"""
+
+import socket, threading, time, json
+
+from halogen.modules.server.protocol import FrameReader, encode_frame
+
+
+MESSAGES = 20_000
+SIZES = (100, 2_000, 64_000, 1_000_000)
+
+
+def message(size: int) -> str:
+	# multi-byte characters so split reads can cut through one
+	return json.dumps({"type" : "AIResponseEvent", "payload" : {"message" : "é" * (size // 2)}})
+
+
+def send_all(sock: socket.socket, data: bytes, n: int):
+	for _ in range(n): sock.sendall(data)
+	sock.shutdown(socket.SHUT_WR)
+
+
+def read_lines(sock: socket.socket) -> tuple[int, int]:
+	"The old reads. Returns (messages parsed, messages corrupted)."
+	parsed = corrupted = 0
+	while True:
+		data = sock.recv(1024)
+		if not data: return parsed, corrupted
+		try:
+			text = data.decode()
+		except UnicodeDecodeError:
+			corrupted += 1
+			continue
+		for part in text.splitlines():
+			try:
+				json.loads(part)
+				parsed += 1
+			except json.JSONDecodeError:
+				corrupted += 1
+
+
+def read_frames(sock: socket.socket) -> tuple[int, int]:
+	reader = FrameReader()
+	parsed = 0
+	while reader.recv(sock):
+		for msg in reader.frames():
+			json.loads(msg)
+			parsed += 1
+	return parsed, 0
+
+
+def run(size: int, framed: bool) -> tuple[float, int, int]:
+	text = message(size)
+	data = encode_frame(text) if framed else (text + "\n").encode()
+	n = max(10, MESSAGES * 100 // size) if size > 100 else MESSAGES
+
+	a, b = socket.socketpair()
+	sender = threading.Thread(target = send_all, args = (a, data, n))
+
+	start = time.perf_counter()
+	sender.start()
+	parsed, corrupted = read_frames(b) if framed else read_lines(b)
+	elapsed = time.perf_counter() - start
+
+	sender.join()
+	a.close()
+	b.close()
+
+	return len(data) * n / elapsed / 1e6, parsed, n - parsed
+
+
+def main():
+	for size in SIZES:
+		mb, parsed, lost = run(size, framed = False)
+		old = f"{mb:8.1f} MB/s" if not lost else f"{lost} of {parsed + lost} messages lost"
+		mb, parsed, lost = run(size, framed = True)
+		print(f"{size:>9} bytes | recv(1024) + lines: {old:<28} | frames: {mb:8.1f} MB/s, {lost} lost")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of realistic traffic using the replay harness (halogen.core.replay).
+
+Records a synthetic journal of INPUTS user messages and commands coming from CLIENTS clients,
+then replays it at max speed against the prompt manager, the command handler and the whole core
+with a stub model. The same can be done with a journal recorded by a real instance:
+
+	halogen-replay events.journal [--module prompt] [--speed max] [--histograms]
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/replay.py
+"""
+
+import tempfile
+from pathlib import Path
+
+from halogen.base import HalogenEvents, Chain
+from halogen.core.journal import EventJournal, read_journal
+from halogen.core.replay import load_config, replay_core, replay_module, stub_function
+from halogen.modules import HalogenPromptManager, HalogenCommandHandler
+
+
+INPUTS = 2000
+CLIENTS = 20
+
+
+def make_configdir(directory: Path):
+	(directory / "models").mkdir()
+	(directory / "modules").mkdir()
+	(directory / "prompt").mkdir()
+	(directory / "prompt" / "profile.txt").write_text("You are Halogen.")
+	(directory / "prompt" / "user.txt").write_text("The user is benchmarking you.")
+	(directory / "config.toml").write_text('[user]\nname = "bench"\n\n[logger]\nlevel = "info"\n')
+
+
+def record_journal(path: Path):
+	journal = EventJournal(path, capacity = INPUTS * 2)
+	ts = HalogenEvents.make_timestamp
+
+	journal.record(HalogenEvents.CommandRegisterEvent(
+		"core", ts(), Chain(0, 0), "core", "get", "Get a value.", stub_function
+	))
+
+	for i in range(INPUTS):
+		chain = Chain(1 + i % CLIENTS, 0)
+		if i % 4:
+			journal.record(HalogenEvents.UserInputEvent("client", ts(), chain, f"Message number {i}."))
+		else:
+			journal.record(HalogenEvents.CommandEvent("client", ts(), chain, "core", "get", ["chain"]))
+
+	journal.close()
+
+
+def main():
+	with tempfile.TemporaryDirectory(prefix = "halogen-bench-") as tmp:
+		directory = Path(tmp)
+		make_configdir(directory)
+
+		path = directory / "events.journal"
+		record_journal(path)
+
+		config = load_config(directory, 0.0, directory)
+		records = list(read_journal(path))
+
+		for module in (HalogenPromptManager, HalogenCommandHandler):
+			print(replay_module(records, module, config, None).render())
+			print()
+
+		print(replay_core(records, config, None).render())
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for routing events to subscribed clients.
+
+CLIENTS clients are connected, a few of them observing: some get the logs of the tasks module,
+some everything of a single client. Events are matched with the server's RouteIndex and with a
+scan over every client's route (what matching without the index costs), and the time per event
+is printed for events going to no client, one client and a few observers.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/routing.py
+"""
+
+import time
+
+from halogen.base import HalogenEvents, Chain
+from halogen.modules.server.codec import Subscribe
+from halogen.modules.server.connection import ClientConnection
+from halogen.modules.server.routing import Route, RouteIndex, type_names
+
+
+CLIENTS = 1000
+LOG_OBSERVERS = 10
+CLIENT_OBSERVERS = 5
+
+N = 50_000
+
+
+def scan(routes: list[Route], event: HalogenEvents.Event, names: frozenset[str]) -> list[ClientConnection]:
+	context, sender = event.chain.context, event.sender
+	return [
+		route.client for route in routes
+		if not route.replies.isdisjoint(names) and route.client.context == context
+		or not route.events.isdisjoint(names)
+		and (route.contexts == (None,) or context in route.contexts)
+		and (route.senders == (None,) or sender in route.senders)
+	]
+
+
+def per_event(func, *args) -> float:
+	start = time.perf_counter()
+	for _ in range(N): func(*args)
+	return (time.perf_counter() - start) / N * 1e9
+
+
+def main():
+	index = RouteIndex()
+	routes = []
+
+	for context in range(1, CLIENTS + 1):
+		client = ClientConnection(None, context)
+
+		if context <= LOG_OBSERVERS:
+			subscribe = Subscribe(["LogEvent"], [], ["tasks"])
+		elif context <= LOG_OBSERVERS + CLIENT_OBSERVERS:
+			subscribe = Subscribe(["Event"], [500], [])
+		else:
+			subscribe = None
+
+		route = Route(client, subscribe)
+		index.add(route)
+		routes.append(route)
+
+	t = HalogenEvents.make_timestamp()
+	events = {
+		"log of another module" : HalogenEvents.LogEvent("model", t, Chain(0, 1), "info", "..."),
+		"reply to a client" : HalogenEvents.AIResponseEvent("model", t, Chain(200, 1), "...", {}),
+		"log of tasks" : HalogenEvents.LogEvent("tasks", t, Chain(0, 1), "info", "..."),
+		"reply to an observed client" : HalogenEvents.AIResponseEvent("model", t, Chain(500, 1), "...", {})
+	}
+
+	print(f"{CLIENTS} clients, {LOG_OBSERVERS} observing the logs of tasks, {CLIENT_OBSERVERS} observing client 500")
+	print(f"{'event':<28} {'clients':>7} {'index':>9} {'scan':>11}")
+
+	for label, event in events.items():
+		names = type_names(type(event))
+		matched = index.match(event)
+		assert sorted(c.context for c in matched) == sorted(c.context for c in scan(routes, event, names))
+
+		print(
+			f"{label:<28} {len(matched):>7} {per_event(index.match, event):>7.0f}ns " \
+			f"{per_event(scan, routes, event, names):>9.0f}ns"
+		)
+
+	task = HalogenEvents.TaskEvent("prompt", t, Chain(0, 1), "files", "read", [])
+	print(f"\nunwanted event skipped in handle(): {per_event(index.filter.__getitem__, type(task)):.0f}ns")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,118 @@
+"""
+Benchmark for the round trip latency of the server with many clients.
+
+Runs a HalogenServer on its own (no core) whose emitted events are answered straight away: every
+UserInputEvent a client sends comes back as an AIResponseEvent, the way the core would route it
+through the model. The clients are driven from a single selector, each sending ROUNDS messages
+one after the other, and the time from sending a message to receiving its response is recorded.
+This is done with a single client (the latency of an idle server) and with CLIENTS clients.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/server_latency.py
+"""
+
+import json, selectors, socket, time
+from dataclasses import asdict
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.base.histogram import Histogram
+from halogen.modules.server import HalogenServer
+from halogen.modules.server.protocol import FrameReader, encode_frame
+
+
+CLIENTS = 500
+ROUNDS = 20
+
+
+class Server(HalogenServer):
+	PORT = 0 # any free port
+
+
+def answer(server: HalogenServer, event: HalogenEvents.Event):
+	match event:
+		case HalogenEvents.ClientActivationEvent():
+			server.handle(event)
+		case HalogenEvents.UserInputEvent():
+			server.handle(HalogenEvents.AIResponseEvent(
+				"bench", HalogenEvents.make_timestamp(), event.chain, event.message, {}
+			))
+
+
+def request(chain: dict) -> bytes:
+	event = HalogenEvents.UserInputEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "ping"
+	)
+	payload = asdict(event)
+	payload["chain"] = chain
+	return encode_frame(json.dumps({"type" : "UserInputEvent", "payload" : payload}))
+
+
+def run(address: tuple, n: int):
+	sel = selectors.DefaultSelector()
+	latency = Histogram()
+
+	# socket: [reader, chain, rounds left, time the last request was sent]
+	clients: dict[socket.socket, list] = {}
+
+	start = time.perf_counter()
+	for _ in range(n):
+		sock = socket.create_connection(address)
+		sock.setblocking(False)
+		clients[sock] = [FrameReader(), None, ROUNDS, 0]
+		sel.register(sock, selectors.EVENT_READ)
+	print(f"connected {n} clients in {time.perf_counter() - start:.2f}s")
+
+	done = 0
+	start = time.perf_counter()
+
+	while done < n:
+		for key, _ in sel.select(10):
+			sock = key.fileobj
+			state = clients[sock]
+			reader = state[0]
+
+			try:
+				if not reader.recv(sock): raise ConnectionError("server closed the connection")
+			except BlockingIOError:
+				continue
+
+			for msg in reader.frames():
+				data = json.loads(msg)
+
+				if data["type"] == "ClientActivationEvent":
+					state[1] = data["payload"]["chain"]
+				else:
+					latency.record(time.perf_counter_ns() - state[3])
+					state[2] -= 1
+
+				if state[2] == 0:
+					done += 1
+					sel.unregister(sock)
+					break
+
+				state[3] = time.perf_counter_ns()
+				sock.sendall(request(state[1]))
+
+	elapsed = time.perf_counter() - start
+	print(f"{latency.count} round trips in {elapsed:.2f}s ({latency.count / elapsed:,.0f}/s)")
+	print(f"latency: {latency.summary()}")
+
+	for sock in clients: sock.close()
+	sel.close()
+
+
+def main():
+	server: HalogenServer
+	server = Server(lambda event: answer(server, event), HalogenConfig("linux", Path("."), {}, False))
+	server.start()
+	address = server.socket.getsockname()
+
+	for n in (1, CLIENTS):
+		run(address, n)
+		print()
+
+	server.end()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,173 @@
+"""
+Benchmark for the isolation of slow clients.
+
+Runs a HalogenServer on its own (no core), the same way as server_latency.py: FAST clients each
+do ROUNDS round trips and their latency is recorded. Meanwhile, a slow client that never reads
+is flooded with events (FLOOD bytes per second) the way a busy chain would be.
+
+This is done without the slow client, and then with it under every 'slow_client' policy, and
+with no limit at all (max_pending = 0) to show what the limit saves: the memory held for a client
+that is not reading.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/slow_client.py
+"""
+
+import json, selectors, socket, threading, time
+from dataclasses import asdict
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig, Chain
+from halogen.base.histogram import Histogram
+from halogen.modules.server import HalogenServer
+from halogen.modules.server.codec import decode
+from halogen.modules.server.protocol import FrameReader, encode_frame
+
+
+FAST = 50
+ROUNDS = 100
+
+EVENT_SIZE = 4096
+FLOOD = 40 * 1024 * 1024
+
+
+class Server(HalogenServer):
+	PORT = 0 # any free port
+
+
+def answer(server: HalogenServer, event: HalogenEvents.Event):
+	match event:
+		case HalogenEvents.ClientActivationEvent():
+			server.handle(event)
+		case HalogenEvents.UserInputEvent():
+			server.handle(HalogenEvents.AIResponseEvent(
+				"bench", HalogenEvents.make_timestamp(), event.chain, event.message, {}
+			))
+
+
+def request(chain: dict) -> bytes:
+	event = HalogenEvents.UserInputEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "ping"
+	)
+	payload = asdict(event)
+	payload["chain"] = chain
+	return encode_frame(json.dumps({"type" : "UserInputEvent", "payload" : payload}))
+
+
+def connect_slow(server: HalogenServer, address: tuple) -> tuple[socket.socket, int]:
+	"A client with a tiny receive buffer that reads its activation event and then nothing."
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+	sock.connect(address)
+
+	reader = FrameReader()
+	while not (frames := reader.frames()):
+		reader.recv(sock)
+
+	return sock, decode(frames[0]).chain.context
+
+
+def flood(server: HalogenServer, context: int, stop: threading.Event):
+	message = "x" * EVENT_SIZE
+	batch = FLOOD // EVENT_SIZE // 100
+
+	while not stop.is_set():
+		for _ in range(batch):
+			server.handle(HalogenEvents.AIResponseEvent(
+				"bench", HalogenEvents.make_timestamp(), Chain(context, 0), message, {}
+			))
+		time.sleep(0.01)
+
+
+def run_fast(address: tuple) -> Histogram:
+	sel = selectors.DefaultSelector()
+	latency = Histogram()
+
+	# socket: [reader, chain, rounds left, time the last request was sent]
+	clients: dict[socket.socket, list] = {}
+
+	for _ in range(FAST):
+		sock = socket.create_connection(address)
+		sock.setblocking(False)
+		clients[sock] = [FrameReader(), None, ROUNDS, 0]
+		sel.register(sock, selectors.EVENT_READ)
+
+	done = 0
+	while done < FAST:
+		for key, _ in sel.select(10):
+			sock = key.fileobj
+			state = clients[sock]
+			reader = state[0]
+
+			try:
+				if not reader.recv(sock): raise ConnectionError("server closed the connection")
+			except BlockingIOError:
+				continue
+
+			for msg in reader.frames():
+				data = json.loads(msg)
+
+				if data["type"] == "ClientActivationEvent":
+					state[1] = data["payload"]["chain"]
+				else:
+					latency.record(time.perf_counter_ns() - state[3])
+					state[2] -= 1
+
+				if state[2] == 0:
+					done += 1
+					sel.unregister(sock)
+					break
+
+				state[3] = time.perf_counter_ns()
+				sock.sendall(request(state[1]))
+
+	for sock in clients: sock.close()
+	sel.close()
+	return latency
+
+
+def run(label: str, slow: bool, config: dict):
+	config = {"unix_socket" : False, **config}
+
+	server: HalogenServer
+	server = Server(lambda event: answer(server, event), HalogenConfig("linux", Path("."), config, False))
+	server.start()
+	address = server.socket.getsockname()
+
+	stop = threading.Event()
+	if slow:
+		sock, context = connect_slow(server, address)
+		flooder = threading.Thread(target = flood, args = (server, context, stop))
+		flooder.start()
+		time.sleep(0.2) # let it fall behind first
+
+	start = time.perf_counter()
+	latency = run_fast(address)
+	elapsed = time.perf_counter() - start
+
+	print(f"{label}: {latency.count} round trips in {elapsed:.2f}s, latency {latency.summary()}")
+
+	if slow:
+		stop.set()
+		flooder.join()
+
+		slow_client = server.clients.get(context)
+		if slow_client:
+			print(f"  slow client: {slow_client.pending() / 1e6:.1f} MB waiting to be sent")
+		else:
+			print(f"  slow client: disconnected")
+		print(f"  events dropped so far: {server.dropped.values.get((), 0):.0f}")
+		sock.close()
+
+	server.end()
+
+
+def main():
+	print(f"{FAST} fast clients, a slow client flooded with {FLOOD // 2**20} MiB/s\n")
+	run("no slow client     ", False, {})
+	run("slow, drop         ", True, {"slow_client" : "drop"})
+	run("slow, disconnect   ", True, {"slow_client" : "disconnect"})
+	run("slow, no limit     ", True, {"max_pending" : 0})
+
+
+if __name__ == "__main__":
+	main()
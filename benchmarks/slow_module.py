@@ -0,0 +1,203 @@
+"""
+Stress test for the per-module dispatchers.
+
+1) Runs a core with the command handler and a model manager whose provider takes GENERATION_TIME to
+answer. While a generation is in flight, commands are sent through the bus and the time until their
+CommandExecutedEvent is dispatched is measured. It must stay under 10ms with the normal (async)
+model manager. A model manager with a blocking handle() running inline is shown for comparison.
+
+2) Sends CONCURRENT prompts at once to a provider with a native async generate and measures how long
+it takes for all responses to come back, for both core runtimes.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/slow_module.py
+"""
+
+import threading, time, tempfile, statistics, asyncio
+from pathlib import Path
+from collections.abc import Callable
+
+from halogen.base import HalogenEvents, HalogenModule, HalogenConfig
+from halogen.core import HalogenCore
+from halogen.core.aio import AsyncEventBus
+from halogen.core.manager import HalogenModuleManager
+from halogen.modules import HalogenCommandHandler, HalogenModelManager
+from halogen.modules.model.base import BaseModelProvider, ModelResponse
+
+
+GENERATION_TIME = 2.0
+COMMANDS = 50
+LATENCY_LIMIT = 0.010
+CONCURRENT = 200
+
+
+class SlowProvider(BaseModelProvider):
+	"Pretends to be a cloud model with a very slow round trip and a blocking client."
+
+	def load(self, model: str | None = None) -> str: return ""
+	def unload(self) -> str: return ""
+
+	def generate(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		time.sleep(GENERATION_TIME)
+		return ModelResponse(message = "done", tasks = [], extras = [])
+
+
+class SlowAsyncProvider(SlowProvider):
+	"Same, but with an async client."
+
+	async def generate_async(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		await asyncio.sleep(GENERATION_TIME)
+		return ModelResponse(message = "done", tasks = [], extras = [])
+
+
+def model_manager(provider: type[BaseModelProvider]) -> type[HalogenModelManager]:
+
+	class BenchModelManager(HalogenModelManager):
+
+		def __init__(self, emit_event: Callable, config: HalogenConfig):
+			super().__init__(emit_event, config)
+			self.concurrency = CONCURRENT
+
+		def start(self) -> None:
+			self.current_provider = provider(self.config)
+
+	return BenchModelManager
+
+
+class BlockingModelManager(model_manager(SlowProvider)):
+	"How the model manager used to work: a blocking handle() on the core thread."
+
+	def handle(self, event: HalogenEvents.Event) -> None:
+		if isinstance(event, HalogenEvents.PromptEvent):
+			response = self.current_provider.generate(event)
+			self.parse_response(response, HalogenEvents.chain(event))
+
+
+class Probe(HalogenModule):
+	"Records when command outputs and responses reach the dispatch stage."
+
+	def __init__(self, emit_event: Callable, config: HalogenConfig) -> None:
+		super().__init__(emit_event, config)
+		self.executed: dict[HalogenEvents.Chain, float] = {}
+		self.responses = 0
+
+	@classmethod
+	def name(cls): return "probe"
+
+	def start(self): pass
+	def end(self): return (True, "")
+
+	def handled_events(self):
+		return [HalogenEvents.CommandExecutedEvent, HalogenEvents.AIResponseEvent]
+
+	def handle(self, event: HalogenEvents.Event):
+		match event:
+			case HalogenEvents.CommandExecutedEvent():
+				self.executed[event.chain] = time.perf_counter()
+			case HalogenEvents.AIResponseEvent():
+				self.responses += 1
+
+
+def make_core(model: type[HalogenModelManager], runtime: str = "threads") -> tuple[HalogenCore, Probe]:
+	directory = Path(tempfile.mkdtemp())
+	config = HalogenConfig("linux", directory, {}, False)
+
+	core = HalogenCore()
+	if runtime == "asyncio": core.eventbus = AsyncEventBus()
+	core.runtime = runtime
+	core.is_running = True
+	core.shutdown_requested = False
+	core.restart_requested = False
+	core.config = config
+	core.batch_size = 64
+	core.manager = HalogenModuleManager(config, core.eventbus.emit, core.catch_error)
+	core.subscribe_core_handlers()
+
+	for module in (HalogenCommandHandler, model, Probe):
+		core.manager.initialize_module(module)
+
+	core.define_core_commands()
+	probe = [m for m in core.manager.modules if isinstance(m, Probe)][0]
+	return core, probe
+
+
+def prompt_event() -> HalogenEvents.PromptEvent:
+	return HalogenEvents.PromptEvent("bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "hi")
+
+
+def stop(core: HalogenCore, t: threading.Thread):
+	core.shutdown_reason = "benchmark"
+	core.eventbus.emit(HalogenEvents.ShutdownEvent(
+		"bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), False
+	))
+	t.join()
+
+
+def command_latency(model: type[HalogenModelManager]) -> list[float]:
+	core, probe = make_core(model)
+	t = threading.Thread(target = core.run)
+	t.start()
+
+	emit = core.eventbus.emit
+	emit(prompt_event())
+	time.sleep(0.1)
+
+	sent: dict[HalogenEvents.Chain, float] = {}
+	interval = (GENERATION_TIME * 0.8) / COMMANDS
+
+	for _ in range(COMMANDS):
+		chain = HalogenEvents.chain()
+		sent[chain] = time.perf_counter()
+		emit(HalogenEvents.CommandEvent(
+			"bench", HalogenEvents.make_timestamp(), chain, "core", "get", ["chain"]
+		))
+		time.sleep(interval)
+
+	while probe.responses < 1 or len(probe.executed) < COMMANDS:
+		time.sleep(0.01)
+
+	stop(core, t)
+	return [probe.executed[chain] - start for chain, start in sent.items()]
+
+
+def concurrent_generations(runtime: str) -> tuple[float, int]:
+	core, probe = make_core(model_manager(SlowAsyncProvider), runtime)
+	t = threading.Thread(target = core.run)
+	t.start()
+	time.sleep(0.1)
+
+	start = time.perf_counter()
+	for _ in range(CONCURRENT): core.eventbus.emit(prompt_event())
+
+	while probe.responses < CONCURRENT:
+		time.sleep(0.01)
+	elapsed = time.perf_counter() - start
+	threads = threading.active_count()
+
+	stop(core, t)
+	return elapsed, threads
+
+
+def main():
+	for label, model in (("async", model_manager(SlowProvider)), ("blocking", BlockingModelManager)):
+		latencies = sorted(command_latency(model))
+		p50 = statistics.median(latencies)
+		worst = latencies[-1]
+		print(
+			f"model manager = {label:<9} command latency p50 = {p50 * 1e3:8.2f}ms, " \
+			f"max = {worst * 1e3:8.2f}ms"
+		)
+
+		if label == "async":
+			status = "PASS" if worst < LATENCY_LIMIT else "FAIL"
+			print(f"{status}: max command latency under {LATENCY_LIMIT * 1e3:.0f}ms during a generation")
+
+	for runtime in ("threads", "asyncio"):
+		elapsed, threads = concurrent_generations(runtime)
+		print(
+			f"runtime = {runtime:<8} {CONCURRENT} concurrent generations of {GENERATION_TIME}s " \
+			f"took {elapsed:.2f}s with {threads} threads alive"
+		)
+
+
+if __name__ == "__main__":
+	main()
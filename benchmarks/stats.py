@@ -0,0 +1,63 @@
+"""
+Benchmark for the cost of the stats instrumentation.
+
+Delivers EVENTS events to a module with a trivial handle() through an inline dispatcher, with the
+instrumentation off, on, and off again after having been on. Off must cost the same as it did
+before the instrumentation existed.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/stats.py
+"""
+
+import time
+from pathlib import Path
+from collections.abc import Callable
+
+from halogen.base import HalogenEvents, HalogenModule, HalogenConfig
+from halogen.core.dispatch import InlineDispatcher
+
+
+EVENTS = 500_000
+
+
+class Counter(HalogenModule):
+
+	def __init__(self, emit_event: Callable, config: HalogenConfig) -> None:
+		super().__init__(emit_event, config)
+		self.n = 0
+
+	def start(self): pass
+	def end(self): return (True, "")
+	def handled_events(self): return [HalogenEvents.LogEvent]
+
+	def handle(self, event: HalogenEvents.Event):
+		self.n += 1
+
+
+def on_error(module, event, e):
+	raise e
+
+
+def per_event(dispatcher: InlineDispatcher, events: list[HalogenEvents.Event]) -> float:
+	deliver = dispatcher.deliver
+	start = time.perf_counter()
+	for event in events: deliver(event)
+	return (time.perf_counter() - start) / len(events)
+
+
+def main():
+	module = Counter(lambda e: None, HalogenConfig("linux", Path("."), {}, False))
+	dispatcher = InlineDispatcher(module, on_error)
+
+	event = HalogenEvents.LogEvent("bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "info", "")
+	events = [event] * EVENTS
+
+	for label, on in (("off", False), ("on", True), ("off again", False)):
+		dispatcher.instrument(on)
+		print(f"stats {label:<9} {per_event(dispatcher, events) * 1e9:6.0f} ns/event")
+
+	histogram = dispatcher.timings[HalogenEvents.LogEvent]
+	print(f"measured while on: {histogram.summary()}")
+
+
+if __name__ == "__main__":
+	main()
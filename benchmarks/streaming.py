@@ -0,0 +1,97 @@
+"""
+Benchmark for streamed model responses.
+
+A fake provider sends a response the way a cloud model does: a piece of text every INTERVAL
+seconds. The ModelManager answers the same prompt with streaming off (the client gets the
+message once the whole response is in) and on (the client gets the message piece by piece),
+and the time until the client has the first piece of the message and the whole response is
+printed for both.
+
+The MessageExtractor, which has to keep up with every piece, is timed on its own as well.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/streaming.py
+"""
+
+import asyncio, json, time
+from collections.abc import Iterator
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.modules.model.module import HalogenModelManager
+from halogen.modules.model.base import BaseModelProvider, ModelResponse, MessageExtractor
+
+
+INTERVAL = 0.02 # between two pieces of the response
+PIECE = 24 # characters per piece
+
+
+RESPONSE = json.dumps({
+	"message" : "Sure! Here is what is on your calendar today:\n" + "- a meeting at 10:00 \"planning\"\n" * 20,
+	"tasks" : [{"namespace" : "calendar", "task_name" : "list", "args" : ["today"]}],
+	"extras" : [{"key" : "mood", "value" : "helpful"}]
+})
+
+
+class FakeProvider(BaseModelProvider):
+	streaming = True
+
+	def pieces(self) -> Iterator[str]:
+		for i in range(0, len(RESPONSE), PIECE):
+			time.sleep(INTERVAL)
+			yield RESPONSE[i:i + PIECE]
+
+	def generate(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		return ModelResponse.model_validate_json("".join(self.pieces()))
+
+	def stream(self, prompt: HalogenEvents.PromptEvent) -> Iterator[str]:
+		yield from self.pieces()
+
+
+def run(stream: bool) -> tuple[float, float]:
+	"Time until the first piece of the message and until the full response reached the client."
+	start = time.perf_counter()
+	first = full = 0.0
+
+	def emit(event: HalogenEvents.Event):
+		nonlocal first, full
+		match event:
+			case HalogenEvents.AIResponseDeltaEvent() | HalogenEvents.AIResponseEvent():
+				first = first or time.perf_counter() - start
+				if isinstance(event, HalogenEvents.AIResponseEvent):
+					full = time.perf_counter() - start
+
+	config = HalogenConfig("linux", Path("."), {"stream" : stream}, False)
+	manager = HalogenModelManager(emit, config)
+	manager.current_provider = FakeProvider(config)
+
+	prompt = HalogenEvents.PromptEvent("bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "")
+	asyncio.run(manager.generate_response(prompt))
+	return first, full
+
+
+def extractor_throughput() -> float:
+	text = RESPONSE
+	rounds = 2000
+
+	start = time.perf_counter()
+	for _ in range(rounds):
+		extractor = MessageExtractor()
+		for i in range(0, len(text), PIECE):
+			extractor.feed(text[i:i + PIECE])
+	return len(text) * rounds / (time.perf_counter() - start) / 1e6
+
+
+def main():
+	pieces = -(-len(RESPONSE) // PIECE)
+	print(f"response: {len(RESPONSE)} bytes in {pieces} pieces, one every {INTERVAL * 1000:.0f}ms")
+
+	for stream in (False, True):
+		first, full = run(stream)
+		label = "streaming" if stream else "whole"
+		print(f"{label:<10} first text after {first * 1000:7.1f}ms, full response after {full * 1000:7.1f}ms")
+
+	print(f"MessageExtractor: {extractor_throughput():.1f} MB/s in {PIECE} character pieces")
+
+
+if __name__ == "__main__":
+	main()
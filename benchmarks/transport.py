@@ -0,0 +1,86 @@
+"""
+Benchmark for the round trip latency over TCP and over the unix socket.
+
+Runs a HalogenServer on its own (no core) listening on both, which answers every UserInputEvent
+with an AIResponseEvent. A single client sends ROUNDS messages one after the other over each
+transport and the time from sending a message to receiving its response is recorded.
+
+Run from the repo root with: PYTHONPATH=. python benchmarks/transport.py
+"""
+
+import json, socket, tempfile, time
+from dataclasses import asdict
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig
+from halogen.base.histogram import Histogram
+from halogen.modules.server import HalogenServer
+from halogen.modules.server.protocol import FrameReader, encode_frame
+
+
+ROUNDS = 5000
+
+
+class Server(HalogenServer):
+	PORT = 0 # any free port
+
+
+def answer(server: HalogenServer, event: HalogenEvents.Event):
+	match event:
+		case HalogenEvents.ClientActivationEvent():
+			server.handle(event)
+		case HalogenEvents.UserInputEvent():
+			server.handle(HalogenEvents.AIResponseEvent(
+				"bench", HalogenEvents.make_timestamp(), event.chain, event.message, {}
+			))
+
+
+def receive(sock: socket.socket, reader: FrameReader) -> dict:
+	while True:
+		frames = reader.frames()
+		if frames: return json.loads(frames[0])
+		if not reader.recv(sock): raise ConnectionError("server closed the connection")
+
+
+def round_trips(sock: socket.socket) -> Histogram:
+	reader = FrameReader()
+	chain = receive(sock, reader)["payload"]["chain"]
+
+	event = HalogenEvents.UserInputEvent("bench", HalogenEvents.make_timestamp(), HalogenEvents.chain(), "ping")
+	payload = asdict(event)
+	payload["chain"] = chain
+	request = encode_frame(json.dumps({"type" : "UserInputEvent", "payload" : payload}))
+
+	latency = Histogram()
+	for _ in range(ROUNDS):
+		start = time.perf_counter_ns()
+		sock.sendall(request)
+		receive(sock, reader)
+		latency.record(time.perf_counter_ns() - start)
+
+	sock.close()
+	return latency
+
+
+def main():
+	path = Path(tempfile.mkdtemp()) / "bench.sock"
+	config = HalogenConfig("linux", Path("."), {"socket_path" : str(path)}, False)
+
+	server: HalogenServer
+	server = Server(lambda event: answer(server, event), config)
+	server.start()
+
+	tcp = socket.create_connection(server.socket.getsockname())
+	tcp.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	print(f"tcp:  {round_trips(tcp).summary()}")
+
+	unix = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	unix.connect(str(path))
+	print(f"unix: {round_trips(unix).summary()}")
+
+	server.end()
+	path.parent.rmdir()
+
+
+if __name__ == "__main__":
+	main()
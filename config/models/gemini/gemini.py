@@ -1,5 +1,6 @@
 
 import json
+from collections.abc import Iterator, AsyncIterator
 from halogen.base import HalogenEvents, HalogenConfig
 from halogen.modules.model.base import (
 	ModelResponse,
@@ -15,6 +16,8 @@ from google.genai import types
 
 class Gemini(BaseModelProvider):
 
+	streaming = True
+
 	def __init__(self, config: HalogenConfig) -> None:
 		super().__init__(config)
 
@@ -72,8 +75,69 @@ class Gemini(BaseModelProvider):
 			msg = f"Client Error (Code:{e.code}) {e.message}!"
 			raise HalogenModelResponseError(msg)
 
+		self.count_usage(response)
 		res: BaseModelReponse = response.parsed 
 		return res
+
+
+	async def generate_async(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+
+		try:
+			response = await self.client.aio.models.generate_content(
+				model = self.current_model,
+				contents = prompt.content,
+				config = self.content_config
+			)
+		except genai.errors.ClientError as e:
+			msg = f"Client Error (Code:{e.code}) {e.message}!"
+			raise HalogenModelResponseError(msg)
+
+		self.count_usage(response)
+		res: BaseModelReponse = response.parsed 
+		return res
+
+
+	def stream(self, prompt: HalogenEvents.PromptEvent) -> Iterator[str]:
+
+		usage = None
+		try:
+			for chunk in self.client.models.generate_content_stream(
+				model = self.current_model,
+				contents = prompt.content,
+				config = self.content_config
+			):
+				usage = chunk if chunk.usage_metadata else usage
+				if chunk.text: yield chunk.text
+		except genai.errors.ClientError as e:
+			msg = f"Client Error (Code:{e.code}) {e.message}!"
+			raise HalogenModelResponseError(msg)
+
+		# the usage is reported with the last chunk
+		if usage: self.count_usage(usage)
+
+
+	async def stream_async(self, prompt: HalogenEvents.PromptEvent) -> AsyncIterator[str]:
+
+		usage = None
+		try:
+			async for chunk in await self.client.aio.models.generate_content_stream(
+				model = self.current_model,
+				contents = prompt.content,
+				config = self.content_config
+			):
+				usage = chunk if chunk.usage_metadata else usage
+				if chunk.text: yield chunk.text
+		except genai.errors.ClientError as e:
+			msg = f"Client Error (Code:{e.code}) {e.message}!"
+			raise HalogenModelResponseError(msg)
+
+		if usage: self.count_usage(usage)
+
+
+	def count_usage(self, response: types.GenerateContentResponse):
+		usage = response.usage_metadata
+		if usage:
+			self.count_tokens(usage.prompt_token_count, usage.candidates_token_count)
 	
 		
 	def send_request(self, content: str):
@@ -3,4 +3,8 @@ from .module import HalogenModule
 from .config import HalogenConfig, HalogenConfigLoader
 from .decos import HalogenCommand
 from .error import HalogenError
-from .chain import Chain
\ No newline at end of file
+from .chain import Chain
+from .writer import HalogenWriter
+from .rotation import LogRotation
+from .metrics import HalogenMetrics
+from .profiler import HalogenProfiler
\ No newline at end of file
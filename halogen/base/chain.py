@@ -1,6 +1,7 @@
 from dataclasses import dataclass
+from itertools import count
 
-@dataclass(frozen = True)
+@dataclass(frozen = True, slots = True)
 class Chain():
 	"""
 	An event's identifier giving insight on:
@@ -27,4 +28,29 @@ class Chain():
 	
 	def __eq__(self, other) -> bool:
 		return (self.context, self.flow) == (other.context, other.flow)
-	
\ No newline at end of file
+
+
+
+class ChainAllocator():
+	"""
+	Hands out new chains without any locking. next() on an itertools.count is a single C call,
+	so two threads can never get the same value under the GIL.
+	"""
+	__slots__ = ("flows", "contexts", "last")
+
+	def __init__(self) -> None:
+		self.flows = count()
+		self.contexts = count(1)
+		self.last = Chain(0, 0)
+
+
+	def flow(self) -> Chain:
+		"A new flow in context 0."
+		chain = Chain(0, next(self.flows))
+		self.last = chain
+		return chain
+
+
+	def context(self) -> Chain:
+		"A new context, starting at flow 0."
+		return Chain(next(self.contexts), 0)
@@ -2,9 +2,9 @@ from typing import Any, Callable, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Literal, Union
-import threading
+import time
 
-from .chain import Chain
+from .chain import Chain, ChainAllocator
 
 
 class HalogenEvents():
@@ -12,9 +12,7 @@ class HalogenEvents():
 	All Halogen Events and helper functions.
 	"""
 	Chain = Chain
-	_lock = threading.Lock()
-	_intern_chain = Chain(0, 0)
-	_current_context = 0
+	_allocator = ChainAllocator()
 	_intern_map: dict[str, type["Event"]] = {}
 
 	@classmethod
@@ -22,30 +20,67 @@ class HalogenEvents():
 		"Class Method to chain events. If None, returns a new chain."
 		if isinstance(event, cls.Event):
 			return event.chain
-		else:
-			chain = cls._intern_chain
-			with cls._lock: 
-				cls._intern_chain = Chain(
-					0,
-					chain.flow + 1
-				)
-			return chain
+		return cls._allocator.flow()
 		
 		
 	@classmethod
 	def new_context_chain(cls) -> Chain:
 		"Method for getting a chain with a new context. Should only be used by Halogen Server!"
-		with cls._lock: cls._current_context += 1
-		chain = Chain(
-			cls._current_context, 0
-		)
-		return chain
+		return cls._allocator.context()
 	
 
 	@classmethod
-	def make_timestamp(cls):
-		"Class method for giving a standard timestamp format for all events."
-		return datetime.now().strftime("%H:%M:%S")
+	def last_chain(cls) -> Chain:
+		"The most recent chain handed out by .chain()."
+		return cls._allocator.last
+
+
+	log_levels = {"debug" : 0, "info" : 1, "warning" : 2, "critical" : 3}
+
+	# published by the core from the logger's config, everything is logged until then
+	log_threshold = 0
+
+	@classmethod
+	def set_log_level(cls, level: str) -> bool:
+		"""
+		Publishes the level logs are kept at. Logs below it are dropped before they are even made,
+		see HalogenModule.log(). Returns False if the level is invalid.
+		"""
+		if level not in cls.log_levels:
+			return False
+		cls.log_threshold = cls.log_levels[level]
+		return True
+
+
+	@classmethod
+	def is_logged(cls, level: str) -> bool:
+		"Whether a log of this level would be kept. Useful to skip work only done for a log."
+		return cls.log_levels[level] >= cls.log_threshold
+
+
+	@classmethod
+	def make_timestamp(cls) -> int:
+		"""
+		Class method for giving a standard timestamp for all events: nanoseconds since the epoch.
+		Use .format_timestamp() when it actually needs to be shown.
+		"""
+		return time.time_ns()
+
+
+	_formatted_second: tuple[int, str] = (-1, "")
+
+	@classmethod
+	def format_timestamp(cls, timestamp: int) -> str:
+		"Formats an event timestamp as HH:MM:SS. Events from the same second share the work."
+		second = timestamp // 1_000_000_000
+
+		cached = cls._formatted_second
+		if cached[0] == second:
+			return cached[1]
+
+		text = datetime.fromtimestamp(second).strftime("%H:%M:%S")
+		cls._formatted_second = (second, text)
+		return text
 			
 	
 	@classmethod
@@ -66,41 +101,41 @@ class HalogenEvents():
 		
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class Event():
-		"Base event class."
+		"Base event class. Events are slotted so the ones flooding the bus (logs) stay small."
 		sender: str
-		timestamp: str 
+		timestamp: int
 		chain: Chain
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class InitCompleteEvent(Event):
 		"An event passed just before the main loop starts."
 		pass
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class LogEvent(Event):
 		"Event that the logger module listens for."
 		level: Literal["debug", "info", "warning", "critical"]
 		message: str
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class ShutdownEvent(Event):
 		"Sent to core to intiate a shutdown."
 		emergency: bool
 		reason: str = ""
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class RestartEvent(Event):
 		"Sent to core to intiate a restart."
 		reason: str = ""
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class CommandRegisterEvent(Event):
 		"Sent to command handler to register a command"
 		module: str
@@ -109,7 +144,7 @@ class HalogenEvents():
 		func: Callable[[list[str], "HalogenEvents.Chain"], str]
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class CommandEvent(Event):
 		"Command that the command handler can execute."
 		module: str
@@ -117,7 +152,7 @@ class HalogenEvents():
 		args: list[str]
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class CommandExecutedEvent(Event):
 		"The output of an executed command."
 		cmd: tuple[str, str, list[str]]
@@ -125,7 +160,7 @@ class HalogenEvents():
 		output: str
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class ConfirmationEvent(Event):
 		"Used for confirmation with the user."
 		message: str
@@ -133,43 +168,54 @@ class HalogenEvents():
 		selected: str | None
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class ErrorEvent(Event):
 		"In case something goes wrong."
 		error: str
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class UserInputEvent(Event):
 		"All user messages are sent using this event."
 		message: str
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class NotifyEvent(Event):
 		"Modules can use this event to send a message to the AI."
 		message: str
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class PromptEvent(Event):
 		"Event passed by the prompt manager after it assembles the prompt"
 		content: str
 
 
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
 	class AIResponseEvent(Event):
 		"The response generated by the AI model."
 		message: str
 		extras: dict[str, Any]
 
 	
-	@dataclass(frozen = True)
+	@dataclass(frozen = True, slots = True)
+	class AIResponseDeltaEvent(Event):
+		"""
+		A piece of the AI response's message while it is being generated, sent to the client before
+		the full AIResponseEvent (same chain) which is what should be kept in the end.
+		Offset is where the delta starts in the message, so a missed delta can be noticed.
+		"""
+		delta: str
+		offset: int
+
+	
+	@dataclass(frozen = True, slots = True)
 	class ClientActivationEvent(Event):
 		"The first event passed by the server to the client so it can initialize its chain."
 		message: str
 
 	
-	@dataclass(frozen= True)
+	@dataclass(frozen = True, slots = True)
 	class TaskRegisterEvent(Event):
 		"Event passed to task manager to register an new task."
 		namespace: str
@@ -179,7 +225,7 @@ class HalogenEvents():
 		func: Callable[[list[str], Chain], str]
 
 
-	@dataclass(frozen= True)
+	@dataclass(frozen = True, slots = True)
 	class TaskRegisteredEvent(Event):
 		namespace: str
 		task_name: str
@@ -187,7 +233,7 @@ class HalogenEvents():
 		info: str
 
 
-	@dataclass(frozen= True)
+	@dataclass(frozen = True, slots = True)
 	class TaskEvent(Event):
 		"Start a new task."
 		namespace: str
@@ -195,7 +241,7 @@ class HalogenEvents():
 		args: list[str]
 
 
-	@dataclass(frozen= True)
+	@dataclass(frozen = True, slots = True)
 	class TaskCompletionEvent(Event):
 		"The result of a task."
 		namespace: str
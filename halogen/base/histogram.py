@@ -0,0 +1,73 @@
+class Histogram():
+	"""
+	Latency histogram with power of two buckets, in nanoseconds. Recording is a few integer
+	operations, so it is cheap enough to keep on hot paths. Quantiles are only as precise as the
+	buckets: the upper bound of the bucket the quantile falls in is returned.
+	"""
+	__slots__ = ("buckets", "count", "total", "max")
+
+	def __init__(self) -> None:
+		self.buckets = [0] * 64
+		self.count = 0
+		self.total = 0
+		self.max = 0
+
+
+	def record(self, ns: int):
+		bucket = ns.bit_length()
+		self.buckets[bucket if bucket < 64 else 63] += 1
+		self.count += 1
+		self.total += ns
+		if ns > self.max: self.max = ns
+
+
+	def merge(self, other: "Histogram"):
+		for i, n in enumerate(other.buckets): self.buckets[i] += n
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+
+
+	def mean(self) -> float:
+		return self.total / self.count if self.count else 0.0
+
+
+	def quantile(self, q: float) -> int:
+		if not self.count: return 0
+
+		target = q * self.count
+		seen = 0
+		for i, n in enumerate(self.buckets):
+			seen += n
+			if seen >= target:
+				return min(1 << i, self.max)
+		return self.max
+
+
+	def summary(self) -> str:
+		return f"n = {self.count}, mean = {format_ns(self.mean())}, " \
+			f"p50 = {format_ns(self.quantile(0.5))}, p99 = {format_ns(self.quantile(0.99))}, " \
+			f"max = {format_ns(self.max)}"
+
+
+	def render(self, width: int = 40) -> str:
+		"The non empty buckets as a text bar chart."
+		if not self.count: return "(empty)"
+
+		used = [i for i, n in enumerate(self.buckets) if n]
+		peak = max(self.buckets)
+
+		lines = []
+		for i in range(used[0], used[-1] + 1):
+			n = self.buckets[i]
+			bar = "#" * max(1 if n else 0, round(n / peak * width))
+			lines.append(f"<= {format_ns(1 << i):>9} | {bar:<{width}} {n}")
+		return "\n".join(lines)
+
+
+
+def format_ns(ns: float) -> str:
+	if ns < 1e3: return f"{ns:.0f}ns"
+	if ns < 1e6: return f"{ns / 1e3:.1f}us"
+	if ns < 1e9: return f"{ns / 1e6:.1f}ms"
+	return f"{ns / 1e9:.2f}s"
@@ -0,0 +1,205 @@
+import threading
+from collections.abc import Callable
+from typing import TypeVar
+
+from .histogram import Histogram
+
+
+Labels = tuple[str, ...]
+M = TypeVar("M", bound = "Metric")
+
+
+class Metric():
+	"""
+	A named metric with one value per set of label values. Updated by whichever thread measured
+	something and read by the metrics endpoint, so every access takes the metric's lock.
+	"""
+	kind = "untyped"
+
+	def __init__(self, name: str, info: str, labels: Labels = ()) -> None:
+		self.name = name
+		self.info = info
+		self.labels = labels
+		self.lock = threading.Lock()
+		self.values: dict[Labels, float] = {}
+
+
+	def set(self, value: float, labels: Labels = ()):
+		with self.lock: self.values[labels] = value
+
+
+	def clear(self):
+		with self.lock: self.values.clear()
+
+
+	def label_string(self, values: Labels, extra: str = "") -> str:
+		pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labels, values)]
+		if extra: pairs.append(extra)
+		return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+	def samples(self) -> list[str]:
+		with self.lock: values = list(self.values.items())
+		return [f"{self.name}{self.label_string(labels)} {format_value(v)}" for labels, v in values]
+
+
+	def render(self) -> list[str]:
+		return [f"# HELP {self.name} {self.info}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+
+class Counter(Metric):
+	"""
+	Only goes up. Use .set() for totals counted somewhere else, like the event bus.
+	"""
+	kind = "counter"
+
+	def inc(self, amount: float = 1, labels: Labels = ()):
+		with self.lock: self.values[labels] = self.values.get(labels, 0) + amount
+
+
+
+class Gauge(Metric):
+	kind = "gauge"
+
+
+
+class HistogramMetric(Metric):
+	"""
+	Exports Histograms (nanoseconds) as a histogram in seconds. Only the buckets 2^low to 2^high ns
+	are exported, so the bucket set stays the same between scrapes.
+	Histograms kept somewhere else (like the dispatchers' timings) can be exported with .attach().
+	"""
+	kind = "histogram"
+
+	def __init__(self, name: str, info: str, labels: Labels = (), low: int = 10, high: int = 36) -> None:
+		super().__init__(name, info, labels)
+		self.low = low
+		self.high = high
+		self.histograms: dict[Labels, Histogram] = {}
+
+
+	def observe(self, ns: int, labels: Labels = ()):
+		with self.lock:
+			histogram = self.histograms.get(labels)
+			if histogram is None:
+				histogram = self.histograms[labels] = Histogram()
+			histogram.record(ns)
+
+
+	def attach(self, histograms: dict[Labels, Histogram]):
+		"Replaces every series with the given histograms. They are read, never written."
+		with self.lock: self.histograms = dict(histograms)
+
+
+	def clear(self):
+		with self.lock: self.histograms.clear()
+
+
+	def samples(self) -> list[str]:
+		with self.lock: histograms = list(self.histograms.items())
+
+		lines = []
+		for labels, histogram in histograms:
+			# bucket i holds values below 2^i, anything lower than 2^low is in the first one
+			seen = sum(histogram.buckets[:self.low + 1])
+			for i in range(self.low, self.high + 1):
+				if i > self.low: seen += histogram.buckets[i]
+				le = 'le="' + format_value((1 << i) / 1e9) + '"'
+				lines.append(f"{self.name}_bucket{self.label_string(labels, le)} {seen}")
+
+			le = 'le="+Inf"'
+			lines.append(f"{self.name}_bucket{self.label_string(labels, le)} {histogram.count}")
+			lines.append(f"{self.name}_sum{self.label_string(labels)} {format_value(histogram.total / 1e9)}")
+			lines.append(f"{self.name}_count{self.label_string(labels)} {histogram.count}")
+
+		return lines
+
+
+
+class HalogenMetrics():
+	"""
+	The process wide metrics registry, in the Prometheus text format.
+
+	Modules create their metrics once and update them where they measure something:
+
+		requests = HalogenMetrics.counter("halogen_model_requests_total", "Model requests.", ("provider",))
+		requests.inc(labels = ("gemini",))
+
+	Values that already exist somewhere else are better read when scraped, by a collector. It is
+	called on the thread serving the scrape, so it should only read.
+
+	Creating a metric that already exists returns the existing one, so restarted modules keep
+	updating the same series. Nothing is exported unless the server's metrics endpoint is on.
+	"""
+
+	lock = threading.Lock()
+	metrics: dict[str, Metric] = {}
+	collectors: dict[str, Callable[[], None]] = {}
+
+
+	@classmethod
+	def register(cls, kind: type[M], name: str, info: str, labels: Labels = (), **kw) -> M:
+		with cls.lock:
+			metric = cls.metrics.get(name)
+			if metric is None:
+				metric = cls.metrics[name] = kind(name, info, labels, **kw)
+
+		if not isinstance(metric, kind):
+			raise TypeError(f"Metric '{name}' is already registered as a {metric.kind}.")
+		return metric
+
+
+	@classmethod
+	def counter(cls, name: str, info: str, labels: Labels = ()) -> Counter:
+		return cls.register(Counter, name, info, labels)
+
+
+	@classmethod
+	def gauge(cls, name: str, info: str, labels: Labels = ()) -> Gauge:
+		return cls.register(Gauge, name, info, labels)
+
+
+	@classmethod
+	def histogram(cls, name: str, info: str, labels: Labels = (), low: int = 10, high: int = 36) -> HistogramMetric:
+		return cls.register(HistogramMetric, name, info, labels, low = low, high = high)
+
+
+	@classmethod
+	def collector(cls, key: str, collect: Callable[[], None]):
+		"Adds (or replaces) a function that updates metrics right before every scrape."
+		with cls.lock: cls.collectors[key] = collect
+
+
+	@classmethod
+	def remove_collector(cls, key: str):
+		with cls.lock: cls.collectors.pop(key, None)
+
+
+	@classmethod
+	def render(cls) -> str:
+		with cls.lock: collectors = list(cls.collectors.values())
+
+		for collect in collectors:
+			try:
+				collect()
+			except Exception:
+				pass # a broken collector should not take the whole endpoint with it
+
+		with cls.lock: metrics = list(cls.metrics.values())
+
+		lines = []
+		for metric in metrics:
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+
+
+def escape(value: str) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+	if isinstance(value, int) or value.is_integer():
+		return str(int(value))
+	return repr(value)
@@ -29,10 +29,21 @@ class HalogenModule(ABC):
 	5) A .handled_events() which returns a list of events that the module can handle. Only events listed
 	here will be sent by the core to this module.
 
+	6) Optionally, set self.execution in __init__ to decide where .handle() runs:
+	'inline' (default) runs it on the core thread, 'worker' gives the module its own thread and 
+	'pool' runs it on a thread pool shared with other modules. Use 'worker' or 'pool' if handling 
+	an event can block (network requests, disk heavy work etc.) so other modules are not stalled. 
+	Events are always handled one at a time and in order, whatever the mode.
+
+	7) .handle() may also be defined as 'async def handle'. The module then runs on an asyncio loop 
+	(the core's own loop when core.runtime is 'asyncio') and self.execution is ignored. Such modules 
+	can set self.concurrency to handle more than one event at a time, giving up the ordering.
+
 	Other than these some functions that are already defined include:
 
 	1) .emit_event() for sending events to the core. Do not use the raw .eventbus_emit().
-	2) .log() which is a shorthand to making a log event and emitting it.
+	2) .log() which is a shorthand to making a log event and emitting it. Logs below the configured 
+	level are dropped right away, pass a lambda as the message if building it is not free.
 	
 	"""
 
@@ -42,6 +53,8 @@ class HalogenModule(ABC):
 		self.config = config 
 		self.has_commands = False
 		self.has_tasks = False
+		self.execution: Literal["inline", "worker", "pool"] = "inline"
+		self.concurrency = 1
 
 
 	@classmethod
@@ -120,11 +133,18 @@ class HalogenModule(ABC):
 		self, 
 		chain: Chain,
 		level: Literal["debug", "info", "warning", "critical"],
-		msg: str
+		msg: str | Callable[[], str]
 	):
 		"""
 		Shorthand for creating a log event and emitting it to the bus.
+		Does nothing if the level is below the configured one. If msg is a callable, it is only 
+		called when the log is actually kept.
 		"""
+		if HalogenEvents.log_levels[level] < HalogenEvents.log_threshold:
+			return
+
+		if callable(msg): msg = msg()
+
 		event = HalogenEvents.LogEvent(
 			self.name(),
 			HalogenEvents.make_timestamp(),
@@ -0,0 +1,133 @@
+import sys, threading, time
+from pathlib import Path
+from types import CodeType
+
+
+class HalogenProfiler():
+	"""
+	Sampling profiler for every thread of the process.
+
+	Every 'interval' seconds the profiler thread takes the current stack of all other threads
+	(sys._current_frames) and counts how often each stack was seen. Nothing is traced, the
+	profiled threads are only held up by the GIL while a sample is taken, so it can be left running
+	on a live instance. The result is written in the collapsed stack format, one line per stack:
+
+		<thread>;<outermost frame>;...;<innermost frame> <samples>
+
+	which flamegraph.pl, speedscope and inferno read as is.
+	"""
+
+	def __init__(self, interval: float = 0.005) -> None:
+		self.interval = interval
+
+		# (thread name, code objects from the outermost frame) to samples
+		self.stacks: dict[tuple, int] = {}
+		self.samples = 0
+		self.started = 0.0
+
+		self.stopped = threading.Event()
+		self.thread: threading.Thread | None = None
+
+
+	@property
+	def running(self) -> bool:
+		return self.thread is not None
+
+
+	def start(self) -> bool:
+		"Returns False if already running. Samples from a previous run are dropped."
+		if self.thread: return False
+
+		self.stacks = {}
+		self.samples = 0
+		self.started = time.monotonic()
+
+		self.stopped.clear()
+		self.thread = threading.Thread(target = self.run, name = "halogen-profiler", daemon = True)
+		self.thread.start()
+		return True
+
+
+	def stop(self) -> bool:
+		"Returns False if not running. The samples are kept until the next .start()."
+		if not self.thread: return False
+
+		self.stopped.set()
+		self.thread.join()
+		self.thread = None
+		return True
+
+
+	def run(self):
+		own = threading.get_ident()
+		names: dict[int, str] = {}
+
+		while not self.stopped.wait(self.interval):
+			frames = sys._current_frames()
+
+			if len(names) != len(frames) or frames.keys() - names.keys():
+				names = {t.ident: t.name for t in threading.enumerate()}
+
+			for ident, frame in frames.items():
+				if ident == own: continue
+
+				codes = []
+				while frame is not None:
+					codes.append(frame.f_code)
+					frame = frame.f_back
+
+				key = (names.get(ident, str(ident)), *reversed(codes))
+				self.stacks[key] = self.stacks.get(key, 0) + 1
+
+			self.samples += 1
+
+
+	def collapsed(self) -> list[str]:
+		"The samples in the collapsed stack format, most sampled stack first."
+		labels: dict[CodeType, str] = {}
+		lines = []
+
+		for (thread, *codes), n in sorted(self.stacks.items(), key = lambda item: item[1], reverse = True):
+			parts = [thread.replace(";", ":").replace(" ", "_")]
+			for code in codes:
+				label = labels.get(code)
+				if label is None:
+					label = labels[code] = frame_label(code)
+				parts.append(label)
+			lines.append(f"{';'.join(parts)} {n}")
+
+		return lines
+
+
+	def write(self, path: Path) -> int:
+		"Writes the collapsed stacks to path. Returns how many stacks were written."
+		lines = self.collapsed()
+		path.write_text("\n".join(lines) + "\n" if lines else "")
+		return len(lines)
+
+
+	def summary(self, top: int = 10) -> str:
+		"The functions the threads were seen in the most, innermost frame only."
+		elapsed = (time.monotonic() - self.started) if self.started else 0.0
+		state = "running" if self.running else "stopped"
+
+		own: dict[str, int] = {}
+		for (thread, *codes), n in list(self.stacks.items()):
+			if not codes: continue
+			label = frame_label(codes[-1])
+			own[label] = own.get(label, 0) + n
+
+		total = sum(own.values()) or 1
+		lines = [f"Profiler is {state}. {self.samples} samples over {elapsed:.1f}s, every {self.interval * 1000:g}ms."]
+
+		for label, n in sorted(own.items(), key = lambda item: item[1], reverse = True)[:top]:
+			lines.append(f"{n / total:>6.1%} {label}")
+
+		return "\n".join(lines)
+
+
+
+def frame_label(code: CodeType) -> str:
+	"module:function, like 'eventbus:EventBus.wait'."
+	name = getattr(code, "co_qualname", code.co_name)
+	return f"{Path(code.co_filename).stem}:{name}".replace(";", ":").replace(" ", "_")
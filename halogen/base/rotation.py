@@ -0,0 +1,134 @@
+import gzip, re, shutil, time
+from pathlib import Path
+from typing import Literal
+
+from .config import HalogenConfig
+
+try:
+	from compression import zstd # python 3.14+
+except ImportError:
+	zstd = None
+
+
+Compression = Literal["none", "gzip", "zstd"]
+
+
+class LogRotation():
+	"""
+	When a file written by a HalogenWriter should be rotated, and what happens to the old ones.
+
+	A file is rotated once it is bigger than 'max_bytes' or older than 'interval' seconds (0 turns
+	either check off). The rotated file is renamed to '<name>.<date>-<time>', compressed into
+	'<name>.<date>-<time>.gz' (or .zst) and only the newest 'archives' of those are kept.
+	The writer renames the file on its own thread and leaves the compressing to another one.
+	"""
+
+	suffixes = {"none" : "", "gzip" : ".gz", "zstd" : ".zst"}
+
+	def __init__(
+		self,
+		max_bytes: int = 0,
+		interval: float = 0.0,
+		archives: int = 5,
+		compression: Compression = "gzip"
+		) -> None:
+
+		self.max_bytes = max_bytes
+		self.interval = interval
+		self.archives = max(1, archives)
+
+		if compression not in self.suffixes:
+			compression = "gzip"
+		if compression == "zstd" and zstd is None:
+			compression = "gzip"
+		self.compression: Compression = compression
+
+
+	@classmethod
+	def from_config(cls, config: HalogenConfig) -> "LogRotation | None":
+		"""
+		Reads rotate_mb, rotate_hours, archives and compression from a module's config.
+		Returns None if rotation is turned off.
+		"""
+		max_mb = config.get("rotate_mb", 0)
+		hours = config.get("rotate_hours", 0)
+
+		if not max_mb and not hours:
+			return None
+
+		return cls(
+			int(max_mb * 1024 * 1024),
+			hours * 3600,
+			config.get("archives", 5),
+			config.get("compression", "gzip")
+		)
+
+
+	@classmethod
+	def available(cls, compression: str) -> bool:
+		if compression == "zstd":
+			return zstd is not None
+		return compression in cls.suffixes
+
+
+	def due(self, size: int, opened: float) -> bool:
+		if self.max_bytes and size >= self.max_bytes:
+			return True
+		if self.interval and time.time() - opened >= self.interval:
+			return True
+		return False
+
+
+	def rename(self, path: Path) -> Path:
+		"Moves the (closed) file out of the way. Returns where it went."
+		stamp = time.strftime("%Y%m%d-%H%M%S")
+		target = path.with_name(f"{path.name}.{stamp}")
+
+		n = 1
+		while target.exists() or target.with_name(target.name + self.suffixes[self.compression]).exists():
+			target = path.with_name(f"{path.name}.{stamp}-{n}")
+			n += 1
+
+		path.rename(target)
+		return target
+
+
+	def archive(self, rotated: Path, path: Path):
+		"Compresses a renamed file and removes the archives over the limit. Runs in the background."
+		try:
+			self.compress(rotated)
+		except OSError:
+			pass # the uncompressed file stays and still counts as an archive
+
+		self.prune(path)
+
+
+	def compress(self, source: Path):
+		match self.compression:
+			case "gzip":
+				target = gzip.open(source.with_name(source.name + ".gz"), "wb", compresslevel = 6)
+			case "zstd":
+				target = zstd.open(source.with_name(source.name + ".zst"), "wb")
+			case _:
+				return
+
+		with open(source, "rb") as src, target:
+			shutil.copyfileobj(src, target, 1024 * 1024)
+
+		source.unlink()
+
+
+	def prune(self, path: Path):
+		pattern = re.compile(re.escape(path.name) + r"\.(\d{8}-\d{6})(?:-(\d+))?(?:\.gz|\.zst)?$")
+
+		archives = []
+		for p in path.parent.iterdir():
+			match = pattern.match(p.name)
+			if match: archives.append((match.group(1), int(match.group(2) or 0), p))
+
+		archives.sort()
+		for *_, old in archives[:-self.archives]:
+			try:
+				old.unlink()
+			except OSError:
+				pass
@@ -0,0 +1,208 @@
+import threading, atexit, sys, time
+from collections import deque
+from pathlib import Path
+from typing import IO, Any
+from collections.abc import Callable
+
+from .rotation import LogRotation
+
+
+class HalogenWriter():
+	"""
+	Writes to a file or stream from a background thread so whoever produces the data never waits
+	on the disk (or the terminal).
+
+	The file is opened once and kept open. Written data goes into a bounded buffer that the thread
+	empties when either 'flush_lines' items are pending or 'flush_interval' seconds have passed,
+	whichever comes first, in a single write call. If the buffer is full, the oldest item is dropped
+	and the number of dropped items is written in its place on the next flush.
+
+	Everything still buffered is written on .close() (and .flush()), and at interpreter exit for
+	writers that were never closed.
+
+	Files opened with .open() can be rotated, see LogRotation. The check happens after each write,
+	so producers never wait on a rotation either, though compressing the archive still competes
+	with them for the GIL.
+
+	With an 'encode' function, anything can be written and the thread turns each batch of items into
+	the bytes or text to write. Encoded writers do not note dropped items in the output, see .lost.
+	"""
+
+	def __init__(
+		self,
+		stream: IO,
+		name: str = "halogen-writer",
+		capacity: int = 10000,
+		flush_interval: float = 0.5,
+		flush_lines: int = 256,
+		owns_stream: bool = True,
+		path: Path | None = None,
+		rotation: LogRotation | None = None,
+		encode: Callable[[list[Any]], str | bytes] | None = None
+		) -> None:
+
+		self.stream = stream
+		self.path = path
+		self.rotation = rotation if path else None
+		self.opened = time.time()
+		self.archiver: threading.Thread | None = None
+		self.binary = "b" in getattr(stream, "mode", "")
+		self.owns_stream = owns_stream
+
+		self.capacity = max(1, capacity)
+		self.flush_interval = flush_interval
+		self.flush_lines = max(1, flush_lines)
+
+		self.encode = encode
+		self.buffer: deque[Any] = deque(maxlen = self.capacity)
+		self.dropped = 0
+		self.lost = 0
+
+		self.cond = threading.Condition()
+		# held while writing to the stream so the thread and .flush() never interleave
+		self.io_lock = threading.Lock()
+
+		self.is_running = True
+		self.thread = threading.Thread(target = self.run, name = name, daemon = True)
+		self.thread.start()
+
+		atexit.register(self.close)
+
+
+	@classmethod
+	def open(cls, path: Path, binary: bool = False, **kwargs) -> "HalogenWriter":
+		"Opens the file in append mode and makes a writer for it."
+		return cls(cls.open_stream(path, binary), path = path, **kwargs)
+
+
+	@classmethod
+	def open_stream(cls, path: Path, binary: bool) -> IO:
+		if binary:
+			return open(path, "ab")
+		return open(path, "a", encoding = "utf-8")
+
+
+	@classmethod
+	def stdout(cls, **kwargs) -> "HalogenWriter":
+		"A writer for the terminal. The stream itself is never closed."
+		return cls(sys.stdout, owns_stream = False, **kwargs)
+
+
+	def write(self, data: Any):
+		"Queues data to be written. Never blocks on the stream."
+		buffer = self.buffer
+
+		if len(buffer) >= self.capacity:
+			# the deque drops the oldest item by itself, we only count it
+			self.dropped += 1
+
+		buffer.append(data)
+
+		if len(buffer) >= self.flush_lines:
+			with self.cond: self.cond.notify()
+
+
+	def pending(self) -> int:
+		return len(self.buffer)
+
+
+	def run(self):
+		while True:
+			with self.cond:
+				self.cond.wait_for(
+					lambda: len(self.buffer) >= self.flush_lines or not self.is_running,
+					self.flush_interval
+				)
+				running = self.is_running
+
+			self.flush()
+			if not running: return
+
+
+	def take(self) -> list[Any]:
+		buffer = self.buffer
+		items = []
+		try:
+			while True: items.append(buffer.popleft())
+		except IndexError:
+			pass
+		return items
+
+
+	def flush(self):
+		"Writes everything buffered right away, on the calling thread."
+
+		with self.io_lock:
+			if self.stream.closed: return
+
+			items = self.take()
+			if self.dropped:
+				self.lost += self.dropped
+				if not self.encode:
+					note = f"[writer] {self.dropped} lines were dropped, the buffer was full.\n"
+					items.insert(0, note.encode() if self.binary else note)
+				self.dropped = 0
+
+			if not items: return
+
+			if self.encode:
+				try:
+					data = self.encode(items)
+				except Exception:
+					# the batch is lost, but the thread keeps writing the next ones
+					self.lost += len(items)
+					return
+			else:
+				data = b"".join(items) if self.binary else "".join(items)
+
+			try:
+				self.stream.write(data)
+				self.stream.flush()
+
+				if self.rotation and self.rotation.due(self.stream.tell(), self.opened):
+					self.rotate()
+			except (OSError, ValueError):
+				pass # nowhere left to report it
+
+
+	def rotate(self):
+		"Swaps the file for a new one and archives the old one in the background. Holds io_lock."
+
+		self.stream.close()
+		try:
+			rotated = self.rotation.rename(self.path)
+		finally:
+			self.stream = self.open_stream(self.path, self.binary)
+			self.opened = time.time()
+
+		# one archive at a time, they are far apart anyway
+		if self.archiver: self.archiver.join()
+
+		self.archiver = threading.Thread(
+			target = self.rotation.archive,
+			args = (rotated, self.path),
+			name = "halogen-archiver",
+			daemon = True
+		)
+		self.archiver.start()
+
+
+	def close(self, timeout: float = 5.0):
+		"Stops the thread after it wrote everything buffered, then closes the file."
+
+		if not self.is_running: return
+
+		with self.cond:
+			self.is_running = False
+			self.cond.notify()
+
+		if self.thread is not threading.current_thread():
+			self.thread.join(timeout)
+
+		self.flush()
+		atexit.unregister(self.close)
+
+		if self.archiver: self.archiver.join(timeout)
+
+		if self.owns_stream:
+			with self.io_lock: self.stream.close()
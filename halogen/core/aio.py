@@ -0,0 +1,123 @@
+import asyncio, threading
+from typing import TYPE_CHECKING
+
+from halogen.base import HalogenEvents
+
+from .eventbus import EventBus
+
+if TYPE_CHECKING:
+	from .core import HalogenCore
+
+
+class AsyncEventBus(EventBus):
+	"""
+	EventBus for the asyncio runtime. Producers stay the same (any thread can emit without
+	blocking) but the consumer awaits an asyncio.Event instead of sleeping on a condition, so the
+	core loop can share its thread with async modules.
+
+	Until it is bound to a loop, it behaves exactly like the normal EventBus.
+	"""
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.loop: asyncio.AbstractEventLoop | None = None
+		self.wakeup: asyncio.Event | None = None
+
+
+	def bind(self, loop: asyncio.AbstractEventLoop):
+		self.loop = loop
+		self.wakeup = asyncio.Event()
+		self.consumer = threading.get_ident()
+
+
+	def wake(self):
+		if self.loop is None:
+			super().wake()
+			return
+
+		try:
+			self.loop.call_soon_threadsafe(self.wakeup.set)
+		except RuntimeError:
+			pass # loop already closed
+
+
+	async def receive_batch_async(self, max_n: int) -> list[HalogenEvents.Event]:
+		"Awaits until at least one event is available and then takes up to max_n events at once."
+
+		while not self.pending():
+			self.wakeup.clear()
+			self.waiting = True
+
+			# same handshake as .wait(), an emit after the flag was set will wake us up
+			if self.pending():
+				self.waiting = False
+				break
+
+			try:
+				await self.wakeup.wait()
+			finally:
+				self.waiting = False
+
+		return self.take(max_n)
+
+
+
+class BackgroundLoop():
+	"""
+	An asyncio loop running on its own thread. Async modules are driven by it when the core itself
+	runs on threads.
+	"""
+
+	def __init__(self) -> None:
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(
+			target = self.loop.run_forever,
+			name = "halogen-asyncio",
+			daemon = True
+		)
+
+
+	def start(self):
+		self.thread.start()
+
+
+	def stop(self, timeout: float):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join(timeout)
+		if not self.thread.is_alive(): self.loop.close()
+
+
+
+async def run_async(core: "HalogenCore"):
+	"The main loop of the core for the asyncio runtime. See HalogenCore.run for the threaded one."
+
+	bus: AsyncEventBus = core.eventbus
+	bus.bind(asyncio.get_running_loop())
+
+	core.start_modules()
+
+	while core.is_running:
+
+		batch = await bus.receive_batch_async(core.batch_size)
+
+		for i, event in enumerate(batch):
+			core.pass_events(event)
+
+			if core.shutdown_requested or core.restart_requested or not core.is_running:
+				bus.requeue(batch[i + 1:])
+				break
+
+		# give the async modules a turn before the next batch
+		await asyncio.sleep(0)
+
+		if not core.is_running: break
+
+		if core.shutdown_requested or core.restart_requested:
+			# the async modules live on this loop, so they must be let finish from here
+			await core.manager.stop_async_dispatchers()
+
+		if core.shutdown_requested:
+			core.shutdown()
+		elif core.restart_requested:
+			core.restart()
+			break
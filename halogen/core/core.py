@@ -1,16 +1,27 @@
-import time, os, threading
+import time, os, threading, asyncio, math
 from pathlib import Path
 from typing import Callable, MutableSequence, Literal
+from collections.abc import Iterable
 
 from halogen.base import (
 	HalogenModule, 
 	HalogenConfig,
 	HalogenConfigLoader,
-	HalogenEvents
+	HalogenEvents,
+	HalogenMetrics,
+	HalogenProfiler
 )
 
 from .eventbus import EventBus
 from .manager import HalogenModuleManager
+from .aio import AsyncEventBus, run_async
+from .journal import EventJournal
+from .stats import HalogenStats
+
+
+def valid_interval(interval: object) -> bool:
+	"Whether a profiler interval is a finite number above 0. Anything else makes the sampler spin."
+	return isinstance(interval, (int, float)) and not isinstance(interval, bool) and 0 < interval < math.inf
 
 
 
@@ -19,6 +30,11 @@ class HalogenCore():
 
 	def __init__(self) -> None:
 		self.eventbus = EventBus()
+		self.journal: EventJournal | None = None
+		self.stats: HalogenStats | None = None
+
+		# outlives restarts, a profile can be taken across one
+		self.profiler = HalogenProfiler()
 
 		self.core_events: MutableSequence[type[HalogenEvents.Event]] = [
 			HalogenEvents.ShutdownEvent,
@@ -26,16 +42,56 @@ class HalogenCore():
 		]
 
 
-	def init(self) -> None:
+	def init(
+		self,
+		config: HalogenConfig | None = None,
+		exclude: Iterable[type[HalogenModule]] = ()
+		) -> None:
+		"""
+		Loads the config and the modules. The config can be given instead of being loaded using the 
+		command line arguments, and modules can be left out (see halogen.core.replay).
+		"""
 
 		self.is_running: bool = True
 		self.shutdown_requested = False
 		self.restart_requested = False
 
-		self.config: HalogenConfig = HalogenConfigLoader().load()
-		self.manager = HalogenModuleManager(self.config, self.eventbus.emit)
+		# kept for restarts
+		self.injected = (config, exclude)
+		self.config: HalogenConfig = config or HalogenConfigLoader().load()
+
+		# the logger warns about invalid levels itself once it starts
+		if not HalogenEvents.set_log_level(self.config.get("logger.level", "info")):
+			HalogenEvents.set_log_level("info")
+
+		self.runtime: str = self.config.get("core.runtime", "threads")
+		if self.runtime == "asyncio" and not isinstance(self.eventbus, AsyncEventBus):
+			# created before the manager so modules get the right emit
+			self.eventbus = AsyncEventBus()
+
+		self.manager = HalogenModuleManager(self.config, self.eventbus.emit, self.catch_error)
+
+		if self.config.dev or self.config.get("journal.enabled", False):
+			self.journal = EventJournal.from_config(self.config)
+
+		self.subscribe_core_handlers()
 		
-		self.event_logfile = self.config.get("dev.event_logfile", "events.log")
+		self.batch_size: int = self.config.get("core.batch_size", 64)
+		self.eventbus.configure(self.config)
+
+		self.stats = HalogenStats(self.eventbus, self.manager, self.config.get("core.stats_interval", 1.0))
+		HalogenMetrics.collector("core", self.collect_metrics)
+
+		if not self.profiler.running:
+			interval = self.config.get("core.profile_interval", 0.005)
+			if not valid_interval(interval):
+				self.log(
+					HalogenEvents.chain(),
+					"warning",
+					f"Invalid core.profile_interval : {interval}. Expected a positive number of seconds, using 0.005."
+				)
+				interval = 0.005
+			self.profiler.interval = interval
 	
 		self.log(
 			HalogenEvents.chain(), 
@@ -43,48 +99,89 @@ class HalogenCore():
 			f"Hello {self.config.get('user.name', 'User')} :D"
 		)
 
-		self.manager.load_modules()
+		self.manager.load_modules(exclude)
 		self.define_core_commands()
 
 	### main loop functions start here
 
 	def run(self):
+
+		if self.runtime == "asyncio":
+			asyncio.run(run_async(self))
+			return
 		
-		self.manager.start_modules(self.config.dev)
+		self.start_modules()
 
 		while self.is_running: 
 
-			event = self.eventbus.receive(0.05)
-
-			if not event:
-				if self.shutdown_requested: self.shutdown() 
-				if self.restart_requested: self.restart()
-				continue
-			
+			# sleeps until something is emitted, control events are always at the front
+			batch = self.eventbus.receive_batch(self.batch_size)
 			
-			self.pass_events(event)
+			for i, event in enumerate(batch):
+				self.pass_events(event)
 
+				if self.shutdown_requested or self.restart_requested or not self.is_running:
+					self.eventbus.requeue(batch[i + 1:])
+					break
 
-	def pass_events(self, event: HalogenEvents.Event):
+			if not self.is_running: break
 
-		if self.config.dev: self.log_events(event)
+			if self.shutdown_requested: 
+				self.shutdown() 
+			elif self.restart_requested: 
+				self.restart()
+				break # the restarted core runs the loop on its own thread
 
-		event_type = type(event)
 
-		if event_type in self.core_events: 
-			self.handle(event)
+	def start_modules(self):
+		self.manager.start_modules(self.config.dev)
+		if self.stats and self.config.get("core.stats", False): self.stats.enable()
 
-		if event_type not in self.manager.defined_events():
-			return
 
-		for module in self.manager.get_module_list(event_type):
-			try:
-				module.handle(event) 
-			except Exception as e:
-				self.catch_error(module, event, e)
+	def collect_metrics(self):
+		"""
+		Exports the event bus and the module timings when the metrics endpoint is scraped.
+		Runs on the endpoint's thread and only reads, the core loop is never involved.
+		"""
+		bus = self.eventbus
+
+		HalogenMetrics.counter(
+			"halogen_events_total", "Events dispatched by the core."
+		).set(bus.taken)
+
+		depth = HalogenMetrics.gauge("halogen_bus_depth", "Events waiting in each lane of the event bus.", ("lane",))
+		for name, lane in zip(bus.lane_names, bus.lanes):
+			depth.set(len(lane), (name,))
+
+		shed = HalogenMetrics.counter(
+			"halogen_bus_shed_total", "Events that did not go through the event bus normally.", ("event", "kind")
+		)
+		for event, counters in list(bus.shed.items()):
+			for kind, n in list(counters.items()):
+				shed.set(n, (event, kind))
+
+		timings = {}
+		for dispatcher in self.manager.dispatchers:
+			for event_type, histogram in list(dispatcher.timings.items()):
+				timings[(dispatcher.module.name(), event_type.__name__)] = histogram
+
+		HalogenMetrics.histogram(
+			"halogen_handle_seconds",
+			"Time spent in the .handle() of each module, only measured while 'core stats' is on.",
+			("module", "event"),
+			low = 8,
+			high = 34
+		).attach(timings)
+
+
+	def pass_events(self, event: HalogenEvents.Event):
+
+		for deliver in self.manager.dispatch_table[type(event)]:
+			deliver(event)
 
 				
 	def catch_error(self, mod: HalogenModule, event: HalogenEvents.Event, e: Exception):
+		"Called by the dispatchers, possibly from a worker or pool thread."
 
 		self.log(
 			HalogenEvents.chain(),
@@ -93,13 +190,36 @@ class HalogenCore():
 			f"Event = {event}. Encountered Error = {e.__class__.__name__}:{e}"
 		)
 
-		if self.config.dev: 
-			self.shutdown_reason = f"Module '{mod.name()}' failed to handle event."
-			self.shutdown()
-			raise e
+		if not self.config.dev: return
+
+		self.shutdown_reason = f"Module '{mod.name()}' failed to handle event."
+
+		if self.runtime == "asyncio" or threading.get_ident() != self.eventbus.consumer:
+			# only the core loop itself can shut halogen down directly
+			event = HalogenEvents.ShutdownEvent(
+				"core",
+				HalogenEvents.make_timestamp(),
+				HalogenEvents.chain(),
+				True,
+				self.shutdown_reason
+			)
+			self.eventbus.emit(event)
+			return
+
+		self.shutdown()
+		raise e
 
 	# main loop functions end here
 
+	def subscribe_core_handlers(self):
+		# the core is subscribed before any module so it always sees control events first
+		for event_type in self.core_events:
+			self.manager.subscribe(event_type, self.handle)
+
+		if self.journal:
+			self.manager.subscribe(HalogenEvents.Event, self.journal.record)
+
+
 	def handle(self, event: HalogenEvents.Event):
 		match event:
 			case HalogenEvents.ShutdownEvent():
@@ -116,8 +236,13 @@ class HalogenCore():
 		self, 
 		chain: HalogenEvents.Chain, 
 		level: Literal["debug", "info", "warning", "critical"], 
-		msg: str
+		msg: str | Callable[[], str]
 		):
+		if HalogenEvents.log_levels[level] < HalogenEvents.log_threshold:
+			return
+
+		if callable(msg): msg = msg()
+
 		event = HalogenEvents.LogEvent(
 			"core",
 			HalogenEvents.make_timestamp(),
@@ -168,25 +293,49 @@ class HalogenCore():
 			"Get internal values from Halogen. See 'get help'"
 		)
 
+		self.define_command(
+			"stats",
+			self.stats_command,
+			"Runtime statistics of modules and the event bus. ARGS: on/off/reset/show (default)"
+		)
+
+		self.define_command(
+			"profile",
+			self.profile_command,
+			"Sample the stacks of all threads. ARGS: start [interval ms] / stop [file] / show (default)"
+		)
+
 	
-	def log_events(self, event: HalogenEvents.Event):
-		"Logs event to a event.log file. Only works when dev mode is on."
+	def close_journal(self):
+		if not self.journal: return
+		self.journal.close()
+		self.journal = None
+
 
-		with open(self.event_logfile, "a+") as file:
-			file.write(f"{event.__str__()}\n")
+	def stop_profiler(self, path: Path | None = None) -> str:
+		self.profiler.stop()
+		path = path or Path(time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+
+		try:
+			n = self.profiler.write(path)
+		except OSError as e:
+			return f"Could not write the profile to {path}. Encountered Error = {e.__class__.__name__}({e})"
+
+		return f"Wrote {n} stacks to {path.absolute()}."
 
 
 	def shutdown(self):
 		
 		self.is_running = False
+		if self.stats: self.stats.disable()
+		if self.profiler.running: self.log(HalogenEvents.chain(), "info", self.stop_profiler())
 		logger = self.manager.end_modules()
+		self.close_journal()
 		
 		if not logger: return
 
-		while True:
-			ev = self.eventbus.receive(0.05)
-			if not ev: break
-			
+		# only what is already queued, a flooding module must not keep us here forever
+		for ev in self.eventbus.drain():
 			if isinstance(ev, HalogenEvents.LogEvent):
 				logger.handle(ev)
 
@@ -205,14 +354,13 @@ class HalogenCore():
 	def restart(self):
 		
 		self.is_running = False
+		if self.stats: self.stats.disable()
 		logger = self.manager.end_modules()
+		self.close_journal()
 		
 		if not logger: return
 
-		while True:
-			ev = self.eventbus.receive(0.05)
-			if not ev: break
-
+		for ev in self.eventbus.drain():
 			if isinstance(ev, HalogenEvents.LogEvent):
 				logger.handle(ev)
 
@@ -228,9 +376,9 @@ class HalogenCore():
 		logger.handle(event)
 		logger.end()
 
-		self.init()
+		self.init(*self.injected)
 
-		t = threading.Thread(target = self.run)
+		t = threading.Thread(target = self.run, name = "halogen-core")
 		t.start()
 
 
@@ -280,9 +428,11 @@ class HalogenCore():
 
 		if not self._get_terms:
 			self._get_terms = {
-				"chain" : lambda: HalogenEvents._intern_chain.__str__(),
+				"chain" : lambda: HalogenEvents.last_chain().__str__(),
 				"user" : lambda: self.config.get("user.name", "Unknown"),
 				"config" : lambda: f"Using config dir : {self.config.directory.absolute()}",
+				"bus" : lambda: self.eventbus.report(),
+				"stats" : lambda: self.stats.summary(),
 				"help" : lambda: f"Accessible terms: {[x for x in self._get_terms.keys()]}"
 			}
 
@@ -292,7 +442,58 @@ class HalogenCore():
 			return (True, value)
 		
 		item = args[0]
-		value = self._get_terms.get(item, "help")()
+		value = self._get_terms.get(item, self._get_terms["help"])()
 		return (True, value)
 
 
+	def stats_command(self, args: list[str], chain: HalogenEvents.Chain) -> tuple[bool, str]:
+
+		action = args[0] if args else "show"
+
+		match action:
+			case "on":
+				if not self.stats.enable(): return (True, "Stats are already on.")
+				return (True, "Stats are now on. See 'core stats show'.")
+			case "off":
+				if not self.stats.disable(): return (True, "Stats are already off.")
+				return (True, "Stats are now off. What was measured is kept until 'core stats reset'.")
+			case "reset":
+				self.stats.reset()
+				return (True, "Stats were reset.")
+			case "show":
+				return (True, self.stats.report())
+			case _:
+				return (False, f"Unknown stats argument : {action}. Expected on, off, reset or show.")
+
+
+	def profile_command(self, args: list[str], chain: HalogenEvents.Chain) -> tuple[bool, str]:
+
+		action = args[0] if args else "show"
+
+		match action:
+			case "start":
+				if self.profiler.running: return (True, "The profiler is already running.")
+				if len(args) > 1:
+					try:
+						interval = float(args[1])
+					except ValueError:
+						interval = 0.0
+					if not valid_interval(interval):
+						return (False, f"Invalid interval : {args[1]}. Expected a positive number of ms.")
+					self.profiler.interval = interval / 1000
+				self.profiler.start()
+				return (
+					True,
+					f"Sampling every {self.profiler.interval * 1000:g}ms. " \
+					"Use 'core profile stop' to write the collapsed stacks."
+				)
+			case "stop":
+				if not self.profiler.running: return (False, "The profiler is not running.")
+				path = Path(args[1]) if len(args) > 1 else None
+				return (True, f"{self.stop_profiler(path)}\n{self.profiler.summary()}")
+			case "show":
+				return (True, self.profiler.summary())
+			case _:
+				return (False, f"Unknown profile argument : {action}. Expected start, stop or show.")
+
+
@@ -0,0 +1,386 @@
+import threading, asyncio, inspect, time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from halogen.base import HalogenModule, HalogenEvents
+from halogen.base.histogram import Histogram
+
+
+ErrorHandler = Callable[[HalogenModule, HalogenEvents.Event, Exception], None]
+LoopGetter = Callable[[], asyncio.AbstractEventLoop]
+Deliver = Callable[[HalogenEvents.Event], None]
+
+
+class DispatchTable(dict):
+	"""
+	Maps an event type to everything that has to receive it, as a tuple of delivery functions.
+
+	A subscription to an event type also covers its subclasses, so subscribing to 
+	HalogenEvents.Event receives every event. The table is compiled once for all known event types 
+	so dispatching is a single dict lookup. Event types defined later (by custom modules for example)
+	are resolved the first time they are dispatched and cached like the rest.
+
+	Never modified after compiling apart from that cache. Make a new table when subscriptions change.
+	"""
+
+	def __init__(self, subscriptions: list[tuple[type[HalogenEvents.Event], Deliver]]) -> None:
+		super().__init__()
+		self.subscriptions = tuple(subscriptions)
+
+		for event_type in self.known_events(HalogenEvents.Event):
+			self[event_type] = self.resolve(event_type)
+
+
+	@classmethod
+	def known_events(cls, base: type[HalogenEvents.Event]) -> list[type[HalogenEvents.Event]]:
+		events = [base]
+		for sub in base.__subclasses__():
+			events.extend(cls.known_events(sub))
+		return events
+
+
+	def resolve(self, event_type: type[HalogenEvents.Event]) -> tuple[Deliver, ...]:
+		"Everything subscribed to the type or its bases, in subscription order and without repeats."
+		targets = []
+		for subscribed, deliver in self.subscriptions:
+			if issubclass(event_type, subscribed) and deliver not in targets:
+				targets.append(deliver)
+		return tuple(targets)
+
+
+	def __missing__(self, event_type: type[HalogenEvents.Event]) -> tuple[Deliver, ...]:
+		targets = self.resolve(event_type)
+		self[event_type] = targets
+		return targets
+
+
+
+class ModuleDispatcher():
+	"""
+	Delivers events to a single module according to its execution mode.
+
+	The core only ever calls .deliver(). Depending on the mode, the module's .handle() then runs:
+
+	- inline: right away on the core thread. Best for modules that do very little per event.
+	- worker: on a dedicated thread with its own inbox.
+	- pool:   on a thread pool shared by all pool modules.
+
+	Modules with an 'async def handle' always run on an asyncio loop instead, see AsyncDispatcher.
+
+	In every mode a module receives its events one at a time and in the order they were
+	delivered, so modules never have to worry about their own handle() running concurrently.
+
+	Once instrumented (see HalogenStats), every .handle() call is timed per event type in 
+	.timings. A dispatcher never runs two calls on different threads at the same time, so no 
+	locking is needed for that.
+	"""
+
+	def __init__(self, module: HalogenModule, on_error: ErrorHandler) -> None:
+		self.module = module
+		self.on_error = on_error
+		self.timings: dict[type[HalogenEvents.Event], Histogram] = {}
+
+
+	def start(self) -> None:
+		pass
+
+
+	def stop(self, timeout: float) -> bool:
+		"Stops the dispatcher after the pending events are handled. Returns False on timeout."
+		return True
+
+
+	def deliver(self, event: HalogenEvents.Event) -> None:
+		raise NotImplementedError(f"deliver method of class {self.__class__} not implemented.")
+
+
+	def pending(self) -> int:
+		return 0
+
+
+	def call(self, event: HalogenEvents.Event) -> None:
+		try:
+			self.module.handle(event)
+		except Exception as e:
+			self.on_error(self.module, event, e)
+
+
+	def timed_call(self, event: HalogenEvents.Event) -> None:
+		clock = time.perf_counter_ns
+		start = clock()
+
+		try:
+			self.module.handle(event)
+		except Exception as e:
+			self.on_error(self.module, event, e)
+
+		elapsed = clock() - start
+		(self.timings.get(type(event)) or self.timing(type(event))).record(elapsed)
+
+
+	def timing(self, event_type: type[HalogenEvents.Event]) -> Histogram:
+		histogram = self.timings.get(event_type)
+		if histogram is None:
+			histogram = self.timings[event_type] = Histogram()
+		return histogram
+
+
+	def instrument(self, on: bool):
+		"Swaps .call() for the timed version and back, so the plain one pays nothing."
+		if on:
+			self.call = self.timed_call
+		else:
+			try:
+				del self.call
+			except AttributeError:
+				pass
+
+
+
+class InlineDispatcher(ModuleDispatcher):
+
+	def deliver(self, event: HalogenEvents.Event) -> None:
+		self.call(event)
+
+
+
+class WorkerDispatcher(ModuleDispatcher):
+
+	def __init__(self, module: HalogenModule, on_error: ErrorHandler) -> None:
+		super().__init__(module, on_error)
+		self.inbox: deque[HalogenEvents.Event] = deque()
+		self.cond = threading.Condition()
+		self.is_running = False
+		self.thread = threading.Thread(target = self.run, name = f"halogen-{module.name()}")
+
+
+	def start(self) -> None:
+		self.is_running = True
+		self.thread.start()
+
+
+	def stop(self, timeout: float) -> bool:
+		with self.cond:
+			self.is_running = False
+			self.cond.notify()
+
+		if self.thread.is_alive():
+			self.thread.join(timeout)
+		return not self.thread.is_alive()
+
+
+	def deliver(self, event: HalogenEvents.Event) -> None:
+		with self.cond:
+			self.inbox.append(event)
+			self.cond.notify()
+
+
+	def pending(self) -> int:
+		return len(self.inbox)
+
+
+	def run(self) -> None:
+		inbox = self.inbox
+
+		while True:
+			with self.cond:
+				self.cond.wait_for(lambda: inbox or not self.is_running)
+				if not inbox: return
+
+				events = list(inbox)
+				inbox.clear()
+
+			for event in events:
+				self.call(event)
+
+
+
+class PoolDispatcher(ModuleDispatcher):
+	"""
+	Runs the module on a shared pool. At most one pool task runs per module at a time, which is
+	what keeps the events in order.
+	"""
+
+	# events handled per pool task before giving the thread back to other modules
+	slice = 16
+
+	def __init__(self, module: HalogenModule, on_error: ErrorHandler, pool: ThreadPoolExecutor) -> None:
+		super().__init__(module, on_error)
+		self.pool = pool
+		self.inbox: deque[HalogenEvents.Event] = deque()
+		self.lock = threading.Lock()
+		self.idle = threading.Condition(self.lock)
+		self.scheduled = False
+
+
+	def stop(self, timeout: float) -> bool:
+		with self.lock:
+			return self.idle.wait_for(lambda: not self.scheduled, timeout)
+
+
+	def deliver(self, event: HalogenEvents.Event) -> None:
+		with self.lock:
+			self.inbox.append(event)
+			if self.scheduled: return
+			self.scheduled = True
+
+		self.pool.submit(self.run)
+
+
+	def pending(self) -> int:
+		return len(self.inbox)
+
+
+	def run(self) -> None:
+		for _ in range(self.slice):
+			with self.lock:
+				if not self.inbox:
+					self.scheduled = False
+					self.idle.notify_all()
+					return
+				event = self.inbox.popleft()
+
+			self.call(event)
+
+		# still more to do, go to the back of the pool's queue
+		self.pool.submit(self.run)
+
+
+
+class AsyncDispatcher(ModuleDispatcher):
+	"""
+	Runs a module with an 'async def handle' on an asyncio loop: the core's own loop in the asyncio
+	runtime, or a background loop when the core runs on threads.
+
+	Up to module.concurrency handle() coroutines run at the same time. With the default of 1, events
+	are handled one at a time and in order like every other mode.
+	"""
+
+	def __init__(self, module: HalogenModule, on_error: ErrorHandler, get_loop: LoopGetter) -> None:
+		super().__init__(module, on_error)
+		self.get_loop = get_loop
+		self.loop: asyncio.AbstractEventLoop | None = None
+		self.loop_thread: int | None = None
+		self.inbox: asyncio.Queue[HalogenEvents.Event | None] = asyncio.Queue()
+		self.consumers: list[asyncio.Task] = []
+		self.stopped = False
+
+
+	def start(self) -> None:
+		self.loop = self.get_loop()
+
+		if self.on_loop():
+			self.spawn()
+		else:
+			asyncio.run_coroutine_threadsafe(self.spawn_async(), self.loop).result()
+
+
+	def on_loop(self) -> bool:
+		try:
+			return asyncio.get_running_loop() is self.loop
+		except RuntimeError:
+			return False
+
+
+	def spawn(self):
+		self.loop_thread = threading.get_ident()
+		self.consumers = [
+			self.loop.create_task(self.consume()) for _ in range(max(1, self.module.concurrency))
+		]
+
+
+	async def spawn_async(self):
+		self.spawn()
+
+
+	def deliver(self, event: HalogenEvents.Event) -> None:
+		if threading.get_ident() == self.loop_thread:
+			self.inbox.put_nowait(event)
+		else:
+			self.loop.call_soon_threadsafe(self.inbox.put_nowait, event)
+
+
+	def pending(self) -> int:
+		return self.inbox.qsize()
+
+
+	async def consume(self):
+		while True:
+			event = await self.inbox.get()
+			if event is None: return
+			await self.call_async(event)
+
+
+	async def call_async(self, event: HalogenEvents.Event) -> None:
+		try:
+			await self.module.handle(event)
+		except Exception as e:
+			self.on_error(self.module, event, e)
+
+
+	async def timed_call_async(self, event: HalogenEvents.Event) -> None:
+		"Includes the time spent awaiting, with module.concurrency > 1 calls overlap."
+		start = time.perf_counter_ns()
+		await AsyncDispatcher.call_async(self, event)
+		self.timing(type(event)).record(time.perf_counter_ns() - start)
+
+
+	def instrument(self, on: bool):
+		if on:
+			self.call_async = self.timed_call_async
+		else:
+			try:
+				del self.call_async
+			except AttributeError:
+				pass
+
+
+	async def stop_async(self, timeout: float) -> bool:
+		"Lets the consumers finish the pending events and waits for them."
+		if self.stopped: return True
+		self.stopped = True
+
+		for _ in self.consumers:
+			self.inbox.put_nowait(None)
+
+		if not self.consumers: return True
+		_, running = await asyncio.wait(self.consumers, timeout = timeout)
+
+		for task in running: task.cancel()
+		return not running
+
+
+	def stop(self, timeout: float) -> bool:
+		if self.stopped or self.loop is None:
+			return True
+
+		if self.on_loop():
+			# cannot wait for tasks on our own loop from synchronous code
+			for task in self.consumers: task.cancel()
+			self.stopped = True
+			return False
+
+		future = asyncio.run_coroutine_threadsafe(self.stop_async(timeout), self.loop)
+		return future.result()
+
+
+
+def make_dispatcher(
+	module: HalogenModule,
+	on_error: ErrorHandler,
+	pool: ThreadPoolExecutor,
+	get_loop: LoopGetter
+	) -> ModuleDispatcher:
+	"Makes the dispatcher matching the module's execution mode. Unknown modes run inline."
+
+	if inspect.iscoroutinefunction(module.handle):
+		return AsyncDispatcher(module, on_error, get_loop)
+
+	match module.execution:
+		case "worker":
+			return WorkerDispatcher(module, on_error)
+		case "pool":
+			return PoolDispatcher(module, on_error, pool)
+		case _:
+			return InlineDispatcher(module, on_error)
@@ -1,38 +1,429 @@
 import threading
+from collections import deque
 from typing import Literal
-from halogen.base import HalogenEvents
-from queue import Queue, Empty
+from halogen.base import HalogenEvents, HalogenConfig
+
+
+OverflowPolicy = Literal["block", "drop_oldest", "drop_newest", "coalesce"]
+
+
+class Coalesced():
+	"Placeholder kept in a lane for a coalescing event. The actual event is looked up on receive."
+	__slots__ = ("key",)
+
+	def __init__(self, key: tuple) -> None:
+		self.key = key
 
 
 class EventBus():
+	"""
+	The queue sitting between the modules and the core.
+
+	deque appends are atomic, so producers only touch the condition's lock when the core is
+	actually asleep waiting for events or when a lane is full. The core sleeps on that condition
+	until an event arrives, so an idle core does not wake up at all.
+
+	Events are split into priority lanes by their type: control > user > tasks > logs.
+	Control events (shutdown/restart) are always received first. For the other lanes, a lane that
+	has been passed over 'starvation_limit' times while holding events is served next, so a flood
+	in a higher lane can only delay lower lanes, never stall them.
+
+	Every lane except control holds at most 'capacity' events (concurrent producers may overshoot
+	it by one event each). What happens to an event emitted into a full lane depends on the
+	overflow policy of its type:
+
+	- block:       the producer waits for room, up to 'block_timeout' seconds, then the event is
+	               dropped. The core thread itself is never blocked.
+	- drop_oldest: the oldest event in the lane is dropped to make room.
+	- drop_newest: the emitted event is dropped.
+	- coalesce:    a pending event with the same type, chain and sender is replaced by the new one
+	               (this happens even when the lane is not full). Otherwise acts like drop_newest.
+
+	There must only be a single consumer, which is the core itself.
+	"""
+
+	lane_names = ("control", "user", "tasks", "logs")
+
+	default_priorities = {
+		"ShutdownEvent"          : "control",
+		"RestartEvent"           : "control",
+
+		"UserInputEvent"         : "user",
+		"PromptEvent"            : "user",
+		"AIResponseEvent"        : "user",
+		"AIResponseDeltaEvent"   : "user",
+		"CommandEvent"           : "user",
+		"CommandExecutedEvent"   : "user",
+		"ConfirmationEvent"      : "user",
+		"ErrorEvent"             : "user",
+		"ClientActivationEvent"  : "user",
+
+		# registrations share the lane of whatever depends on them so they are never overtaken
+		"InitCompleteEvent"      : "user",
+		"CommandRegisterEvent"   : "user",
+		"TaskRegisterEvent"      : "user",
+		"TaskRegisteredEvent"    : "user",
+
+		"NotifyEvent"            : "tasks",
+		"TaskEvent"              : "tasks",
+		"TaskCompletionEvent"    : "tasks",
+
+		"LogEvent"               : "logs"
+	}
+
+	default_lane = "tasks"
+
+	overflow_policies = ("block", "drop_oldest", "drop_newest", "coalesce")
+
+	default_overflow: dict[str, OverflowPolicy] = {
+		"LogEvent"       : "drop_oldest",
+		"UserInputEvent" : "drop_newest",
+
+		# the full AIResponseEvent follows anyway, never hold up the model for a delta
+		"AIResponseDeltaEvent" : "drop_newest"
+	}
+
+	default_policy: OverflowPolicy = "block"
+
 
 	def __init__(self) -> None:
-		self.events: Queue[HalogenEvents.Event] = Queue()
+		self.lanes: list[deque] = [deque() for _ in self.lane_names]
+		self.control = self.lanes[0]
+
+		self.priorities: dict[str, str] = dict(self.default_priorities)
+		self.overflow: dict[str, OverflowPolicy] = dict(self.default_overflow)
+		self.routes: dict[type[HalogenEvents.Event], tuple[deque, OverflowPolicy]] = {}
+
+		self.starvation_limit = 32
+		self.skipped = [0 for _ in self.lane_names]
+
+		self.capacity = 10000
+		self.block_timeout = 5.0
+
+		# pending coalescing events by their key
+		self.latest: dict[tuple, HalogenEvents.Event] = {}
+
+		# per event type counters of everything that did not go through normally
+		self.shed: dict[str, dict[str, int]] = {}
+
 		self.lock = threading.Lock()
-		self._count = 0 
+		self.cond = threading.Condition(self.lock)
+		self.not_full = threading.Condition(self.lock)
+		self.waiting = False
+		self.blocked = 0
+		self.consumer: int | None = None
+
+		# events received by the consumer so far, for HalogenStats
+		self.taken = 0
+
+
+	def configure(self, config: HalogenConfig):
+		"Applies the event bus settings from the [core] section of the config."
+
+		self.starvation_limit = max(1, config.get("core.starvation_limit", 32))
+		self.capacity = max(1, config.get("core.capacity", 10000))
+		self.block_timeout = config.get("core.block_timeout", 5.0)
+
+		self.priorities = dict(self.default_priorities)
+		self.overflow = dict(self.default_overflow)
+
+		self.apply_overrides(config.get("core.priorities", {}), self.priorities, self.lane_names)
+		self.apply_overrides(config.get("core.overflow", {}), self.overflow, self.overflow_policies)
+
+		self.routes.clear()
+
+
+	def apply_overrides(self, overrides: dict, target: dict, valid: tuple[str, ...]):
+		if not isinstance(overrides, dict): return
+
+		for event_name, value in overrides.items():
+			if value not in valid:
+				self.log(
+					"warning",
+					f"Invalid value '{value}' for '{event_name}' in config.toml. " \
+					f"Valid values: {list(valid)}. Ignoring it."
+				)
+				continue
+			target[event_name] = value
+
+
+	def route(self, event_type: type[HalogenEvents.Event]) -> tuple[deque, OverflowPolicy]:
+		"""
+		Finds the lane and overflow policy of an event type, checking its base classes too.
+		Cached per type.
+		"""
+
+		route = self.routes.get(event_type)
+		if route is not None:
+			return route
+
+		lane_name = self.default_lane
+		for cls in event_type.__mro__:
+			if cls.__name__ in self.priorities:
+				lane_name = self.priorities[cls.__name__]
+				break
+
+		policy = self.default_policy
+		for cls in event_type.__mro__:
+			if cls.__name__ in self.overflow:
+				policy = self.overflow[cls.__name__]
+				break
+
+		route = (self.lanes[self.lane_names.index(lane_name)], policy)
+		self.routes[event_type] = route
+		return route
 
 
 	def emit(self, event: HalogenEvents.Event):
-		if isinstance(event, HalogenEvents.Event):
-			self.events.put(event)
-			with self.lock: self._count += 1
+		if not isinstance(event, HalogenEvents.Event):
+			return
+
+		route = self.routes.get(type(event))
+		if route is None: route = self.route(type(event))
+		lane, policy = route
+
+		if policy == "coalesce":
+			self.coalesce(event, lane)
+		elif len(lane) < self.capacity or lane is self.control:
+			lane.append(event)
+		else:
+			self.handle_overflow(event, lane, policy)
+
+		# the consumer sets this before checking the lanes, so either it sees our event
+		# or we see the flag and wake it up
+		if self.waiting:
+			self.wake()
+
+
+	def wake(self):
+		"Wakes up the consumer sleeping in .wait()."
+		with self.cond: self.cond.notify()
+
+
+	def coalesce(self, event: HalogenEvents.Event, lane: deque):
+		key = (type(event), event.chain, event.sender)
+
+		with self.cond:
+			if key in self.latest:
+				self.latest[key] = event
+				self.count_shed(event, "coalesced")
+			elif len(lane) < self.capacity:
+				self.latest[key] = event
+				lane.append(Coalesced(key))
+			else:
+				self.count_shed(event, "dropped")
+
 
+	def handle_overflow(self, event: HalogenEvents.Event, lane: deque, policy: OverflowPolicy):
 
-	def receive(self, timeout: int) -> HalogenEvents.Event | None:
-		try:
-			event = self.events.get(True, timeout)
-			with self.lock: self._count -= 1
-		except Empty:
-			event = None
+		with self.cond:
+			match policy:
+				case "drop_oldest":
+					try:
+						dropped = lane.popleft()
+					except IndexError:
+						dropped = None
 
+					if isinstance(dropped, Coalesced): dropped = self.latest.pop(dropped.key)
+					if dropped is not None: self.count_shed(dropped, "dropped")
+					lane.append(event)
+
+				case "drop_newest":
+					self.count_shed(event, "dropped")
+
+				case "block":
+					# the core would be waiting on itself
+					if threading.get_ident() == self.consumer:
+						self.count_shed(event, "overflowed")
+						lane.append(event)
+						return
+
+					self.count_shed(event, "blocked")
+					self.blocked += 1
+					try:
+						has_room = self.not_full.wait_for(
+							lambda: len(lane) < self.capacity,
+							self.block_timeout
+						)
+					finally:
+						self.blocked -= 1
+
+					if has_room:
+						lane.append(event)
+					else:
+						self.count_shed(event, "dropped")
+
+
+	def count_shed(self, event: HalogenEvents.Event, kind: str):
+		"Only called while holding the lock."
+		counters = self.shed.setdefault(type(event).__name__, {})
+		counters[kind] = counters.get(kind, 0) + 1
+
+
+	def pick(self) -> HalogenEvents.Event | None:
+		"Takes the next event according to the lane priorities. Only called by the consumer."
+
+		lanes = self.lanes
+
+		while True:
+
+			if lanes[0]:
+				return lanes[0].popleft()
+
+			skipped = self.skipped
+			chosen = 0
+
+			for i in range(1, len(lanes)):
+				if lanes[i] and skipped[i] >= self.starvation_limit:
+					chosen = i
+					break
+			else:
+				for i in range(1, len(lanes)):
+					if lanes[i]:
+						chosen = i
+						break
+
+			if not chosen:
+				return None
+
+			# a producer dropping the oldest event can empty a lane under us
+			try:
+				event = lanes[chosen].popleft()
+			except IndexError:
+				continue
+
+			skipped[chosen] = 0
+			for i in range(chosen + 1, len(lanes)):
+				if lanes[i]: skipped[i] += 1
+
+			if type(event) is Coalesced:
+				with self.cond: event = self.latest.pop(event.key)
+
+			return event
+
+
+	def wait(self, timeout: float | None) -> bool:
+		"Sleeps until an event is pending. Returns False if the timeout ran out."
+		self.consumer = threading.get_ident()
+
+		if self.pending():
+			return True
+
+		with self.cond:
+			self.waiting = True
+			try:
+				return self.cond.wait_for(self.pending, timeout)
+			finally:
+				self.waiting = False
+
+
+	def release_blocked(self):
+		if self.blocked:
+			with self.cond: self.not_full.notify_all()
+
+
+	def receive(self, timeout: float | None = None) -> HalogenEvents.Event | None:
+		"Blocks until an event is available. Returns None if the timeout runs out first."
+		if not self.wait(timeout):
+			return None
+
+		event = self.pick()
+		if event is not None: self.taken += 1
+		self.release_blocked()
 		return event
 
 
-	def count(self) -> int: 
-		return self._count
-	
+	def receive_batch(self, max_n: int, timeout: float | None = None) -> list[HalogenEvents.Event]:
+		"""
+		Blocks until at least one event is available and then takes up to max_n events at once,
+		in priority order. Returns an empty list on timeout.
+		"""
+		if not self.wait(timeout):
+			return []
+		return self.take(max_n)
+
+
+	def take(self, max_n: int) -> list[HalogenEvents.Event]:
+		"Takes up to max_n pending events without blocking."
+		batch = []
+		for _ in range(max_n):
+			event = self.pick()
+			if event is None: break
+			batch.append(event)
+
+		self.taken += len(batch)
+		self.release_blocked()
+		return batch
+
+
+	def requeue(self, events: list[HalogenEvents.Event]):
+		"""
+		Puts events taken by receive_batch back at the front of their lanes, keeping their order.
+		Capacity is ignored since these events were already accepted once.
+		"""
+		for event in reversed(events):
+			lane, _ = self.route(type(event))
+			lane.appendleft(event)
+
+
+	def drain(self) -> list[HalogenEvents.Event]:
+		"Removes and returns every event that is currently queued without blocking."
+		events = []
+
+		with self.cond:
+			for lane in self.lanes:
+				while lane:
+					event = lane.popleft()
+					if type(event) is Coalesced: event = self.latest.pop(event.key)
+					events.append(event)
+
+			self.not_full.notify_all()
+
+		return events
+
+
+	def pending(self) -> bool:
+		return any(self.lanes)
+
+
+	def count(self) -> int:
+		return sum(len(lane) for lane in self.lanes)
+
 
 	def empty(self) -> bool:
-		if self._count > 0:
-			return False
-		return True
+		return not self.pending()
+
+
+	def report(self) -> str:
+		"Human readable summary of the lanes and the shed counters."
+
+		lines = []
+		for name, lane in zip(self.lane_names, self.lanes):
+			limit = "unbounded" if lane is self.control else self.capacity
+			lines.append(f"{name:<8}: {len(lane)}/{limit}")
+
+		with self.cond:
+			shed = {name: dict(counters) for name, counters in self.shed.items()}
+
+		if not shed:
+			lines.append("No events were shed.")
+
+		for name, counters in shed.items():
+			values = ", ".join(f"{kind} = {n}" for kind, n in counters.items())
+			lines.append(f"{name}: {values}")
+
+		return "\n".join(lines)
+
+
+	def log(self, level: str, msg: str):
+		if HalogenEvents.log_levels[level] < HalogenEvents.log_threshold:
+			return
+
+		event = HalogenEvents.LogEvent(
+			"eventbus",
+			HalogenEvents.make_timestamp(),
+			HalogenEvents.chain(),
+			level,
+			msg
+		)
+		self.emit(event)
@@ -0,0 +1,285 @@
+"""
+The event journal: an append-only binary record of every event dispatched by the core.
+
+Each record is length prefixed so a journal can be read back without parsing anything but the
+header, and a record cut short by a crash only loses itself:
+
+	u32  length of the rest of the record
+	i64  monotonic time the core dispatched the event at (ns)
+	i64  event timestamp (ns since the epoch)
+	i64  chain context
+	i64  chain flow
+	u8   flags (LOSSY: some fields could not be encoded and were stored as their repr)
+	u16  length of the event type name
+	u16  length of the sender
+	     event type name, sender (utf-8)
+	     the remaining fields of the event as a JSON object
+
+Run 'halogen-journal --help' to read one.
+"""
+
+import struct, json, time, argparse, sys
+from dataclasses import dataclass, fields
+from pathlib import Path
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from halogen.base import HalogenEvents, HalogenConfig, HalogenWriter, LogRotation, Chain
+
+
+HEADER = struct.Struct("<IqqqqBHH")
+LENGTH = struct.Struct("<I")
+
+LOSSY = 1
+
+# stored in the header rather than the JSON
+HEADER_FIELDS = ("sender", "timestamp", "chain")
+
+
+class EventJournal():
+	"""
+	Writes the journal. .record() is subscribed to every event and only queues it, the encoding
+	and writing happen on the journal's writer thread.
+	"""
+
+	def __init__(self, path: Path, rotation: LogRotation | None = None, capacity: int = 100000) -> None:
+		self.path = path
+		self.fields: dict[type, tuple[str, ...]] = {}
+
+		self.writer = HalogenWriter.open(
+			path,
+			binary = True,
+			name = "halogen-journal",
+			capacity = capacity,
+			rotation = rotation,
+			encode = self.encode_batch
+		)
+
+
+	@classmethod
+	def from_config(cls, config: HalogenConfig) -> "EventJournal":
+		journal_config = config.get_sub_config("journal")
+		return cls(
+			Path(journal_config.get("file", "events.journal")),
+			LogRotation.from_config(journal_config),
+			journal_config.get("buffer", 100000)
+		)
+
+
+	def record(self, event: HalogenEvents.Event):
+		self.writer.write((time.monotonic_ns(), event))
+
+
+	def close(self):
+		self.writer.close()
+
+
+	def encode_batch(self, items: list[tuple[int, HalogenEvents.Event]]) -> bytes:
+		"Encodes the events that can be, an event that cannot be written at all counts as lost."
+		records = []
+		for monotonic, event in items:
+			try:
+				records.append(self.encode(monotonic, event))
+			except Exception:
+				self.writer.lost += 1
+		return b"".join(records)
+
+
+	def encode(self, monotonic: int, event: HalogenEvents.Event) -> bytes:
+		event_type = type(event)
+
+		names = self.fields.get(event_type)
+		if names is None:
+			names = tuple(f.name for f in fields(event) if f.name not in HEADER_FIELDS)
+			self.fields[event_type] = names
+
+		data = {name: getattr(event, name) for name in names}
+
+		flags = 0
+		try:
+			body = json.dumps(data, separators = (",", ":"))
+		except (TypeError, ValueError, RecursionError):
+			flags |= LOSSY
+			try:
+				# callables in registration events etc.
+				body = json.dumps(data, separators = (",", ":"), default = repr)
+			except (TypeError, ValueError, RecursionError):
+				# keys default= does not cover (tuples in a dict...), those fields as their repr
+				body = json.dumps(
+					{name: encodable(value) for name, value in data.items()}, separators = (",", ":"), default = repr
+				)
+
+		type_name = event_type.__name__.encode()
+		sender = event.sender.encode()
+		payload = type_name + sender + body.encode()
+
+		return HEADER.pack(
+			HEADER.size - LENGTH.size + len(payload),
+			monotonic,
+			event.timestamp,
+			event.chain.context,
+			event.chain.flow,
+			flags,
+			len(type_name),
+			len(sender)
+		) + payload
+
+
+
+def encodable(value: Any) -> Any:
+	"The value if JSON (with repr for what it cannot hold) can encode it, else its repr."
+	try:
+		json.dumps(value, default = repr)
+		return value
+	except (TypeError, ValueError, RecursionError):
+		return repr(value)
+
+
+
+@dataclass(frozen = True, slots = True)
+class JournalRecord():
+	"A single event read back from a journal."
+	monotonic: int
+	timestamp: int
+	chain: Chain
+	event: str
+	sender: str
+	data: dict[str, Any]
+	lossy: bool
+
+	def to_event(self) -> HalogenEvents.Event | None:
+		"""
+		Rebuilds the event. Returns None for events that cannot be rebuilt: lossy ones and event
+		types that are not part of HalogenEvents.
+		"""
+		if self.lossy: return None
+
+		try:
+			event_type = HalogenEvents.serialize(self.event)
+			return event_type(self.sender, self.timestamp, self.chain, **self.data)
+		except (ValueError, TypeError):
+			return None
+
+
+	def __str__(self) -> str:
+		return f"{HalogenEvents.format_timestamp(self.timestamp)} {self.chain} {self.event} " \
+			f"({self.sender}) {json.dumps(self.data, ensure_ascii = False)}"
+
+
+
+def read_journal(path: Path) -> Iterator[JournalRecord]:
+	"Reads the records of a journal in order. Stops quietly at a record cut short."
+
+	with open(path, "rb") as file:
+		while True:
+			header = file.read(HEADER.size)
+			if len(header) < HEADER.size: return
+
+			length, monotonic, timestamp, context, flow, flags, type_len, sender_len = HEADER.unpack(header)
+
+			payload = file.read(length - (HEADER.size - LENGTH.size))
+			if len(payload) < length - (HEADER.size - LENGTH.size): return
+
+			event = payload[:type_len].decode()
+			sender = payload[type_len:type_len + sender_len].decode()
+			data = json.loads(payload[type_len + sender_len:])
+
+			yield JournalRecord(
+				monotonic, timestamp, Chain(context, flow), event, sender, data, bool(flags & LOSSY)
+			)
+
+
+def filter_records(
+	records: Iterable[JournalRecord],
+	chains: Iterable[Chain] | None = None,
+	events: Iterable[str] | None = None
+	) -> Iterator[JournalRecord]:
+	"Keeps the records in one of the chains and of one of the event types. None means any."
+
+	chains = set(chains) if chains else None
+	events = set(events) if events else None
+
+	for record in records:
+		if chains is not None and record.chain not in chains: continue
+		if events is not None and record.event not in events: continue
+		yield record
+
+
+def replay(
+	records: Iterable[JournalRecord],
+	emit: Callable[[JournalRecord], None],
+	speed: float | None = 1.0
+	) -> int:
+	"""
+	Passes the records to emit with the same spacing they were recorded with, 'speed' times faster.
+	With speed None, as fast as possible. Returns how many records were replayed.
+	"""
+	start = time.monotonic_ns()
+	first: int | None = None
+	n = 0
+
+	for record in records:
+		if speed and first is not None:
+			due = start + (record.monotonic - first) / speed
+			delay = (due - time.monotonic_ns()) / 1e9
+			if delay > 0: time.sleep(delay)
+
+		if first is None: first = record.monotonic
+
+		emit(record)
+		n += 1
+
+	return n
+
+
+
+def parse_chain(value: str) -> Chain:
+	try:
+		context, flow = value.strip("()").split(":")
+		return Chain(int(context), int(flow))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"Invalid chain '{value}'. Expected context:flow, like 0:12.")
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		prog = "halogen-journal",
+		description = "Read a Halogen event journal."
+	)
+
+	parser.add_argument("journal", help = "Path to the journal file.", type = Path)
+
+	parser.add_argument(
+		"-c", "--chain",
+		help = "Only show events of this chain (context:flow). Can be given more than once.",
+		type = parse_chain,
+		action = "append"
+	)
+
+	parser.add_argument(
+		"-t", "--type",
+		help = "Only show events of this type, like LogEvent. Can be given more than once.",
+		action = "append"
+	)
+
+	parser.add_argument(
+		"-r", "--replay",
+		help = "Show the events with the timing they were recorded with, SPEED times faster.",
+		type = float,
+		nargs = "?",
+		const = 1.0,
+		metavar = "SPEED"
+	)
+
+	args = parser.parse_args()
+
+	records = filter_records(read_journal(args.journal), args.chain, args.type)
+
+	try:
+		replay(records, print, args.replay)
+	except (KeyboardInterrupt, BrokenPipeError):
+		sys.exit(0)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,10 @@
 from types import MethodType, ModuleType
 from typing import Callable, MutableSequence, Type, Literal
+from collections.abc import Iterable
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import importlib, sys
-import inspect
+import inspect, asyncio
 
 from halogen.base import (
 	HalogenModule, 
@@ -13,26 +15,52 @@ from halogen.base import (
 from halogen.modules import MODULES
 from halogen.modules import HalogenLogModule
 
+from .dispatch import (
+	ModuleDispatcher, 
+	AsyncDispatcher, 
+	DispatchTable, 
+	ErrorHandler, 
+	Deliver, 
+	make_dispatcher
+)
+from .aio import BackgroundLoop
+
 
 
 class HalogenModuleManager():
 
-	def __init__(self, config: HalogenConfig, emit_event: Callable):
+	execution_modes = ("inline", "worker", "pool")
+
+	def __init__(self, config: HalogenConfig, emit_event: Callable, catch_error: ErrorHandler):
 
 		self.config = config
 		self.emit_event = emit_event
+		self.catch_error = catch_error
 		self.modules_dir = self.config.directory / "modules"
 
 
 		self.modules: MutableSequence[HalogenModule] = []
-		self.dispatch_map: dict[type[HalogenEvents.Event], MutableSequence[HalogenModule]] = {}
+		self.dispatchers: MutableSequence[ModuleDispatcher] = []
+		self.subscriptions: list[tuple[type[HalogenEvents.Event], Deliver]] = []
+		self.dispatch_table = DispatchTable(self.subscriptions)
+
+		self.pool = ThreadPoolExecutor(
+			self.config.get("core.pool_workers", 4),
+			thread_name_prefix = "halogen-pool"
+		)
+		self.stop_timeout: float = self.config.get("core.stop_timeout", 8.0)
 
+		# only started if an async module is used while the core runs on threads
+		self.background_loop: BackgroundLoop | None = None
 
-	def load_modules(self) -> None:
-		"Loading all modules and passing them to registration."
+
+	def load_modules(self, exclude: Iterable[type[HalogenModule]] = ()) -> None:
+		"Loading all modules (except the excluded ones) and passing them to registration."
 		self.modules.clear()
+		exclude = tuple(exclude)
 		
 		for core_module in MODULES:
+			if core_module in exclude: continue
 			self.initialize_module(core_module)
 
 		py_modules: list[ModuleType] = self.import_modules()
@@ -40,7 +68,7 @@ class HalogenModuleManager():
 		for py_module in py_modules:
 			module = self.get_module(py_module)
 
-			if module is None: continue
+			if module is None or module in exclude: continue
 
 			self.initialize_module(module)
 			
@@ -66,10 +94,21 @@ class HalogenModuleManager():
 		
 		self.modules.append(module)
 
+		if module.execution not in self.execution_modes:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Module '{module.name()}' has an invalid execution mode '{module.execution}'. " \
+				f"Valid modes: {list(self.execution_modes)}. Running it inline."
+			)
+
+		dispatcher = make_dispatcher(module, self.catch_error, self.pool, self.get_loop)
+		self.dispatchers.append(dispatcher)
+
 		handled_events = module.handled_events()
 
 		for event in handled_events:
-			self.dispatch_map.setdefault(event, []).append(module)
+			self.subscribe(event, dispatcher.deliver)
 
 		if module.has_commands:
 			self.handle_module_commands(module)
@@ -87,7 +126,8 @@ class HalogenModuleManager():
 		self.log(
 			HalogenEvents.chain(),
 			"debug",
-			f"Module '{module.name()}' handles events: {[e.__name__ for e in handled_events]}"
+			lambda: f"Module '{module.name()}' handles events: {[e.__name__ for e in handled_events]}. " \
+			f"Execution: {module.execution}"
 		)
 
 	
@@ -123,7 +163,7 @@ class HalogenModuleManager():
 				self.log(
 					HalogenEvents.chain(),
 					"debug",
-					f"Ignoring {sub.absolute()}. Not a directory"
+					lambda: f"Ignoring {sub_dir.absolute()}. Not a directory"
 				)
 				continue
 			
@@ -133,7 +173,7 @@ class HalogenModuleManager():
 				self.log(
 					HalogenEvents.chain(),
 					"debug",
-					f"Ignoring {sub_dir.absolute()}. Not a python module."
+					lambda: f"Ignoring {sub_dir.absolute()}. Not a python module."
 				)
 				continue
 
@@ -155,7 +195,10 @@ class HalogenModuleManager():
 	
 	
 	def start_modules(self, dev = False):
-		"Calls .start() on all registered modules."
+		"Starts the dispatchers and calls .start() on all registered modules."
+
+		for dispatcher in self.dispatchers:
+			dispatcher.start()
 
 		for module in self.modules:
 
@@ -188,8 +231,50 @@ class HalogenModuleManager():
 				raise err
 
 
+	def get_loop(self) -> asyncio.AbstractEventLoop:
+		"The loop async modules run on. The core's own loop if there is one running."
+
+		try:
+			return asyncio.get_running_loop()
+		except RuntimeError:
+			pass
+
+		if self.background_loop is None:
+			self.background_loop = BackgroundLoop()
+			self.background_loop.start()
+
+		return self.background_loop.loop
+
+
+	async def stop_async_dispatchers(self):
+		"Lets async modules on the running loop finish their events. Used by the asyncio runtime."
+
+		for dispatcher in self.dispatchers:
+			if not isinstance(dispatcher, AsyncDispatcher): continue
+			if await dispatcher.stop_async(self.stop_timeout): continue
+
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Module '{dispatcher.module.name()}' did not finish handling its events in time."
+			)
+
+
 	def end_modules(self) -> HalogenLogModule | None:
-		"Calls .end() on all modules."
+		"Lets the dispatchers finish their pending events and then calls .end() on all modules."
+
+		for dispatcher in self.dispatchers:
+			if dispatcher.stop(self.stop_timeout): continue
+
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Module '{dispatcher.module.name()}' did not finish handling its events in time. " \
+				f"{dispatcher.pending()} events were left unhandled."
+			)
+
+		self.pool.shutdown(False)
+		if self.background_loop: self.background_loop.stop(self.stop_timeout)
 
 		logger = None
 
@@ -254,20 +339,22 @@ class HalogenModuleManager():
 
 
 	
-	def defined_events(self):
-		return self.dispatch_map.keys()
-	
-
-	def get_module_list(self, event: Type[HalogenEvents.Event]):
-		return self.dispatch_map[event]
+	def subscribe(self, event: Type[HalogenEvents.Event], deliver: Deliver):
+		"Subscribes to an event type and all of its subclasses. Recompiles the dispatch table."
+		self.subscriptions.append((event, deliver))
+		self.dispatch_table = DispatchTable(self.subscriptions)
 	
 
 	def log(
 		self, 
 		chain: HalogenEvents.Chain, 
 		level: Literal["debug", "info", "warning", "critical"], 
-		msg: str
+		msg: str | Callable[[], str]
 		):
+		if HalogenEvents.log_levels[level] < HalogenEvents.log_threshold:
+			return
+
+		if callable(msg): msg = msg()
 
 		event = HalogenEvents.LogEvent(
 			"module",
@@ -0,0 +1,457 @@
+"""
+Replays a recorded event journal (see halogen.core.journal) to measure how fast Halogen handles
+realistic traffic.
+
+Two targets:
+
+- a single module: every recorded event the module handles is passed straight to its .handle(),
+  timing each call.
+- the whole core: only the events that come from outside (user input and commands by default)
+  are emitted onto the bus of a real HalogenCore, everything else is produced by the modules
+  themselves. Measures the time from emitting each event to the end of its dispatch, and for every
+  replayed input, the time until its response (AIResponseEvent, CommandExecutedEvent, ErrorEvent)
+  is dispatched.
+
+The model is always replaced by a stub provider answering after a fixed delay, so the results do
+not depend on a model or the network. Events are replayed at max speed or with their recorded
+timing, and the report has the throughput and per event type latency histograms.
+
+Run 'python -m halogen.core.replay --help' for the options.
+"""
+
+import argparse, asyncio, tempfile, threading, time, tomllib, platform, os
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+
+from halogen.base import HalogenEvents, HalogenConfig, HalogenModule, HalogenError, Chain
+from halogen.base.histogram import Histogram
+from halogen.modules import MODULES, HalogenModelManager, HalogenServer
+from halogen.modules.model.base import BaseModelProvider, ModelResponse
+
+from .core import HalogenCore
+from .aio import AsyncEventBus
+from .journal import JournalRecord, read_journal, filter_records, replay
+
+
+INPUT_EVENTS = ("UserInputEvent", "CommandEvent")
+RESPONSE_EVENTS = (
+	HalogenEvents.AIResponseEvent,
+	HalogenEvents.CommandExecutedEvent,
+	HalogenEvents.ErrorEvent
+)
+
+
+
+class StubProvider(BaseModelProvider):
+	"Answers every prompt after [model.replay] delay seconds, without any model."
+
+	@classmethod
+	def name(cls) -> str:
+		return "replay"
+
+	def load(self, model: str | None = None) -> str:
+		return "Loaded the replay stub."
+
+	def unload(self) -> str:
+		return "Unloaded the replay stub."
+
+	def get_available_models(self) -> list[str]:
+		return ["replay"]
+
+	def generate(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		time.sleep(self.config.get("delay", 0.0))
+		return self.response(prompt)
+
+	async def generate_async(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		await asyncio.sleep(self.config.get("delay", 0.0))
+		return self.response(prompt)
+
+	def response(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse:
+		return ModelResponse(message = f"Replayed response for {prompt.chain}.", tasks = [], extras = [])
+
+
+
+def stub_function(args: list[str], chain: Chain) -> tuple[bool, str]:
+	"Stands in for the commands and tasks of recorded registrations."
+	return (True, "replayed")
+
+
+def rebuild(record: JournalRecord) -> HalogenEvents.Event | None:
+	"The recorded event, with registrations getting a stub in place of the function they carried."
+
+	event = record.to_event()
+	if event is not None or "func" not in record.data:
+		return event
+
+	data = dict(record.data)
+	data["func"] = stub_function
+	try:
+		event_type = HalogenEvents.serialize(record.event)
+		return event_type(record.sender, record.timestamp, record.chain, **data)
+	except (ValueError, TypeError):
+		return None
+
+
+def load_config(directory: Path, delay: float, logdir: Path) -> HalogenConfig:
+	"""
+	The config in the directory, changed to use the stub model and to stay out of the way. The logs
+	are written into logdir, which the caller removes when done.
+	"""
+
+	config_file = directory / "config.toml"
+	if not config_file.exists():
+		raise HalogenError(f"Config file '{config_file}' does not exist!")
+
+	with open(config_file, "rb") as file:
+		data = tomllib.load(file)
+
+	model = data.setdefault("model", {})
+	model["name"] = StubProvider.name()
+	model[StubProvider.name()] = {"delay" : delay}
+
+	logger = data.setdefault("logger", {})
+	logger["terminal"] = False
+	logger["logfile"] = str(logdir / "halogen.log")
+
+	data.setdefault("prompt", {})["logfile"] = str(logdir / "prompts.log")
+
+	data.setdefault("journal", {})["enabled"] = False
+
+	return HalogenConfig(platform.system().lower(), directory, data, False)
+
+
+def install_stub(module: HalogenModule):
+	if isinstance(module, HalogenModelManager):
+		stub = StubProvider(module.config.get_sub_config(StubProvider.name()))
+		module.registered_providers[stub.name()] = stub
+
+
+
+class ReplayReport():
+
+	def __init__(self, target: str) -> None:
+		self.target = target
+		self.replayed = 0
+		self.handled = 0
+		self.elapsed = 0.0
+		self.latencies: dict[str, Histogram] = {}
+		self.responses: dict[str, Histogram] = {}
+		self.unanswered = 0
+		self.emitted: dict[str, int] = {}
+		self.error = ""
+
+
+	def latency(self, event: str) -> Histogram:
+		histogram = self.latencies.get(event)
+		if histogram is None:
+			histogram = self.latencies[event] = Histogram()
+		return histogram
+
+
+	def response(self, event: str) -> Histogram:
+		histogram = self.responses.get(event)
+		if histogram is None:
+			histogram = self.responses[event] = Histogram()
+		return histogram
+
+
+	def render(self, histograms: bool = False) -> str:
+		rate = self.handled / self.elapsed if self.elapsed else 0.0
+
+		lines = [
+			f"Replay of {self.replayed} events against {self.target} took {self.elapsed:.2f}s.",
+			f"Throughput: {self.handled} events handled, {rate:,.0f} events/s.",
+			""
+		]
+
+		sections = [("Latency by event type", self.latencies)]
+		if self.responses:
+			sections.append(("Response latency by input type", self.responses))
+
+		for title, table in sections:
+			lines.append(f"{title}:")
+			for event, histogram in sorted(table.items()):
+				lines.append(f"  {event:<22} {histogram.summary()}")
+				if histograms:
+					lines.extend(f"      {line}" for line in histogram.render().splitlines())
+			lines.append("")
+
+		if self.responses and self.unanswered:
+			lines.append(f"{self.unanswered} inputs got no response.")
+
+		if self.emitted:
+			emitted = ", ".join(f"{name} = {n}" for name, n in sorted(self.emitted.items()))
+			lines.append(f"Emitted by the module: {emitted}")
+
+		if self.error:
+			lines.append(f"Replay failed: {self.error}")
+
+		return "\n".join(lines).rstrip()
+
+
+
+def replay_module(
+	records: Iterable[JournalRecord],
+	module_class: type[HalogenModule],
+	config: HalogenConfig,
+	speed: float | None
+	) -> ReplayReport:
+	"Passes the recorded events the module handles straight to its .handle(), on this thread."
+
+	report = ReplayReport(f"module '{module_class.name()}'")
+
+	def count(event: HalogenEvents.Event):
+		name = type(event).__name__
+		report.emitted[name] = report.emitted.get(name, 0) + 1
+
+	# normally published by the core
+	if not HalogenEvents.set_log_level(config.get("logger.level", "info")):
+		HalogenEvents.set_log_level("info")
+
+	module = module_class(count, config.get_sub_config(module_class.name()))
+	install_stub(module)
+	module.start()
+
+	handled = tuple(module.handled_events())
+	loop = asyncio.new_event_loop() if asyncio.iscoroutinefunction(module.handle) else None
+
+	def handle(record: JournalRecord):
+		event = rebuild(record)
+		if not isinstance(event, handled): return
+
+		report.replayed += 1
+		start = time.perf_counter_ns()
+
+		if loop:
+			loop.run_until_complete(module.handle(event))
+		else:
+			module.handle(event)
+
+		report.latency(type(event).__name__).record(time.perf_counter_ns() - start)
+		report.handled += 1
+
+	start = time.perf_counter()
+	try:
+		replay(records, handle, speed)
+	finally:
+		report.elapsed = time.perf_counter() - start
+		module.end()
+		if loop: loop.close()
+
+	return report
+
+
+def replay_core(
+	records: Iterable[JournalRecord],
+	config: HalogenConfig,
+	speed: float | None,
+	inputs: Iterable[str] = INPUT_EVENTS,
+	idle_timeout: float = 5.0,
+	timeout: float = 30.0
+	) -> ReplayReport:
+	"""
+	Runs a HalogenCore with every module but the server and emits the recorded inputs onto its bus.
+	Waits for all inputs to be answered, or for nothing to be dispatched for idle_timeout seconds.
+
+	Raises HalogenError if the modules are not started within timeout seconds (or the core stopped
+	before that). A core that does not shut down within timeout seconds is noted in the report.
+	"""
+
+	report = ReplayReport("the core")
+	inputs = set(inputs)
+
+	core = HalogenCore()
+	if config.get("core.runtime", "threads") == "asyncio":
+		# the bus .init() would make, made first so the modules get the timed emit below
+		core.eventbus = AsyncEventBus()
+	bus = core.eventbus
+
+	# id of the event -> (when it was emitted, the event so the id is not reused meanwhile)
+	emitted: dict[int, tuple[int, HalogenEvents.Event]] = {}
+	# chain -> when its inputs were emitted and their type, in order
+	waiting: dict[Chain, deque[tuple[int, str]]] = {}
+	waiting_lock = threading.Lock()
+	unanswered = 0
+	replaying = False
+	finished_replaying = False
+	last_dispatch = time.monotonic()
+	all_answered = threading.Event()
+	ready = threading.Event()
+
+	emit = bus.emit
+	def timed_emit(event: HalogenEvents.Event):
+		emitted[id(event)] = (time.perf_counter_ns(), event)
+		emit(event)
+	bus.emit = timed_emit
+
+	core.init(config, exclude = [HalogenServer])
+
+	for module in core.manager.modules: install_stub(module)
+
+	start_modules = core.manager.start_modules
+	def start_then_signal(dev: bool):
+		start_modules(dev)
+		ready.set()
+	core.manager.start_modules = start_then_signal
+
+	pass_events = core.pass_events
+	def timed_pass(event: HalogenEvents.Event):
+		nonlocal unanswered, last_dispatch
+
+		pass_events(event)
+		now = time.perf_counter_ns()
+		last_dispatch = time.monotonic()
+		if replaying: report.handled += 1
+
+		entry = emitted.pop(id(event), None)
+		if entry: report.latency(type(event).__name__).record(now - entry[0])
+
+		if not isinstance(event, RESPONSE_EVENTS): return
+
+		with waiting_lock:
+			pending = waiting.get(event.chain)
+			if not pending: return
+
+			sent, input_type = pending.popleft()
+			if not pending: del waiting[event.chain]
+
+			report.response(input_type).record(now - sent)
+			unanswered -= 1
+			if unanswered == 0 and finished_replaying: all_answered.set()
+	core.pass_events = timed_pass
+
+	def inject(record: JournalRecord):
+		nonlocal unanswered
+
+		if record.event not in inputs: return
+		event = rebuild(record)
+		if event is None: return
+
+		# the replay would end itself
+		if isinstance(event, HalogenEvents.CommandEvent) and event.module == "core" \
+			and event.cmd in ("shutdown", "restart"):
+			return
+
+		report.replayed += 1
+		with waiting_lock:
+			unanswered += 1
+			waiting.setdefault(event.chain, deque()).append((time.perf_counter_ns(), record.event))
+		timed_emit(event)
+
+	# a daemon so a core that never starts (or stops) does not keep the process alive
+	thread = threading.Thread(target = core.run, name = "halogen-core", daemon = True)
+	thread.start()
+
+	deadline = time.monotonic() + timeout
+	while not ready.wait(0.1):
+		if not thread.is_alive():
+			raise HalogenError("The core stopped before its modules were started.")
+		if time.monotonic() > deadline:
+			raise HalogenError(f"The modules were not started within {timeout}s.")
+
+	start = time.perf_counter()
+	replaying = True
+	replay(records, inject, speed)
+
+	with waiting_lock:
+		finished_replaying = True
+		if unanswered <= 0: all_answered.set()
+
+	while not all_answered.wait(0.1):
+		if time.monotonic() - last_dispatch > idle_timeout: break
+
+	report.elapsed = time.perf_counter() - start
+	report.unanswered = max(unanswered, 0)
+
+	core.shutdown_reason = "Replay finished."
+	emit(HalogenEvents.ShutdownEvent(
+		"replay", HalogenEvents.make_timestamp(), HalogenEvents.chain(), False, "Replay finished."
+	))
+	thread.join(timeout)
+	if thread.is_alive():
+		report.error = f"The core did not shut down within {timeout}s."
+
+	return report
+
+
+
+def default_configdir() -> Path:
+	if platform.system().lower() == "windows":
+		return Path(os.environ["APPDATA"]) / "halogen"
+	return Path(os.path.expanduser("~/.config/halogen"))
+
+
+def parse_speed(value: str) -> float | None:
+	if value == "max": return None
+	try:
+		return float(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"Invalid speed '{value}'. Expected 'max' or a number.")
+
+
+def main():
+	modules = {m.name(): m for m in MODULES}
+
+	parser = argparse.ArgumentParser(
+		prog = "halogen-replay",
+		description = "Replay a Halogen event journal against a module or the whole core."
+	)
+
+	parser.add_argument("journal", help = "Path to the journal file.", type = Path)
+
+	parser.add_argument(
+		"-m", "--module",
+		help = "Replay against this module only. Without it, the whole core is used.",
+		choices = sorted(modules)
+	)
+
+	parser.add_argument(
+		"-s", "--speed",
+		help = "'max' (default) or how many times faster than recorded to replay.",
+		type = parse_speed,
+		default = None
+	)
+
+	parser.add_argument("--configdir", help = "Config directory to use.", type = Path)
+
+	parser.add_argument(
+		"--model-delay",
+		help = "Seconds the stub model takes to answer. Default 0.",
+		type = float,
+		default = 0.0
+	)
+
+	parser.add_argument(
+		"-t", "--type",
+		help = "Only replay recorded events of this type. Can be given more than once.",
+		action = "append"
+	)
+
+	parser.add_argument(
+		"--histograms",
+		help = "Show the full latency histograms.",
+		action = "store_true"
+	)
+
+	args = parser.parse_args()
+
+	records = list(filter_records(read_journal(args.journal), None, args.type))
+
+	with tempfile.TemporaryDirectory(prefix = "halogen-replay-") as logdir:
+		config = load_config(args.configdir or default_configdir(), args.model_delay, Path(logdir))
+
+		try:
+			if args.module:
+				report = replay_module(records, modules[args.module], config, args.speed)
+			else:
+				report = replay_core(records, config, args.speed)
+		except HalogenError as e:
+			parser.exit(1, f"Replay failed: {e}\n")
+
+	print(report.render(args.histograms))
+	if report.error: parser.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,152 @@
+import threading, time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from halogen.base.histogram import Histogram, format_ns
+
+from .eventbus import EventBus
+
+if TYPE_CHECKING:
+	from .manager import HalogenModuleManager
+
+
+class HalogenStats():
+	"""
+	Runtime statistics of the core, toggled with 'core stats on|off'.
+
+	While on:
+	- every dispatcher times its module's .handle() per event type (see ModuleDispatcher.instrument),
+	- a sampler thread records the depth of the event bus and the events/s every 'interval' seconds,
+	  keeping the last 'history' samples.
+
+	While off, the dispatchers use their plain .call() and the sampler is stopped, so nothing is
+	measured at all. The timings are kept when turned off, use reset to clear them.
+	"""
+
+	def __init__(self, eventbus: EventBus, manager: "HalogenModuleManager", interval: float = 1.0, history: int = 60) -> None:
+		self.eventbus = eventbus
+		self.manager = manager
+		self.interval = interval
+
+		self.enabled = False
+		self.since = time.monotonic()
+
+		# (seconds since enabled, total depth, depth per lane, events/s)
+		self.samples: deque[tuple[float, int, tuple[int, ...], float]] = deque(maxlen = history)
+
+		self.stopped = threading.Event()
+		self.sampler: threading.Thread | None = None
+
+
+	def enable(self) -> bool:
+		"Returns False if already on."
+		if self.enabled: return False
+		self.enabled = True
+
+		for dispatcher in self.manager.dispatchers:
+			dispatcher.instrument(True)
+
+		self.stopped.clear()
+		self.sampler = threading.Thread(target = self.sample, name = "halogen-stats", daemon = True)
+		self.sampler.start()
+		return True
+
+
+	def disable(self) -> bool:
+		"Returns False if already off."
+		if not self.enabled: return False
+		self.enabled = False
+
+		for dispatcher in self.manager.dispatchers:
+			dispatcher.instrument(False)
+
+		self.stopped.set()
+		if self.sampler and self.sampler is not threading.current_thread():
+			self.sampler.join()
+		self.sampler = None
+		return True
+
+
+	def reset(self):
+		for dispatcher in self.manager.dispatchers:
+			dispatcher.timings.clear()
+		self.samples.clear()
+		self.since = time.monotonic()
+
+
+	def sample(self):
+		bus = self.eventbus
+		last_taken = bus.taken
+		last_time = time.monotonic()
+
+		while not self.stopped.wait(self.interval):
+			now = time.monotonic()
+			taken = bus.taken
+			rate = (taken - last_taken) / (now - last_time)
+
+			lanes = tuple(len(lane) for lane in bus.lanes)
+			self.samples.append((now - self.since, sum(lanes), lanes, rate))
+
+			last_taken, last_time = taken, now
+
+
+	def timings(self) -> list[tuple[str, str, Histogram]]:
+		"(module, event type, histogram) for everything measured, slowest total first."
+		rows = []
+		for dispatcher in self.manager.dispatchers:
+			# copied since the dispatcher may add a new event type meanwhile
+			for event_type, histogram in list(dispatcher.timings.items()):
+				rows.append((dispatcher.module.name(), event_type.__name__, histogram))
+
+		rows.sort(key = lambda row: row[2].total, reverse = True)
+		return rows
+
+
+	def summary(self) -> str:
+		"A few lines, for 'core get stats'."
+		state = "on" if self.enabled else "off"
+		lines = [f"Stats are {state}. Events/s: {self.rate():,.0f}. Bus depth: {self.eventbus.count()}."]
+
+		rows = self.timings()[:5]
+		for module, event, histogram in rows:
+			lines.append(f"{module}/{event}: total = {format_ns(histogram.total)}, {histogram.summary()}")
+
+		if not rows:
+			lines.append("Nothing measured yet. Use 'core stats on'.")
+		return "\n".join(lines)
+
+
+	def rate(self) -> float:
+		return self.samples[-1][3] if self.samples else 0.0
+
+
+	def report(self) -> str:
+		"Everything, for 'core stats show'."
+		state = "on" if self.enabled else "off"
+		elapsed = time.monotonic() - self.since
+
+		lines = [f"Stats are {state}, measuring for {elapsed:.0f}s."]
+
+		if self.samples:
+			depths = [s[1] for s in self.samples]
+			rates = [s[3] for s in self.samples]
+			lanes = ", ".join(
+				f"{name} = {n}" for name, n in zip(self.eventbus.lane_names, self.samples[-1][2])
+			)
+			lines.append(
+				f"Events/s: now = {rates[-1]:,.0f}, mean = {sum(rates) / len(rates):,.0f}, " \
+				f"max = {max(rates):,.0f} (last {len(rates)} samples)"
+			)
+			lines.append(f"Bus depth: now = {depths[-1]} ({lanes}), max = {max(depths)}")
+			lines.append(f"Bus depth over time: {' '.join(str(d) for d in depths)}")
+
+		lines.append("")
+		lines.append(f"{'module':<10} {'event':<22} {'count':>8} {'total':>9} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}")
+
+		for module, event, h in self.timings():
+			lines.append(
+				f"{module:<10} {event:<22} {h.count:>8} {format_ns(h.total):>9} {format_ns(h.mean()):>9} " \
+				f"{format_ns(h.quantile(0.5)):>9} {format_ns(h.quantile(0.99)):>9} {format_ns(h.max):>9}"
+			)
+
+		return "\n".join(lines)
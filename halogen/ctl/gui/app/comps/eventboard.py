@@ -6,8 +6,8 @@ from PySide6.QtWidgets import (
 	QLabel,
 	QFrame
 )
-from halogen.modules.server import HalogenInterface
-from halogen.base import HalogenEvents
+from halogen.modules.server import HalogenInterface, StreamedResponses
+from halogen.base import HalogenEvents, Chain
 
 
 class MessageBox(QFrame):
@@ -35,10 +35,48 @@ class EventBoard(QScrollArea):
 
 		self.setWidget(self.container)
 
+		# responses being streamed and the box showing them
+		self.streams = StreamedResponses()
+		self.stream_boxes: dict[Chain, MessageBox] = {}
+
 	def add_event(self, ev: HalogenEvents.Event):
 
-		if not isinstance(ev, (HalogenEvents.AIResponseEvent, HalogenEvents.UserInputEvent)):
-			return
-		msg = MessageBox(ev.message)
+		match ev:
+			case HalogenEvents.AIResponseDeltaEvent():
+				text = self.streams.add(ev)
+				if text is None: return
+
+				box = self.stream_boxes.get(ev.chain)
+				if box is None:
+					self.stream_boxes[ev.chain] = self.add_message(text)
+				else:
+					box.label.setText(text)
+					self.scroll_to_end()
+
+			case HalogenEvents.AIResponseEvent():
+				self.streams.finish(ev)
+				box = self.stream_boxes.pop(ev.chain, None)
+				if box is None:
+					self.add_message(ev.message)
+				else:
+					box.label.setText(ev.message)
+					self.scroll_to_end()
+
+			case HalogenEvents.ErrorEvent():
+				text = self.streams.fail(ev)
+				box = self.stream_boxes.pop(ev.chain, None)
+				if box is None: return
+				box.label.setText(f"{text or ''}\n[broke off: {ev.error}]")
+				self.scroll_to_end()
+
+			case HalogenEvents.UserInputEvent():
+				self.add_message(ev.message)
+
+	def add_message(self, text: str) -> MessageBox:
+		msg = MessageBox(text)
 		self.layout.insertWidget(self.layout.count() - 1, msg)  
+		self.scroll_to_end()
+		return msg
+
+	def scroll_to_end(self):
 		self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())  
@@ -1,6 +1,6 @@
-import curses, time, shlex, math
-from halogen.modules.server import HalogenInterface
-from halogen.base import HalogenEvents
+import curses, time, shlex
+from halogen.modules.server import HalogenInterface, StreamedResponses
+from halogen.base import HalogenEvents, Chain
 
 
 class HalogenTUI():
@@ -45,6 +45,10 @@ class HalogenTUI():
 
 		self.events_win.keypad(True)
 		self.event_buffer: list[str] = []
+
+		# responses being streamed and their entry in the event buffer
+		self.streams = StreamedResponses()
+		self.stream_entries: dict[Chain, int] = {}
 		self.max_event_buffer_h, self.max_event_buffer_w = self.events_win.getmaxyx()
 		self.max_event_buffer_h -= 2
 		self.max_event_buffer_w -= 4
@@ -99,25 +103,49 @@ class HalogenTUI():
 		
 
 
-	def handle_event(self, ev: HalogenEvents.Event):
+	def handle_event(self, ev: HalogenEvents.Event) -> bool:
+		"Adds the event to the event buffer. Returns whether anything changed."
 		match ev:
+			case HalogenEvents.AIResponseDeltaEvent():
+				text = self.streams.add(ev)
+				if text is None: return False
+
+				if ev.chain not in self.stream_entries:
+					self.stream_entries[ev.chain] = len(self.event_buffer)
+					self.event_buffer.append(text)
+				else:
+					self.event_buffer[self.stream_entries[ev.chain]] = text
 			case HalogenEvents.AIResponseEvent():
-				for i in range(0, len(ev.message), self.max_event_buffer_w):
-					self.event_buffer.append(ev.message[i:i + self.max_event_buffer_w])
-				self.show_events_buffer()
+				self.streams.finish(ev)
+				entry = self.stream_entries.pop(ev.chain, None)
+				if entry is None:
+					self.event_buffer.append(ev.message)
+				else:
+					self.event_buffer[entry] = ev.message
+			case HalogenEvents.ErrorEvent():
+				text = self.streams.fail(ev)
+				entry = self.stream_entries.pop(ev.chain, None)
+				if entry is None: return False
+				self.event_buffer[entry] = f"{text or ''} [broke off: {ev.error}]"
 			case HalogenEvents.CommandExecutedEvent():
 				self.event_buffer.extend(ev.output.splitlines())
-				self.show_events_buffer()
+			case _:
+				return False
+		return True
 
 
 	def show_events_buffer(self):
-		y = 1
-		for ev in self.event_buffer:
-			length = len(ev)
-			self.events_win.addstr(y, 1 ,ev)
-			
-			lines = math.ceil(length / self.max_event_buffer_w)
-			y +=  lines
+		"Draws the end of the event buffer. Only the entries that fit in the window are wrapped."
+		width, height = self.max_event_buffer_w, self.max_event_buffer_h
+
+		rows: list[str] = []
+		for entry in reversed(self.event_buffer):
+			lines = [entry[i:i + width] for i in range(0, len(entry), width)]
+			rows = (lines or [""]) + rows
+			if len(rows) >= height: break
+
+		for y, row in enumerate(rows[-height:], 1):
+			self.events_win.addstr(y, 1, row.ljust(width))
 
 
 	def parse_input(self, s: str):
@@ -151,8 +179,13 @@ class HalogenTUI():
 			key = self.scr.getch()
 			self.handle_input_key(key)
 
+			# take everything that arrived and draw once, a streamed response is many small events
+			changed = False
 			ev = self.interface.check_event(0.05)
-			if ev: self.handle_event(ev)
+			while ev:
+				changed |= self.handle_event(ev)
+				ev = self.interface.check_event()
+			if changed: self.show_events_buffer()
 
 			self.input_win.refresh()
 			self.events_win.refresh()
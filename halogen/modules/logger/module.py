@@ -1,7 +1,7 @@
 from collections.abc import Callable
 from typing import Tuple
 from pathlib import Path
-from halogen.base import HalogenModule, HalogenEvents, HalogenConfig
+from halogen.base import HalogenModule, HalogenEvents, HalogenConfig, HalogenCommand, HalogenWriter, LogRotation, Chain
 import os
 from dataclasses import asdict
 
@@ -14,6 +14,9 @@ class HalogenLogModule(HalogenModule):
 		super().__init__(emit_event, config)
 
 		self.log_file: Path
+		self.file_writer: HalogenWriter | None = None
+		self.terminal_writer: HalogenWriter | None = None
+		self.has_commands = True
 
 		self.log_colors = {
 			"debug"    : Color.CYAN,
@@ -22,7 +25,7 @@ class HalogenLogModule(HalogenModule):
 			"critical" : Color.RED
 		}
 	
-		self.log_levels = {"debug" : 0, "info" : 1, "warning" : 2, "critical" : 3}
+		self.log_levels = HalogenEvents.log_levels
 
 	
 	@classmethod
@@ -42,12 +45,35 @@ class HalogenLogModule(HalogenModule):
 		if isinstance(path, str):
 			self.log_file = Path(path)
 
+		writer_config = {
+			"capacity"       : self.config.get("buffer", 10000),
+			"flush_interval" : self.config.get("flush_interval", 0.5),
+			"flush_lines"    : self.config.get("flush_lines", 256)
+		}
+
+		rotation = LogRotation.from_config(self.config)
+
+		self.file_writer = HalogenWriter.open(
+			self.log_file,
+			name = "halogen-logfile",
+			rotation = rotation,
+			**writer_config
+		)
+
 		self.log(
 			HalogenEvents.chain(),
 			"info", 
 			f"Now logging into file: {self.log_file.absolute()}"
 		)
 
+		compression = self.config.get("compression", "gzip")
+		if rotation and not LogRotation.available(compression):
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Log compression '{compression}' is not available. Using '{rotation.compression}' instead."
+			)
+
 		self.current_level: str = self.config.get("level", "info")
 
 		if self.current_level not in self.log_levels.keys():
@@ -59,10 +85,17 @@ class HalogenLogModule(HalogenModule):
 			)
 			self.current_level = "info"
 
+		# modules drop their logs below this level before even making them
+		HalogenEvents.set_log_level(self.current_level)
+
 		self.to_terminal: bool = self.config.get("terminal", True)
+		if self.to_terminal:
+			self.terminal_writer = HalogenWriter.stdout(name = "halogen-terminal", **writer_config)
 
 
 	def end(self) -> Tuple[bool, str]:
+		for writer in (self.file_writer, self.terminal_writer):
+			if writer: writer.close()
 		return (True, "")
 
 
@@ -82,26 +115,41 @@ class HalogenLogModule(HalogenModule):
 	def write_log(self, ev: HalogenEvents.LogEvent) -> None:
 		if self.log_levels[ev.level] >= self.log_levels[self.current_level]:
 			self.file_log(ev)
-			if self.to_terminal: self.terminal_log(ev)
+			if self.terminal_writer: self.terminal_log(ev)
+
+
+	@HalogenCommand("level", "Get or set the log level. ARGS: [level]")
+	def level_command(self, args: list[str], chain: Chain) -> tuple[bool, str]:
+
+		if not args:
+			return (True, f"Log level: {self.current_level}")
+
+		if len(args) != 1:
+			raise ValueError(f"Expected at most 1 arg. Got {len(args)}.")
+
+		level = args[0]
+		if not HalogenEvents.set_log_level(level):
+			return (False, f"Invalid log level '{level}'. Valid levels: {list(self.log_levels.keys())}")
+
+		self.current_level = level
+		return (True, f"Log level set to '{level}'.")
 
 
 	def terminal_log(self, ev: HalogenEvents.LogEvent) -> None:
 
-		timestamp = f"[{ev.timestamp}]"
+		timestamp = f"[{HalogenEvents.format_timestamp(ev.timestamp)}]"
 		level = Color.colorify(f"[{ev.level.upper()}]", self.log_colors[ev.level])
 		sender = Color.colorify(f"({ev.sender})", Color.MAGENTA)
 		message = ev.message
 
-		log_str = f"{timestamp} {level} {sender} {message}"
-		print(log_str)
+		log_str = f"{timestamp} {level} {sender} {message}\n"
+		self.terminal_writer.write(log_str)
 
 
 	def file_log(self, ev: HalogenEvents.LogEvent) -> None:
 
-		log_str = f"[{ev.timestamp}] [{ev.level.upper()}] ({ev.sender.capitalize()}) {ev.message}\n"
-
-		with open(self.log_file, "a+") as file:
-			file.write(log_str)
+		log_str = f"[{HalogenEvents.format_timestamp(ev.timestamp)}] [{ev.level.upper()}] ({ev.sender.capitalize()}) {ev.message}\n"
+		self.file_writer.write(log_str)
 
 
 	
@@ -1,3 +1,4 @@
 from .provider import BaseModelProvider
 from .response import ModelResponse
+from .stream import MessageExtractor
 from .errors import HalogenModelLoadError, HalogenModelResponseError, HalogenModelApiError, HalogenProviderError
\ No newline at end of file
@@ -1,14 +1,20 @@
 from abc import ABC
-from halogen.base import HalogenEvents, HalogenConfig
+from collections.abc import Iterator, AsyncIterator
+from halogen.base import HalogenEvents, HalogenConfig, HalogenMetrics
 from pathlib import Path
-import os
+import os, asyncio
+
+from pydantic import ValidationError
 
 from .response import ModelResponse
-from .errors import HalogenModelApiError
+from .errors import HalogenModelApiError, HalogenModelResponseError
 
 
 class BaseModelProvider(ABC):
 
+	# set to True by providers that implement .stream()
+	streaming: bool = False
+
 	def __init__(self, config: HalogenConfig) -> None:
 		super().__init__()
 		self.config = config
@@ -66,6 +72,75 @@ class BaseModelProvider(ABC):
 		raise NotImplementedError(f"generate method of model '{self.name()}'")
 
 
+	async def generate_async(self, prompt: HalogenEvents.PromptEvent) -> ModelResponse | None:
+		"""
+		Async version of .generate() used by the ModelManager.
+
+		By default it just runs .generate() on a thread. Providers with an async client should 
+		override this so concurrent requests do not need a thread each.
+		"""
+		return await asyncio.to_thread(self.generate, prompt)
+
+
+	def stream(self, prompt: HalogenEvents.PromptEvent) -> Iterator[str]:
+		"""
+		Streaming version of .generate(). Yields the raw text of the response (the JSON of a 
+		ModelResponse) as the model generates it, in as many pieces as the model sends.
+		The ModelManager shows the message to the user while it is streamed and parses the whole 
+		text with .parse_stream() at the end.
+
+		Raise HalogenModelResponseError if the request fails. Set 'streaming' to True when 
+		overriding this.
+		"""
+		raise NotImplementedError(f"stream method of model '{self.name()}'")
+
+
+	async def stream_async(self, prompt: HalogenEvents.PromptEvent) -> AsyncIterator[str]:
+		"""
+		Async version of .stream() used by the ModelManager.
+
+		By default it runs .stream() on a thread and hands over every piece as soon as it arrives.
+		Providers with an async client should override this.
+		"""
+		loop = asyncio.get_running_loop()
+		pieces: asyncio.Queue[str | None] = asyncio.Queue()
+
+		def pump():
+			try:
+				for piece in self.stream(prompt):
+					loop.call_soon_threadsafe(pieces.put_nowait, piece)
+			finally:
+				loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+		thread = asyncio.ensure_future(asyncio.to_thread(pump))
+
+		while (piece := await pieces.get()) is not None:
+			yield piece
+
+		# raises whatever .stream() raised
+		await thread
+
+
+	def parse_stream(self, text: str) -> ModelResponse:
+		"Turns the full text yielded by .stream() into a ModelResponse."
+		try:
+			return ModelResponse.model_validate_json(text)
+		except ValidationError as e:
+			raise HalogenModelResponseError(f"Streamed response is not a valid ModelResponse: {e}") from e
+
+
+	def count_tokens(self, prompt_tokens: int | None, output_tokens: int | None):
+		"""
+		Adds the tokens used by a request to the metrics. Call it from .generate() if the model 
+		reports its usage, None counts are skipped.
+		"""
+		tokens = HalogenMetrics.counter(
+			"halogen_model_tokens_total", "Tokens used by model requests.", ("provider", "kind")
+		)
+		if prompt_tokens: tokens.inc(prompt_tokens, (self.name(), "prompt"))
+		if output_tokens: tokens.inc(output_tokens, (self.name(), "output"))
+
+
 	def load_api_key(self) -> str:
 		"""
 		Load the API key from the config for non-local models.
@@ -0,0 +1,157 @@
+import json, re
+
+
+# characters that end the plain text of a JSON string
+STRING_SPECIAL = re.compile(r'["\\]')
+
+# characters that matter outside of strings
+STRUCTURE = re.compile(r'[{}\[\]",:]')
+
+# the common escapes, only \uXXXX ones are left to json
+ESCAPES = {
+	'\\"' : '"', "\\\\" : "\\", "\\/" : "/", 
+	"\\b" : "\b", "\\f" : "\f", "\\n" : "\n", "\\r" : "\r", "\\t" : "\t"
+}
+
+
+class MessageExtractor():
+	"""
+	Pulls the text of a single field of the top level JSON object out of a response while it is
+	being streamed, so it can be shown before the whole response (and its tasks) has arrived.
+
+	.feed() takes the raw chunks in order and returns the text of the field that came with them,
+	escapes already decoded. An escape split across two chunks is held back until it is complete.
+	It never fails on broken JSON, it just finds nothing: the full response is still parsed and
+	validated normally once it is complete.
+	"""
+
+	def __init__(self, field: str = "message") -> None:
+		self.field = field
+
+		self.stack: list[str] = [] # open objects and arrays
+		self.in_string = False
+		self.expect_key = False # the next string at the top level is a key
+
+		self.key: list[str] | None = None # the top level key being read
+		self.last_key: str | None = None
+		self.capturing = False # inside the value of the field
+
+		self.escape = "" # an escape sequence that is not complete yet
+		self.done = False
+
+
+	def feed(self, chunk: str) -> str:
+		out: list[str] = []
+		i, n = 0, len(chunk)
+
+		while i < n and not self.done:
+			if self.escape:
+				if self.read_escape(chunk[i], out): i += 1
+				continue
+
+			if self.in_string:
+				i = self.read_string(chunk, i, out)
+				continue
+
+			match = STRUCTURE.search(chunk, i)
+			if not match: break
+			i = match.end()
+			self.read_structure(match.group())
+
+		return "".join(out)
+
+
+	def read_string(self, chunk: str, i: int, out: list[str]) -> int:
+		match = STRING_SPECIAL.search(chunk, i)
+		end = match.start() if match else len(chunk)
+
+		if self.capturing:
+			out.append(chunk[i:end])
+		elif self.key is not None:
+			self.key.append(chunk[i:end])
+
+		if not match: return end
+
+		if match.group() == "\\":
+			self.escape = "\\"
+		else:
+			self.end_string()
+		return end + 1
+
+
+	def end_string(self):
+		self.in_string = False
+
+		if self.key is not None:
+			self.last_key = "".join(self.key)
+			self.key = None
+		elif self.capturing:
+			self.capturing = False
+			self.done = True
+
+
+	def read_structure(self, char: str):
+		top = len(self.stack) == 1 and self.stack[0] == "{"
+
+		match char:
+			case "{" | "[":
+				self.stack.append(char)
+				self.expect_key = char == "{" and len(self.stack) == 1
+			case "}" | "]":
+				if self.stack: self.stack.pop()
+			case ",":
+				self.expect_key = top
+			case ":":
+				self.expect_key = False
+			case '"':
+				self.in_string = True
+				if top and self.expect_key:
+					self.key = []
+				elif top and self.last_key == self.field:
+					self.capturing = True
+
+
+	def read_escape(self, char: str, out: list[str]) -> bool:
+		"""
+		Adds a character to the pending escape. Returns False if the character is not part of it
+		(a high surrogate without its low half) and has to be read again.
+		"""
+		escape = self.escape
+
+		# a \uXXXX high surrogate waits for the \uXXXX low surrogate after it
+		if len(escape) == 6 and char != "\\" or len(escape) == 7 and char != "u":
+			self.flush_escape(escape, out)
+			return False
+
+		escape += char
+		self.escape = escape
+
+		if len(escape) == 2 and char != "u" or len(escape) == 12:
+			self.flush_escape(escape, out)
+		elif len(escape) == 6 and not 0xD800 <= self.code_point(escape) < 0xDC00:
+			self.flush_escape(escape, out)
+		return True
+
+
+	def flush_escape(self, escape: str, out: list[str]):
+		self.escape = ""
+		if not self.capturing: return
+
+		if escape in ESCAPES:
+			out.append(ESCAPES[escape])
+			return
+
+		try:
+			text = json.loads(f'"{escape}"')
+			text.encode()
+		except (ValueError, UnicodeEncodeError):
+			text = "\ufffd"
+		out.append(text)
+
+
+	@staticmethod
+	def code_point(escape: str) -> int:
+		try:
+			return int(escape[2:6], 16)
+		except ValueError:
+			return -1
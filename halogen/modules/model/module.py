@@ -4,7 +4,7 @@ from pathlib import Path
 import os, sys
 from types import ModuleType
 from typing import Tuple, Union
-import inspect, importlib
+import inspect, importlib, time
 
 from halogen.base import (
 	HalogenEvents,
@@ -12,6 +12,7 @@ from halogen.base import (
 	HalogenModule,
 	HalogenError,
 	HalogenCommand,
+	HalogenMetrics,
 	Chain
 )
 from halogen.base.helpers import PyModuleLoader
@@ -20,6 +21,7 @@ from halogen.base.helpers import PyModuleLoader
 from .base import (
 	BaseModelProvider,
 	ModelResponse, 
+	MessageExtractor,
 	HalogenModelResponseError,
 	HalogenProviderError
 )
@@ -35,6 +37,12 @@ class HalogenModelManager(HalogenModule):
 		super().__init__(emit_event, config)
 		self.has_commands = True
 
+		# model requests can take seconds, so handle() is async and requests run side by side
+		self.concurrency: int = self.config.get("max_concurrent", 16)
+
+		# send the message to the client while it is generated, if the provider can stream
+		self.stream: bool = self.config.get("stream", True)
+
 		self.registered_providers: dict[str, BaseModelProvider] = {}
 		self.current_provider: Union[BaseModelProvider, None] = None 
 		
@@ -42,6 +50,22 @@ class HalogenModelManager(HalogenModule):
 
 		self.module_loader = PyModuleLoader()
 
+		self.latency = HalogenMetrics.histogram(
+			"halogen_model_request_seconds",
+			"Time taken by model requests.",
+			("provider", "outcome"),
+			low = 20,
+			high = 38
+		)
+
+		self.first_delta = HalogenMetrics.histogram(
+			"halogen_model_first_delta_seconds",
+			"Time until the first piece of a streamed message was sent to the client.",
+			("provider",),
+			low = 20,
+			high = 38
+		)
+
 
 	@classmethod
 	def name(cls) -> str:
@@ -107,11 +131,11 @@ class HalogenModelManager(HalogenModule):
 		]
 
 
-	def handle(self, event: HalogenEvents.Event) -> None:
+	async def handle(self, event: HalogenEvents.Event) -> None:
 
 		match event:
 			case HalogenEvents.PromptEvent():
-				self.generate_response(event)
+				await self.generate_response(event)
 
 
 	def init_providers(self):
@@ -205,14 +229,21 @@ class HalogenModelManager(HalogenModule):
 		return model_cls
 
 
-	def generate_response(self, event: HalogenEvents.PromptEvent):
+	async def generate_response(self, event: HalogenEvents.PromptEvent):
 
 		if not self.current_provider:
 			return 
 		
+		provider = self.current_provider.name()
+		start = time.perf_counter_ns()
+
 		try:
-			response = self.current_provider.generate(event)
+			if self.stream and self.current_provider.streaming:
+				response = await self.stream_response(self.current_provider, event, start)
+			else:
+				response = await self.current_provider.generate_async(event)
 		except HalogenModelResponseError as e:
+			self.latency.observe(time.perf_counter_ns() - start, (provider, "error"))
 			self.log(
 			HalogenEvents.chain(event),
 			"critical",
@@ -221,9 +252,64 @@ class HalogenModelManager(HalogenModule):
 			)
 			return 
 
+		self.latency.observe(time.perf_counter_ns() - start, (provider, "ok"))
 		self.parse_response(response, HalogenEvents.chain(event))
 
 
+	async def stream_response(
+		self, 
+		provider: BaseModelProvider, 
+		event: HalogenEvents.PromptEvent, 
+		start: int
+		) -> ModelResponse:
+		"""
+		Sends the message of the response to the client piece by piece as the provider streams it,
+		then returns the whole response. The tasks and extras are only known once it is complete.
+
+		If the stream fails after some of the message was sent, an ErrorEvent on the chain tells the
+		client the message is not going to be finished.
+		"""
+		chain = HalogenEvents.chain(event)
+		extractor = MessageExtractor()
+		pieces: list[str] = []
+		offset = 0
+
+		try:
+			async for piece in provider.stream_async(event):
+				pieces.append(piece)
+
+				delta = extractor.feed(piece)
+				if not delta: continue
+
+				if not offset:
+					self.first_delta.observe(time.perf_counter_ns() - start, (provider.name(),))
+
+				self.emit_event(
+					HalogenEvents.AIResponseDeltaEvent(
+						self.name(),
+						HalogenEvents.make_timestamp(),
+						chain,
+						delta,
+						offset
+					)
+				)
+				offset += len(delta)
+
+			return provider.parse_stream("".join(pieces))
+		except Exception as e:
+			if offset:
+				self.emit_event(
+					HalogenEvents.ErrorEvent(
+						self.name(),
+						HalogenEvents.make_timestamp(),
+						chain,
+						f"The response of model '{provider.name()}' broke off. " \
+						f"Encountered Error: {e.__class__.__name__} : {e}."
+					)
+				)
+			raise
+
+
 	def parse_response(self, response: ModelResponse, chain: Chain):
 
 		extras = {}
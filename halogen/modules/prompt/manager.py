@@ -1,6 +1,8 @@
 from collections.abc import Callable
 from typing import Tuple
-from halogen.base import HalogenModule, HalogenEvents, HalogenConfig, Chain, HalogenError
+from halogen.base import (
+	HalogenModule, HalogenEvents, HalogenConfig, Chain, HalogenError, HalogenWriter, LogRotation
+)
 from pathlib import Path
 import os
 
@@ -22,7 +24,9 @@ class HalogenPromptManager(HalogenModule):
 		self.memory: MemoryManager = MemoryManager(self.config.get("memory_length", 50))
 		self.tasks: TasksManager = TasksManager()
 
-		self.log_file = Path(__file__).resolve().parent / "halogen.log"
+		logfile = self.config.get("logfile", "")
+		self.log_file = Path(logfile) if logfile else Path(__file__).resolve().parent / "halogen.log"
+		self.log_writer: HalogenWriter | None = None
 
 		self.prompts_dir = self.config.directory / "prompt"
 
@@ -37,9 +41,16 @@ class HalogenPromptManager(HalogenModule):
 
 	def	start(self) -> None:
 		self.load_core_sections()
+
+		self.log_writer = HalogenWriter.open(
+			self.log_file,
+			name = "halogen-promptlog",
+			rotation = LogRotation.from_config(self.config)
+		)
 		
 		
 	def end(self) -> Tuple[bool, str]:
+		if self.log_writer: self.log_writer.close()
 		return (True, "")
 	
 
@@ -190,9 +201,7 @@ class HalogenPromptManager(HalogenModule):
 
 
 	def print_prompt(self, ev: HalogenEvents.PromptEvent):
-		with open(self.log_file, "a") as file:
-			file.write("\n"*10)
-			file.write(ev.content)
+		self.log_writer.write("\n"*10 + ev.content)
 
 	
 
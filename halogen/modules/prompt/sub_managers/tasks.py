@@ -15,6 +15,7 @@ class TasksManager():
 	def __init__(self):
 		self.task_map: dict[str, list[tuple[str, str, list[str]]]] = {}
 		self.task_string = ""
+		self.make_task_section()
 
 	def add_task(self, ev: HalogenEvents.TaskRegisteredEvent):
 		task_list = self.task_map.setdefault(ev.namespace, [])
@@ -1,3 +1,4 @@
 from .client import HalogenClient
-from .interface import HalogenInterface
+from .multiplex import HalogenConnection, HalogenSession
+from .interface import HalogenInterface, StreamedResponses
 from .server import HalogenServer
\ No newline at end of file
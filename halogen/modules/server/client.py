@@ -1,42 +1,56 @@
 
-import socket, json, threading, queue
+import socket, threading, queue
 from halogen.base import HalogenEvents, Chain
 from typing import Tuple
-from dataclasses import asdict
+from pathlib import Path
+
+from .protocol import FrameReader, HalogenProtocolError, encode_frame
+from .transport import open_connection
+from .codec import CODECS, JSON, SCHEMA, EventCodec, Hello, Subscribe, decode
 
 
 class HalogenClient():
 	"""
 	Base class for connecting with the server.
+
+	Connects over the server's unix socket if it can find it ('path', $HALOGEN_SOCKET or the
+	default path), else over TCP. Asks the server for the first of 'codecs' it allows, events are
+	sent as JSON until it answers.
 	"""
 
 	HOST = "127.0.0.1"
 	PORT = 6240
 
-	def __init__(self) -> None:
+	def __init__(self, path: Path | None = None, codecs: tuple[str, ...] = ("binary", "json")) -> None:
+		self.path = path
+		self.codecs = list(codecs)
+		self.codec: EventCodec = JSON
 		self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.reader = FrameReader()
 		self.client_chain: Chain = Chain(0, 0) #placeholder
 
 		self.lock = threading.Lock()
-		self.read_thread = threading.Thread(target= self.read)
-		self.write_thread = threading.Thread(target = self.write)
+		self.read_thread = threading.Thread(target = self.read, name = "halogen-client-read")
+		self.write_thread = threading.Thread(target = self.write, name = "halogen-client-write")
 
 		self.is_running = True
 
 		self.in_buffer: queue.Queue[HalogenEvents.Event] = queue.Queue()
-		self.out_buffer: queue.Queue[HalogenEvents.Event] = queue.Queue()
+		self.out_buffer: queue.Queue[HalogenEvents.Event | Subscribe] = queue.Queue()
 		
 
 	def start(self):
-		self.socket.settimeout(0.1)
 		
 		try:
-			self.socket.connect((self.HOST, self.PORT))
+			self.socket = open_connection(self.HOST, self.PORT, self.path, 2.0)
+			self.socket.sendall(encode_frame(JSON.control(Hello(self.codecs, SCHEMA))))
 		except (BrokenPipeError, ConnectionResetError, OSError) as e:
 			self.add_error_event(
 				f"Could not start the client properly! Encountered Error = "\
 				f"{e.__class__.__name__}({e.__str__()})"
 			)
+
+		self.socket.settimeout(0.1)
 			
 		self.read_thread.start()
 		self.write_thread.start()
@@ -63,6 +77,15 @@ class HalogenClient():
 			)
 	
 
+	def send(self, event: HalogenEvents.Event):
+		self.out_buffer.put(event)
+
+
+	def subscribe(self, subscribe: Subscribe):
+		"Sends a subscription to the server, see codec.Subscribe."
+		self.out_buffer.put(subscribe)
+
+
 	def chain(self, event: HalogenEvents.Event | None = None) -> Chain:
 		if isinstance(event, HalogenEvents.Event):
 			return event.chain
@@ -75,53 +98,19 @@ class HalogenClient():
 			return chain
 			
 
-	def serialize_event(self, event: HalogenEvents.Event) -> str:
-		dict_form = {}
-
-		dict_form["type"] = event.__class__.__name__
-		dict_form["payload"] = asdict(event)
-
-		string_form = json.dumps(dict_form)+"\n"
-		return string_form
-
-
-
-	def parse_json(self, json_str: str) -> dict | None:
-		try:
-			return(json.loads(json_str))
-		except json.JSONDecodeError as e:
-			error_msg = "Client could not parse the json string sent by the server." \
-			f"Encountered Error= {e.__class__.__name__}: {e.__str__()}."
-
-		self.add_error_event(error_msg)
-
-
-	def deserialize_event(self, msg: str) -> HalogenEvents.Event | None:
-		d = self.parse_json(msg)
-
-		if not d:
-			return None
-		
-		chain = d["payload"].pop("chain")
-		
-		try:
-			event_type = HalogenEvents.serialize(d["type"])
-			event = event_type(
-				**d["payload"], chain=Chain(chain["context"], chain["flow"])
-				)
-			return event
-		except KeyError as e:
-			error_msg = "Client encountered a key error in the input event sent by the server. " \
-			f"Encountered Error= {e.__class__.__name__} : {e.__str__()}."
-
-		self.add_error_event(error_msg)
-		
+	def parse_server_input(self, messages: list[bytes]) -> None:
+		for msg in messages:
+			try:
+				message = decode(msg)
+			except HalogenProtocolError as e:
+				self.add_error_event(f"Client could not decode an event sent by the server. Encountered Error= {e}")
+				continue
 
-	def parse_server_input(self, msg: str) -> None:
-		for part in msg.splitlines():
-			event = self.deserialize_event(part)
-			if event:
-				 self.in_buffer.put(event)
+			match message:
+				case Hello():
+					self.codec = CODECS.get(message.codec, JSON)
+				case _:
+					self.in_buffer.put(message)
 		
 
 	def add_error_event(self, msg):
@@ -139,19 +128,26 @@ class HalogenClient():
 		while self.is_running:
 
 			try:
-				data = self.socket.recv(1024)
+				received = self.reader.recv(self.socket)
 			except socket.timeout:
 				continue
 			except ConnectionRefusedError:
-				data = None
+				received = 0
 			
-			if not data:
+			if not received:
 				self.add_error_event(
 					"Could not communicate with server. Perhaps it was shutdown? " 
 				)
 				continue
+
+			try:
+				messages = self.reader.frames()
+			except HalogenProtocolError as e:
+				self.add_error_event(f"Server sent an invalid frame. Encountered Error= {e}")
+				self.is_running = False
+				continue
 				
-			self.parse_server_input(data.decode())
+			self.parse_server_input(messages)
 			
 			
 	def write(self):
@@ -163,11 +159,17 @@ class HalogenClient():
 			except queue.Empty:
 				continue
 
-			payload = self.serialize_event(event)
-			
-			if payload is None: continue
 			try:
-				self.socket.sendall(payload.encode())
+				if isinstance(event, Subscribe):
+					frame = encode_frame(JSON.control(event))
+				else:
+					frame = encode_frame(self.codec.encode(event))
+			except (HalogenProtocolError, TypeError, ValueError) as e:
+				self.add_error_event(f"Could not send output event to server. {e}")
+				continue
+
+			try:
+				self.socket.sendall(frame)
 			except (BrokenPipeError, ConnectionResetError, OSError) as e:
 				self.add_error_event("Could not send output event to client. " \
 				f"Encountered Error= {e.__class__.__name__}: {e.__str__()}. ")
@@ -0,0 +1,433 @@
+"""
+How events are turned into the messages inside frames and back, see scheme.md.
+
+There are two codecs:
+- json: the JSON scheme. Every client can use it.
+- binary: a compact layout where the fields of every event type are written in the order of the
+  dataclass, without names. Much smaller and faster, but both sides need the same events.
+
+A message says which codec made it (JSON starts with '{', binary with BINARY_MAGIC), so both sides
+always read both. The handshake (see Hello) only decides what each side sends.
+
+Hello, Subscribe and Session are not events, they are only between a client and the server and
+always sent as JSON.
+
+The work that only depends on the event type (its fields, how each one is written) is done once
+per type when a codec is created, not for every event.
+"""
+
+import json, struct, hashlib
+from dataclasses import dataclass, fields, asdict
+from operator import attrgetter
+from collections.abc import Callable
+from types import NoneType, UnionType
+from typing import Any, Literal, get_args, get_origin
+
+from halogen.base import HalogenEvents, Chain
+
+from .protocol import HalogenProtocolError
+
+
+Message = bytes | bytearray | memoryview
+
+# stored in the header of both codecs rather than with the other fields
+HEADER_FIELDS = 3
+
+
+@dataclass(frozen = True, slots = True)
+class Hello():
+	"""
+	The handshake. A client sends the codecs it can use (best first) and the event schema it was
+	built with, the server answers with the codec it picked. Until then, both sides send JSON.
+	"""
+	codecs: list[str]
+	schema: str
+	codec: str | None = None
+
+
+@dataclass(frozen = True, slots = True)
+class Subscribe():
+	"""
+	Sent by a client to choose the events it gets, at any time. Replaces the previous one.
+
+	- events:   event types (by name) to get from every chain. A type also covers its subclasses,
+	            so 'Event' is everything.
+	- contexts: only get those from these chain contexts (clients), empty for any.
+	- senders:  only get those from these modules, empty for any.
+	- replies:  event types to get from the client's own chains, None for the ones every client
+	            gets (see routing.DEFAULT_REPLIES). An empty list opts out of all of them.
+	- context:  the session (see Session) it is for, None for the client itself.
+	"""
+	events: list[str]
+	contexts: list[int]
+	senders: list[str]
+	replies: list[str] | None = None
+	context: int | None = None
+
+
+@dataclass(frozen = True, slots = True)
+class Session():
+	"""
+	Opens or closes a session: an extra chain context on the same connection, so a single client
+	can carry many conversations. The client sends Session(tag) to open one, the server answers 
+	with the same tag and the context of the new session. Session(tag, context, False) closes it.
+	"""
+	tag: int
+	context: int | None = None
+	open: bool = True
+
+
+Control = Hello | Subscribe | Session
+
+CONTROL: dict[str, type[Control]] = {"Hello" : Hello, "Subscribe" : Subscribe, "Session" : Session}
+
+
+def is_instance(value: Any, annotation: Any) -> bool:
+	"Whether a decoded JSON value fits an annotation of a control message."
+	origin = get_origin(annotation)
+
+	if origin is list:
+		(item,) = get_args(annotation)
+		return isinstance(value, list) and all(is_instance(v, item) for v in value)
+	if origin is UnionType:
+		return any(is_instance(value, arg) for arg in get_args(annotation))
+	if annotation is NoneType:
+		return value is None
+	if annotation is int:
+		return isinstance(value, int) and not isinstance(value, bool)
+	return isinstance(value, annotation)
+
+
+def check_control(message: Control) -> Control:
+	"Raises HalogenProtocolError if a field of the control message is not of its type."
+	for field in fields(message):
+		if not is_instance(getattr(message, field.name), field.type):
+			raise HalogenProtocolError(f"Invalid {type(message).__name__}: bad field '{field.name}'.")
+	return message
+
+
+
+def event_types() -> list[type[HalogenEvents.Event]]:
+	"Every event type, ordered by name. Their index is the type id of the binary codec."
+	types = [
+		attr for attr in vars(HalogenEvents).values()
+		if isinstance(attr, type) and issubclass(attr, HalogenEvents.Event)
+	]
+	return sorted(types, key = lambda t: t.__name__)
+
+
+def make_schema() -> str:
+	"A hash of every event type and its fields, the binary codec is only used when both sides agree."
+	parts = []
+	for event_type in event_types():
+		field_list = ",".join(f"{f.name}:{f.type!r}" for f in fields(event_type))
+		parts.append(f"{event_type.__name__}({field_list})")
+	return hashlib.sha1(";".join(parts).encode()).hexdigest()[:16]
+
+
+SCHEMA = make_schema()
+
+
+
+class EventCodec():
+	name = ""
+
+	def encode(self, event: HalogenEvents.Event) -> bytes:
+		raise NotImplementedError(f"encode method of codec '{self.name}'")
+
+	def decode(self, message: Message) -> HalogenEvents.Event | Control:
+		"Raises HalogenProtocolError if the message is not a valid event."
+		raise NotImplementedError(f"decode method of codec '{self.name}'")
+
+
+
+class JsonCodec(EventCodec):
+	"""
+	The JSON scheme. The same output as dataclasses.asdict() and json.dumps(), without asdict's
+	deep copy of every field.
+	"""
+	name = "json"
+
+	def __init__(self) -> None:
+		self.types = {t.__name__ : t for t in event_types()}
+		self.names = {t : tuple(f.name for f in fields(t)[HEADER_FIELDS:]) for t in self.types.values()}
+
+
+	def encode(self, event: HalogenEvents.Event) -> bytes:
+		event_type = type(event)
+		chain = event.chain
+
+		payload = {
+			"sender" : event.sender,
+			"timestamp" : event.timestamp,
+			"chain" : {"context" : chain.context, "flow" : chain.flow}
+		}
+		for name in self.names[event_type]:
+			payload[name] = getattr(event, name)
+
+		return json.dumps({"type" : event_type.__name__, "payload" : payload}).encode()
+
+
+	def control(self, message: Control) -> bytes:
+		return json.dumps({"type" : type(message).__name__, "payload" : asdict(message)}).encode()
+
+
+	def decode(self, message: Message) -> HalogenEvents.Event | Control:
+		try:
+			data = json.loads(bytes(message) if isinstance(message, memoryview) else message)
+		except (ValueError, RecursionError) as e:
+			raise HalogenProtocolError(f"Invalid JSON: {e}") from e
+
+		if not isinstance(data, dict) or not isinstance(data.get("payload"), dict):
+			raise HalogenProtocolError("Invalid event: expected an object with a 'payload' object.")
+
+		try:
+			name = data["type"]
+			payload = data["payload"]
+
+			if name in CONTROL:
+				return check_control(CONTROL[name](**payload))
+
+			chain = payload.pop("chain")
+			context, flow = chain["context"], chain["flow"]
+			if not (is_instance(context, int) and is_instance(flow, int)):
+				raise TypeError("the chain context and flow must be integers")
+
+			return self.types[name](**payload, chain = Chain(context, flow))
+		except (KeyError, TypeError, AttributeError, ValueError) as e:
+			raise HalogenProtocolError(f"Invalid event: {e.__class__.__name__}: {e}") from e
+
+
+
+# the binary codec
+#
+#   u8   BINARY_MAGIC
+#   u16  type id (index in event_types())
+#   i64  timestamp, i64 chain context, i64 chain flow
+#   str  sender
+#        the other fields in the order of the dataclass
+#
+# str is a u32 length and UTF-8, int is i64, bool is u8, list[str] is a u32 count and the strings.
+# Fields of any other type are written as a tagged value: a u8 tag (see below) and the value,
+# which covers everything JSON can hold, nested up to MAX_DEPTH.
+
+BINARY_MAGIC = 0xB1
+MAX_DEPTH = 64
+
+HEADER = struct.Struct("<BHqqq")
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+
+NONE, TRUE, FALSE, INT, FLOAT, STR, LIST, DICT = range(8)
+
+
+def write_str(out: bytearray, value: str):
+	data = value.encode()
+	out += U32.pack(len(data))
+	out += data
+
+def read_str(view: memoryview, pos: int) -> tuple[str, int]:
+	(n,) = U32.unpack_from(view, pos)
+	pos += 4
+	if pos + n > len(view): raise IndexError("string past the end of the message")
+	return str(view[pos:pos + n], "utf-8"), pos + n
+
+
+def write_int(out: bytearray, value: int):
+	out += I64.pack(value)
+
+def read_int(view: memoryview, pos: int) -> tuple[int, int]:
+	return I64.unpack_from(view, pos)[0], pos + 8
+
+
+def write_bool(out: bytearray, value: bool):
+	out.append(1 if value else 0)
+
+def read_bool(view: memoryview, pos: int) -> tuple[bool, int]:
+	return view[pos] != 0, pos + 1
+
+
+def write_str_list(out: bytearray, value: list[str]):
+	out += U32.pack(len(value))
+	for item in value: write_str(out, item)
+
+def read_str_list(view: memoryview, pos: int) -> tuple[list[str], int]:
+	(n,) = U32.unpack_from(view, pos)
+	pos += 4
+	items = []
+	for _ in range(n):
+		item, pos = read_str(view, pos)
+		items.append(item)
+	return items, pos
+
+
+def write_value(out: bytearray, value: Any):
+	if value is None:
+		out.append(NONE)
+	elif value is True:
+		out.append(TRUE)
+	elif value is False:
+		out.append(FALSE)
+	elif isinstance(value, int):
+		out.append(INT)
+		out += I64.pack(value)
+	elif isinstance(value, float):
+		out.append(FLOAT)
+		out += F64.pack(value)
+	elif isinstance(value, str):
+		out.append(STR)
+		write_str(out, value)
+	elif isinstance(value, (list, tuple)):
+		out.append(LIST)
+		out += U32.pack(len(value))
+		for item in value: write_value(out, item)
+	elif isinstance(value, dict):
+		out.append(DICT)
+		out += U32.pack(len(value))
+		for key, item in value.items():
+			write_str(out, key)
+			write_value(out, item)
+	else:
+		raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def read_value(view: memoryview, pos: int, depth: int = 0) -> tuple[Any, int]:
+	if depth > MAX_DEPTH: raise ValueError(f"Values nested deeper than {MAX_DEPTH}")
+	tag = view[pos]
+	pos += 1
+
+	match tag:
+		case 0: return None, pos
+		case 1: return True, pos
+		case 2: return False, pos
+		case 3: return I64.unpack_from(view, pos)[0], pos + 8
+		case 4: return F64.unpack_from(view, pos)[0], pos + 8
+		case 5: return read_str(view, pos)
+		case 6:
+			(n,) = U32.unpack_from(view, pos)
+			pos += 4
+			items = []
+			for _ in range(n):
+				item, pos = read_value(view, pos, depth + 1)
+				items.append(item)
+			return items, pos
+		case 7:
+			(n,) = U32.unpack_from(view, pos)
+			pos += 4
+			d = {}
+			for _ in range(n):
+				key, pos = read_str(view, pos)
+				d[key], pos = read_value(view, pos, depth + 1)
+			return d, pos
+
+	raise ValueError(f"Unknown value tag {tag}")
+
+
+Writer = Callable[[bytearray, Any], None]
+Reader = Callable[[memoryview, int], tuple[Any, int]]
+
+def field_codec(annotation: Any) -> tuple[Writer, Reader]:
+	"How a field is written, from its annotation."
+	origin = get_origin(annotation)
+
+	if annotation is str:
+		return write_str, read_str
+	if origin is Literal and all(isinstance(arg, str) for arg in get_args(annotation)):
+		return write_str, read_str
+	if annotation is bool:
+		return write_bool, read_bool
+	if annotation is int:
+		return write_int, read_int
+	if origin is list and get_args(annotation) == (str,):
+		return write_str_list, read_str_list
+	return write_value, read_value
+
+
+
+class BinaryCodec(EventCodec):
+	"""
+	The binary layout above. An event that does not fit it (a field holding something else than
+	its annotation says) is sent as JSON instead, the receiver tells them apart by the first byte.
+	"""
+	name = "binary"
+
+	def __init__(self, fallback: JsonCodec) -> None:
+		self.fallback = fallback
+
+		# type : (type id, getter of the fields after the header, writers)
+		self.encoders: dict[type, tuple[int, Callable[[Any], tuple], tuple[Writer, ...]]] = {}
+		# type id : (type, readers)
+		self.decoders: list[tuple[type, tuple[Reader, ...]]] = []
+
+		for type_id, event_type in enumerate(event_types()):
+			event_fields = fields(event_type)[HEADER_FIELDS:]
+			codecs = [field_codec(f.type) for f in event_fields]
+			names = [f.name for f in event_fields]
+
+			if len(names) > 1:
+				getter = attrgetter(*names)
+			elif names:
+				getter = lambda event, get = attrgetter(names[0]): (get(event),)
+			else:
+				getter = lambda event: ()
+
+			self.encoders[event_type] = (type_id, getter, tuple(c[0] for c in codecs))
+			self.decoders.append((event_type, tuple(c[1] for c in codecs)))
+
+
+	def encode(self, event: HalogenEvents.Event) -> bytes:
+		type_id, getter, writers = self.encoders[type(event)]
+		chain = event.chain
+
+		try:
+			out = bytearray(HEADER.pack(BINARY_MAGIC, type_id, event.timestamp, chain.context, chain.flow))
+			write_str(out, event.sender)
+			for write, value in zip(writers, getter(event)):
+				write(out, value)
+		except (TypeError, AttributeError, ValueError, OverflowError, struct.error):
+			return self.fallback.encode(event)
+
+		return bytes(out)
+
+
+	def decode(self, message: Message) -> HalogenEvents.Event:
+		with memoryview(message) as view:
+			try:
+				_, type_id, timestamp, context, flow = HEADER.unpack_from(view, 0)
+				event_type, readers = self.decoders[type_id]
+
+				sender, pos = read_str(view, HEADER.size)
+				values = []
+				for read in readers:
+					value, pos = read(view, pos)
+					values.append(value)
+			except (struct.error, IndexError, ValueError) as e:
+				raise HalogenProtocolError(f"Invalid binary event: {e.__class__.__name__}: {e}") from e
+
+			if pos != len(view):
+				raise HalogenProtocolError(f"Binary {event_type.__name__} has {len(view) - pos} extra bytes.")
+
+		return event_type(sender, timestamp, Chain(context, flow), *values)
+
+
+
+JSON = JsonCodec()
+BINARY = BinaryCodec(JSON)
+
+CODECS: dict[str, EventCodec] = {JSON.name : JSON, BINARY.name : BINARY}
+
+
+def decode(message: Message) -> HalogenEvents.Event | Control:
+	"Decodes a message of either codec."
+	if message and message[0] == BINARY_MAGIC:
+		return BINARY.decode(message)
+	return JSON.decode(message)
+
+
+def pick_codec(hello: Hello, allowed: list[str]) -> EventCodec:
+	"The codec the server uses for a client: the first one the client asked for that is allowed."
+	for name in hello.codecs:
+		if name not in allowed or name not in CODECS: continue
+		if name == BINARY.name and hello.schema != SCHEMA: continue
+		return CODECS[name]
+	return JSON
@@ -0,0 +1,93 @@
+import socket
+
+from .protocol import FrameReader
+from .codec import EventCodec, JSON
+
+
+class ClientConnection():
+	"""
+	A client of the server: its socket, the frames read from it so far, the bytes waiting to be
+	sent to it and the codec they are encoded with. Only touched by the server's I/O thread.
+
+	The socket is non-blocking. Whatever the client is not ready to take yet stays in 'outgoing'
+	and the server waits for the socket to become writable instead of blocking every other client.
+	A client that does not read at all would make 'outgoing' grow forever, so it is capped at
+	'max_pending' bytes, see HalogenServer.handle_slow_client() for what happens past that.
+	"""
+
+	def __init__(self, sock: socket.socket, context: int, max_pending: int = 0) -> None:
+		self.socket = sock
+		self.context = context
+
+		# contexts of the sessions opened on this connection besides its own, see codec.Session
+		self.sessions: set[int] = set()
+
+		self.reader = FrameReader()
+
+		# what events are sent with, JSON until the client asks for something else
+		self.codec: EventCodec = JSON
+
+		self.outgoing = bytearray()
+		self.sent = 0 # bytes of outgoing already sent
+
+		# whether the selector is waiting for the socket to become writable
+		self.writing = False
+
+		self.max_pending = max_pending # 0 for no limit
+
+		# events dropped since the client last caught up
+		self.dropped = 0
+
+
+	def fileno(self) -> int:
+		return self.socket.fileno()
+
+
+	def pending(self) -> int:
+		return len(self.outgoing) - self.sent
+
+
+	def fits(self, n: int) -> bool:
+		"""
+		Whether n more bytes can be queued without going over max_pending. Anything fits while 
+		nothing is waiting, so a frame bigger than the limit still gets through to a client that 
+		keeps up.
+		"""
+		pending = len(self.outgoing) - self.sent
+		return not pending or not self.max_pending or pending + n <= self.max_pending
+
+
+	def queue(self, frame: bytes):
+		self.outgoing += frame
+
+
+	def flush(self) -> bool:
+		"""
+		Sends as much as the socket takes right now. Returns True if nothing is left to send.
+		Connection errors are raised as is.
+		"""
+		while self.sent < len(self.outgoing):
+			try:
+				with memoryview(self.outgoing) as view:
+					self.sent += self.socket.send(view[self.sent:])
+			except (BlockingIOError, InterruptedError):
+				break
+
+		if self.sent == len(self.outgoing):
+			self.outgoing.clear()
+			self.sent = 0
+			return True
+
+		# keep the buffer from only ever growing under a client that is always behind
+		if self.sent > len(self.outgoing) // 2:
+			del self.outgoing[:self.sent]
+			self.sent = 0
+
+		return False
+
+
+	def close(self):
+		try:
+			self.socket.close()
+		except OSError:
+			pass
@@ -1,5 +1,7 @@
 from halogen.base import HalogenEvents, Chain
 from .client import HalogenClient
+from .codec import Subscribe
+from .multiplex import HalogenConnection, HalogenSession
 import socket, shlex
 from queue import Empty
 
@@ -11,14 +13,25 @@ class HalogenInterface():
 	messes.
 	"""
 
-	def __init__(self, name: str) -> None:
+	def __init__(self, name: str, connection: HalogenConnection | None = None) -> None:
 		self.name = name
+		self.subscription: Subscribe | None = None
+
+		# if given, the interface is a session of this connection instead of a client of its own
+		self.connection = connection
 
 
 	def start(self) -> Chain:
 		"Start the client and the interface. Returns the first client chain (basically an ID)"
-		self.client = HalogenClient()
-		self.client.start()
+		self.client: HalogenClient | HalogenSession
+
+		if self.connection:
+			self.client = self.connection.open_session()
+		else:
+			self.client = HalogenClient()
+			self.client.start()
+
+		if self.subscription: self.client.subscribe(self.subscription)
 		return self.client.client_chain
 
 
@@ -45,7 +58,7 @@ class HalogenInterface():
 		"""
 		Send an event to the halogen server.
 		"""
-		self.client.out_buffer.put(ev)
+		self.client.send(ev)
 
 
 	def send_message(self, msg: str) -> Chain:
@@ -83,6 +96,24 @@ class HalogenInterface():
 		return chain
 
 
+	def subscribe(
+		self, 
+		events: list[str], 
+		contexts: list[int] | None = None, 
+		senders: list[str] | None = None, 
+		replies: list[str] | None = None
+		):
+		"""
+		Chooses the events received, on top of the replies to the messages and commands sent.
+		For example, subscribe(["LogEvent"], senders = ["tasks"]) receives the logs of the tasks 
+		module and subscribe([], replies = ["AIResponseEvent"]) only the full AI responses.
+		See Subscribe for the details. Can be called before .start() and is kept across restarts.
+		"""
+		replies = None if replies is None else list(replies)
+		self.subscription = Subscribe(list(events), list(contexts or []), list(senders or []), replies)
+		if hasattr(self, "client"): self.client.subscribe(self.subscription)
+
+
 	def end(self):
 		self.client.end()
 
@@ -99,4 +130,46 @@ class HalogenInterface():
 
 
 	
-	
\ No newline at end of file
+	
+
+
+class StreamedResponses():
+	"""
+	Helper for clients showing AI responses while they are generated. Puts the AIResponseDeltaEvents
+	of every chain back together until the full AIResponseEvent arrives, or an ErrorEvent on the
+	chain says it never will.
+	"""
+
+	def __init__(self) -> None:
+		self.messages: dict[Chain, str] = {}
+
+
+	def add(self, ev: HalogenEvents.AIResponseDeltaEvent) -> str | None:
+		"""
+		Returns the message received so far, or None if the delta does not continue it (one was
+		dropped on the way). In that case, just wait for the full response.
+		"""
+		text = self.messages.get(ev.chain, "")
+		if ev.offset != len(text):
+			return None
+
+		text += ev.delta
+		self.messages[ev.chain] = text
+		return text
+
+
+	def is_streaming(self, chain: Chain) -> bool:
+		return chain in self.messages
+
+
+	def finish(self, ev: HalogenEvents.AIResponseEvent) -> bool:
+		"Forgets the streamed message of the response's chain. Returns whether there was one."
+		return self.messages.pop(ev.chain, None) is not None
+
+
+	def fail(self, ev: HalogenEvents.ErrorEvent) -> str | None:
+		"""
+		Forgets the streamed message of the error's chain, the response broke off. Returns the part
+		received, None if nothing was being streamed on the chain.
+		"""
+		return self.messages.pop(ev.chain, None)
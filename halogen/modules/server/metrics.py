@@ -0,0 +1,55 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from halogen.base import HalogenMetrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+	content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+	def do_GET(self):
+		if self.path.split("?")[0] not in ("/metrics", "/"):
+			self.send_error(404)
+			return
+
+		body = HalogenMetrics.render().encode()
+
+		self.send_response(200)
+		self.send_header("Content-Type", self.content_type)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+	def log_message(self, format, *args):
+		pass # scrapes every few seconds would flood the terminal
+
+
+
+class MetricsEndpoint():
+	"""
+	Serves HalogenMetrics over HTTP at /metrics, for Prometheus or anything that reads its text
+	format. Runs on its own thread, so a scrape only reads the metrics and never waits on the core.
+	"""
+
+	def __init__(self, host: str, port: int) -> None:
+		self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+		self.httpd.daemon_threads = True
+		self.thread = threading.Thread(target = self.httpd.serve_forever, name = "halogen-metrics", daemon = True)
+
+
+	@property
+	def address(self) -> str:
+		host, port = self.httpd.server_address[:2]
+		return f"http://{host}:{port}/metrics"
+
+
+	def start(self):
+		self.thread.start()
+
+
+	def end(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+		self.thread.join(2)
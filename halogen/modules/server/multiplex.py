@@ -0,0 +1,343 @@
+import socket, threading, selectors, queue
+from collections import deque
+from dataclasses import replace
+from itertools import count
+from pathlib import Path
+
+from halogen.base import HalogenEvents, Chain
+
+from .protocol import HalogenProtocolError, encode_frame
+from .transport import open_connection
+from .connection import ClientConnection
+from .codec import CODECS, JSON, SCHEMA, Control, Hello, Subscribe, Session, decode
+from .routing import Route, RouteIndex
+
+
+class HalogenConnection():
+	"""
+	A single connection to the server carrying many sessions, for clients that hold a lot of
+	conversations at once. Every session (see .open_session()) has a chain context and an inbox of
+	its own, but they all share one socket and one I/O thread, where a HalogenClient each would
+	take a socket and two threads.
+
+	The connection is a client itself: the events of its own context, and whatever it subscribed
+	to, arrive in its in_buffer. The server sends an event once per connection however many of its
+	sessions get it, the connection hands it to each of them with the same routes as the server.
+	"""
+
+	HOST = "127.0.0.1"
+	PORT = 6240
+
+	def __init__(self, path: Path | None = None, codecs: tuple[str, ...] = ("binary", "json")) -> None:
+		self.path = path
+		self.codecs = list(codecs)
+		self.client_chain: Chain = Chain(0, 0) #placeholder
+
+		# the socket, its frame reader and the bytes waiting to be sent, once connected
+		self.connection: ClientConnection | None = None
+
+		self.in_buffer: queue.Queue[HalogenEvents.Event] = queue.Queue()
+
+		# handed from any thread to the I/O thread, which does all the encoding and sending
+		self.out_buffer: deque[HalogenEvents.Event | Control] = deque()
+
+		self.sessions: dict[int, HalogenSession] = {}
+
+		# who gets what the server sends, the connection itself or a session. Only used by the I/O thread
+		self.routes = RouteIndex()
+
+		# sessions being opened, by the tag of their Session message
+		self.tags = count(1)
+		self.opening: dict[int, queue.Queue[int]] = {}
+		self.opening_lock = threading.Lock()
+
+		self.selector = selectors.DefaultSelector()
+		self.waker, self.wakeup = socket.socketpair()
+		self.wake_pending = False
+
+		self.io_thread = threading.Thread(target = self.run, name = "halogen-connection")
+		self.is_running = True
+
+
+	def start(self):
+		try:
+			sock = open_connection(self.HOST, self.PORT, self.path, 2.0)
+			sock.sendall(encode_frame(JSON.control(Hello(self.codecs, SCHEMA))))
+		except OSError as e:
+			self.add_error_event(
+				self.in_buffer,
+				f"Could not start the connection properly! Encountered Error = " \
+				f"{e.__class__.__name__}({e})"
+			)
+			return
+
+		sock.setblocking(False)
+		self.connection = ClientConnection(sock, 0)
+		self.waker.setblocking(False)
+		self.wakeup.setblocking(False)
+
+		self.selector.register(sock, selectors.EVENT_READ)
+		self.selector.register(self.wakeup, selectors.EVENT_READ)
+		self.io_thread.start()
+
+		event = self.in_buffer.get()
+
+		if isinstance(event, HalogenEvents.ClientActivationEvent):
+			self.client_chain = event.chain
+			self.connection.context = event.chain.context
+		else:
+			self.add_error_event(self.in_buffer, "No greeting sent by the server :(")
+
+
+	def end(self):
+		self.is_running = False
+		self.wake()
+		if self.io_thread.is_alive(): self.io_thread.join(8)
+
+		self.selector.close()
+		self.waker.close()
+		self.wakeup.close()
+		if self.connection: self.connection.close()
+
+
+	def open_session(self, timeout: float | None = 5.0) -> "HalogenSession":
+		"""
+		Opens a new session on the connection and returns it once the server gave it a context.
+		Raises TimeoutError if the server does not answer in time.
+		"""
+		tag = next(self.tags)
+		answer: queue.Queue[int] = queue.Queue(1)
+		self.opening[tag] = answer
+
+		self.send(Session(tag))
+
+		try:
+			context = answer.get(True, timeout)
+		except queue.Empty:
+			with self.opening_lock:
+				self.opening.pop(tag, None)
+				late = None if answer.empty() else answer.get()
+
+			# answered just after the timeout, it is not going to be used
+			if late is not None: self.close_session(self.sessions[late])
+			raise TimeoutError(f"The server did not open a session in {timeout}s.")
+
+		self.opening.pop(tag, None)
+		return self.sessions[context]
+
+
+	def close_session(self, session: "HalogenSession"):
+		if self.sessions.pop(session.client_chain.context, None):
+			self.send(Session(0, session.client_chain.context, False))
+
+
+	def subscribe(self, subscribe: Subscribe):
+		"Sends a subscription for the connection's own context, see codec.Subscribe."
+		self.send(replace(subscribe, context = None))
+
+
+	def chain(self, event: HalogenEvents.Event | None = None) -> Chain:
+		if isinstance(event, HalogenEvents.Event):
+			return event.chain
+		chain = self.client_chain
+		self.client_chain = Chain(chain.context, chain.flow + 1)
+		return chain
+
+
+	def send(self, message: HalogenEvents.Event | Control):
+		"Sends an event (or a control message) to the server. Safe to call from any thread."
+		self.out_buffer.append(message)
+		self.wake()
+
+
+	def wake(self):
+		if self.wake_pending: return
+		self.wake_pending = True
+
+		try:
+			self.waker.send(b"\0")
+		except OSError:
+			pass
+
+
+	def add_error_event(self, inbox: queue.Queue, msg: str):
+		event = HalogenEvents.ErrorEvent(
+			"halogen-connection",
+			HalogenEvents.make_timestamp(),
+			self.client_chain,
+			msg
+		)
+		inbox.put(event)
+
+
+	def run(self):
+		"The I/O thread: reads and writes the socket for every session."
+
+		while self.is_running:
+			for key, mask in self.selector.select():
+				if not self.is_running: break
+
+				if key.fileobj is self.wakeup:
+					self.send_pending()
+					continue
+
+				if mask & selectors.EVENT_READ:
+					self.receive()
+				if mask & selectors.EVENT_WRITE and self.is_running:
+					self.flush()
+
+
+	def send_pending(self):
+		try:
+			while self.wakeup.recv(4096): pass
+		except (BlockingIOError, InterruptedError):
+			pass
+
+		self.wake_pending = False
+		if not self.is_running: return
+
+		while self.out_buffer:
+			message = self.out_buffer.popleft()
+			self.route(message)
+
+			try:
+				if isinstance(message, HalogenEvents.Event):
+					frame = encode_frame(self.connection.codec.encode(message))
+				else:
+					frame = encode_frame(JSON.control(message))
+			except (HalogenProtocolError, TypeError, ValueError) as e:
+				self.add_error_event(self.inbox(message), f"Could not send output event to server. {e}")
+				continue
+
+			self.connection.queue(frame)
+
+		self.flush()
+
+
+	def flush(self):
+		try:
+			done = self.connection.flush()
+		except OSError as e:
+			self.lost(f"Could not send output event to server. Encountered Error= {e.__class__.__name__}: {e}")
+			return
+
+		if done == self.connection.writing:
+			self.connection.writing = not done
+			events = selectors.EVENT_READ | (selectors.EVENT_WRITE if not done else 0)
+			self.selector.modify(self.connection.socket, events)
+
+
+	def receive(self):
+		try:
+			received = self.connection.reader.recv(self.connection.socket)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			received = 0
+
+		if not received:
+			self.lost("Could not communicate with server. Perhaps it was shutdown? ")
+			return
+
+		try:
+			messages = self.connection.reader.frames()
+		except HalogenProtocolError as e:
+			self.lost(f"Server sent an invalid frame. Encountered Error= {e}")
+			return
+
+		for msg in messages:
+			try:
+				message = decode(msg)
+			except HalogenProtocolError as e:
+				self.add_error_event(self.in_buffer, f"Could not decode an event sent by the server. Encountered Error= {e}")
+				continue
+
+			match message:
+				case Hello():
+					self.connection.codec = CODECS.get(message.codec, JSON)
+				case Session():
+					self.opened(message)
+				case HalogenEvents.ClientActivationEvent() if message.chain.context in self.sessions:
+					pass # the session already knows its context
+				case HalogenEvents.ClientActivationEvent() if not self.routes.routes:
+					# the greeting of the connection itself, see .start()
+					self.routes.add(Route(self, None, message.chain.context))
+					self.in_buffer.put(message)
+				case HalogenEvents.Event():
+					receivers = self.routes.match(message)
+					if not receivers: self.inbox(message).put(message)
+					for receiver in receivers: receiver.in_buffer.put(message)
+
+
+	def route(self, message: HalogenEvents.Event | Control):
+		"Keeps the routes up to date with what is sent to the server, see .receive()."
+		match message:
+			case Subscribe():
+				context = self.client_chain.context if message.context is None else message.context
+				owner = self.sessions.get(context, self)
+				self.routes.add(Route(owner, message, context))
+			case Session(open = False):
+				self.routes.remove(message.context)
+
+
+	def opened(self, session: Session):
+		with self.opening_lock:
+			answer = self.opening.get(session.tag)
+			if answer is None or session.context is None:
+				# nobody is waiting anymore, give the context back
+				if session.context is not None: self.send(Session(0, session.context, False))
+				return
+
+			self.sessions[session.context] = HalogenSession(self, session.context)
+			self.routes.add(Route(self.sessions[session.context], None, session.context))
+			answer.put(session.context)
+
+
+	def inbox(self, message: HalogenEvents.Event | Control) -> queue.Queue:
+		"The inbox of the session an event belongs to, the connection's own for everything else."
+		if isinstance(message, HalogenEvents.Event):
+			session = self.sessions.get(message.chain.context)
+			if session: return session.in_buffer
+		return self.in_buffer
+
+
+	def lost(self, msg: str):
+		"The connection is gone, every session is told so."
+		self.is_running = False
+		self.add_error_event(self.in_buffer, msg)
+		for session in list(self.sessions.values()):
+			self.add_error_event(session.in_buffer, msg)
+
+
+
+class HalogenSession():
+	"""
+	A session of a HalogenConnection: a client of its own as far as the server is concerned, with
+	its own chain context and inbox. Used like a HalogenClient (see HalogenInterface).
+	"""
+
+	def __init__(self, connection: HalogenConnection, context: int) -> None:
+		self.connection = connection
+		self.client_chain = Chain(context, 0)
+		self.in_buffer: queue.Queue[HalogenEvents.Event] = queue.Queue()
+
+
+	def chain(self, event: HalogenEvents.Event | None = None) -> Chain:
+		if isinstance(event, HalogenEvents.Event):
+			return event.chain
+		chain = self.client_chain
+		self.client_chain = Chain(chain.context, chain.flow + 1)
+		return chain
+
+
+	def send(self, event: HalogenEvents.Event):
+		self.connection.send(event)
+
+
+	def subscribe(self, subscribe: Subscribe):
+		"Sends a subscription for the context of the session, see codec.Subscribe."
+		self.connection.send(replace(subscribe, context = self.client_chain.context))
+
+
+	def end(self):
+		self.connection.close_session(self)
@@ -0,0 +1,123 @@
+"""
+The wire protocol between the server and its clients, see scheme.md.
+
+Every message is a frame: a 4 byte big endian length followed by that many bytes of the message
+(see codec.py for what is inside). Reads can end anywhere, in the middle of a length or a frame,
+so every connection keeps a FrameReader that only hands out whole frames.
+"""
+
+import socket, struct
+
+from halogen.base import HalogenError
+
+
+LENGTH = struct.Struct(">I")
+
+# anything bigger is treated as a broken connection rather than allocated
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class HalogenProtocolError(HalogenError):
+	"""
+	Error raised when a peer sends something that is not a valid frame. The connection cannot be
+	recovered after it since the frame boundaries are lost.
+	"""
+	def __init__(self, *args: object):
+		super().__init__(*args)
+
+
+
+def encode_frame(message: str | bytes) -> bytes:
+	payload = message.encode() if isinstance(message, str) else message
+	if len(payload) > MAX_FRAME:
+		raise HalogenProtocolError(f"Message of {len(payload)} bytes is over the frame limit of {MAX_FRAME}.")
+	return LENGTH.pack(len(payload)) + payload
+
+
+
+class FrameReader():
+	"""
+	Reassembles the frames of a single connection.
+
+	Data is received straight into a reusable buffer (recv_into) and frames are cut out of it with
+	memoryview slices, so a frame is copied once: when it is handed out. The buffer grows to fit a
+	frame bigger than it and shrinks back once that frame is consumed.
+	"""
+
+	def __init__(self, chunk: int = 64 * 1024, max_frame: int = MAX_FRAME) -> None:
+		self.chunk = chunk
+		self.max_frame = max_frame
+
+		self.buffer = bytearray(chunk)
+		self.start = 0 # first byte not consumed yet
+		self.end = 0 # end of the received data
+
+		# size of the frame (with its length) waiting for more data, 0 if not known yet
+		self.wanted = 0
+
+
+	def recv(self, sock: socket.socket) -> int:
+		"""
+		Receives whatever is available from the socket. Returns the amount of bytes read, 0 if the
+		peer closed the connection. Socket errors (timeouts included) are raised as is.
+		"""
+		self.make_room(self.chunk)
+
+		with memoryview(self.buffer) as view:
+			n = sock.recv_into(view[self.end:])
+
+		self.end += n
+		return n
+
+
+	def feed(self, data: bytes):
+		"Adds data received some other way."
+		self.make_room(len(data))
+		self.buffer[self.end:self.end + len(data)] = data
+		self.end += len(data)
+
+
+	def make_room(self, n: int):
+		"Makes sure at least n bytes (and all of the pending frame) fit after the received data."
+		unread = self.end - self.start
+		needed = max(unread + n, self.wanted)
+
+		if len(self.buffer) - self.end >= n and len(self.buffer) - self.start >= needed:
+			return
+
+		# move the unread bytes to the front first, growing only if that is not enough
+		if self.start:
+			self.buffer[:unread] = self.buffer[self.start:self.end]
+			self.start, self.end = 0, unread
+
+		if len(self.buffer) < needed:
+			self.buffer.extend(bytes(needed - len(self.buffer)))
+
+
+	def frames(self) -> list[bytes]:
+		"Every complete frame received so far."
+		messages = []
+
+		with memoryview(self.buffer) as view:
+			while self.end - self.start >= LENGTH.size:
+				(length,) = LENGTH.unpack_from(self.buffer, self.start)
+
+				if length > self.max_frame:
+					raise HalogenProtocolError(f"Frame of {length} bytes is over the limit of {self.max_frame}.")
+
+				begin = self.start + LENGTH.size
+				if self.end - begin < length:
+					self.wanted = LENGTH.size + length
+					break
+
+				messages.append(bytes(view[begin:begin + length]))
+				self.start = begin + length
+				self.wanted = 0
+
+		if self.start == self.end:
+			self.start = self.end = 0
+			if len(self.buffer) > 4 * self.chunk:
+				# a big frame went through, give the memory back
+				self.buffer = bytearray(self.chunk)
+
+		return messages
@@ -0,0 +1,195 @@
+"""
+Which clients get which events.
+
+Every client gets the replies to its own chains (the responses, command outputs... of the events
+it sent) and, if it sent a Subscribe, whatever it observes of the other chains: logs, tasks or the
+conversations of other clients for example.
+"""
+
+from halogen.base import HalogenEvents
+
+from .codec import Subscribe
+from .connection import ClientConnection
+
+
+# what every client gets from its own chains unless it subscribes otherwise
+DEFAULT_REPLIES = (
+	"AIResponseEvent",
+	"AIResponseDeltaEvent",
+	"CommandExecutedEvent",
+	"ConfirmationEvent",
+	"ErrorEvent",
+	"ClientActivationEvent"
+)
+
+# (context, sender) an event is looked up with, None matching any
+Key = tuple[int | None, str | None]
+
+
+def type_names(event_type: type) -> frozenset[str]:
+	"The names an event type can be subscribed with: its own and those of its bases."
+	return frozenset(cls.__name__ for cls in event_type.__mro__)
+
+
+
+class Route():
+	"""
+	What a single client gets, compiled from its Subscribe. A session opened on a connection has a
+	route of its own, with the context of the session.
+
+	The client is only told apart by its identity, so a HalogenConnection uses the same routes to
+	hand what the server sends it to its sessions.
+	"""
+	__slots__ = ("client", "context", "replies", "events", "contexts", "senders")
+
+	def __init__(
+		self, 
+		client: ClientConnection, 
+		subscribe: Subscribe | None = None, 
+		context: int | None = None
+		) -> None:
+		self.client = client
+		self.context = client.context if context is None else context
+
+		if subscribe is None:
+			subscribe = Subscribe([], [], [], None)
+
+		replies = DEFAULT_REPLIES if subscribe.replies is None else subscribe.replies
+		self.replies = frozenset(replies)
+		self.events = frozenset(subscribe.events)
+		self.contexts: tuple[int | None, ...] = tuple(subscribe.contexts) or (None,)
+		self.senders: tuple[str | None, ...] = tuple(subscribe.senders) or (None,)
+
+
+	def names(self) -> frozenset[str]:
+		return self.replies | self.events
+
+
+	def keys(self, names: frozenset[str]) -> set[Key]:
+		"The keys an event type (by its names) is sent to this client with."
+		keys: set[Key] = set()
+
+		if not self.replies.isdisjoint(names):
+			keys.add((self.context, None))
+
+		if not self.events.isdisjoint(names):
+			keys.update((context, sender) for context in self.contexts for sender in self.senders)
+
+		return keys
+
+
+
+class EventFilter(dict):
+	"""
+	Maps an event type to whether any client wants it at all, so the server can skip everything
+	else before it even gets to the I/O thread. Resolved per type the first time it is asked for.
+
+	Never modified apart from that cache. RouteIndex makes a new one when the names change.
+	"""
+
+	def __init__(self, names: frozenset[str]) -> None:
+		super().__init__()
+		self.names = names
+
+
+	def __missing__(self, event_type: type) -> bool:
+		wanted = not self.names.isdisjoint(type_names(event_type))
+		self[event_type] = wanted
+		return wanted
+
+
+
+class RouteIndex():
+	"""
+	The routes of every client, compiled per event type into a table of (context, sender) to the
+	clients getting it. An event is matched with at most four lookups and only touches the clients
+	it is sent to, however many clients are connected or observing.
+
+	The table of an event type is built the first time it is needed and then kept up to date as
+	clients come, go and subscribe. Only used by the server's I/O thread, apart from .filter which
+	is swapped whole and safe to read from anywhere.
+	"""
+
+	def __init__(self) -> None:
+		self.routes: dict[int, Route] = {}
+		self.tables: dict[type, dict[Key, list[ClientConnection]]] = {}
+		self.names: dict[type, frozenset[str]] = {}
+
+		# every name some route uses, counted so it can tell when one is no longer used
+		self.used: dict[str, int] = {}
+		self.filter = EventFilter(frozenset())
+
+
+	def add(self, route: Route):
+		"Adds the route of a client, replacing the one it had."
+		self.remove(route.context)
+		self.routes[route.context] = route
+
+		for event_type, table in self.tables.items():
+			for key in route.keys(self.names[event_type]):
+				table.setdefault(key, []).append(route.client)
+
+		self.count_names(route, 1)
+
+
+	def remove(self, context: int):
+		route = self.routes.pop(context, None)
+		if route is None: return
+
+		for event_type, table in self.tables.items():
+			for key in route.keys(self.names[event_type]):
+				clients = table[key]
+				clients.remove(route.client)
+				if not clients: del table[key]
+
+		self.count_names(route, -1)
+
+
+	def count_names(self, route: Route, n: int):
+		before = len(self.used)
+
+		for name in route.names():
+			count = self.used.get(name, 0) + n
+			if count: self.used[name] = count
+			else: del self.used[name]
+
+		if len(self.used) != before:
+			self.filter = EventFilter(frozenset(self.used))
+
+
+	def table(self, event_type: type) -> dict[Key, list[ClientConnection]]:
+		table = self.tables.get(event_type)
+		if table is not None: return table
+
+		names = type_names(event_type)
+		table = {}
+		for route in self.routes.values():
+			for key in route.keys(names):
+				table.setdefault(key, []).append(route.client)
+
+		self.names[event_type] = names
+		self.tables[event_type] = table
+		return table
+
+
+	def match(self, event: HalogenEvents.Event) -> tuple[ClientConnection, ...]:
+		"""
+		Every client the event is sent to, each once even if several of its sessions want it. A copy,
+		the routes can change while the clients are being sent to (a client is disconnected for 
+		example).
+		"""
+		table = self.table(type(event))
+		if not table: return ()
+
+		context, sender = event.chain.context, event.sender
+		found = [
+			clients for clients in (
+				table.get((context, None)),
+				table.get((context, sender)),
+				table.get((None, sender)),
+				table.get((None, None))
+			) if clients
+		]
+
+		if len(found) == 1: return tuple(found[0])
+		return tuple({id(client) : client for clients in found for client in clients}.values())
@@ -1,17 +1,26 @@
 
-import socket, threading, queue, json, select, math
-from dataclasses import asdict
+import socket, threading, selectors, math
+from collections import deque
 from collections.abc import Callable
 from typing import Tuple
+from pathlib import Path
 
 from halogen.base import (
 	HalogenModule, 
 	HalogenConfig, 
 	HalogenEvents, 
 	HalogenCommand,
+	HalogenMetrics,
 	Chain
 )
 
+from .metrics import MetricsEndpoint
+from .protocol import HalogenProtocolError, encode_frame
+from .connection import ClientConnection
+from .codec import Hello, Subscribe, Session, JSON, SCHEMA, EventCodec, decode, event_types, pick_codec
+from .routing import Route, RouteIndex
+from .transport import default_socket_path, listen_unix, unix_supported
+
 
 
 class HalogenServer(HalogenModule):
@@ -19,6 +28,8 @@ class HalogenServer(HalogenModule):
 	HOST = "127.0.0.1"
 	PORT = 6240
 
+	slow_policies = ("drop", "disconnect")
+
 	def __init__(
 		self, 
 		emit_event: Callable[[HalogenEvents.Event], None], 
@@ -27,25 +38,54 @@ class HalogenServer(HalogenModule):
 
 		super().__init__(emit_event, config)
 		self.has_commands = True
-		self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-		# map of chain id to client
-		self.clients: dict[int, socket.socket] = {}
+		# map of chain context to client, a client with sessions is there once for each of them
+		self.clients: dict[int, ClientConnection] = {}
+
+		# who gets which event, see routing.py
+		self.routes = RouteIndex()
 
 		self.is_running = True
 
-		try:
-			self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-			self.socket.bind((HalogenServer.HOST, HalogenServer.PORT))
-		except Exception as e:
-			raise Exception("Critical: Could not start halogen server.") from e
+		# the TCP socket, the unix socket is set up once started (see .start_unix())
+		self.socket: socket.socket | None = None
+		self.unix_path: Path | None = None
+		self.listeners: list[socket.socket] = []
+
+		if self.config.get("tcp", True):
+			self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			try:
+				self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+				self.socket.bind((self.HOST, self.PORT))
+			except Exception as e:
+				raise Exception("Critical: Could not start halogen server.") from e
 		
 
-		self.out_buffer: queue.Queue[HalogenEvents.Event] = queue.Queue()
+		# handed from .handle() to the I/O thread, which does all the encoding and sending
+		self.out_buffer: deque[HalogenEvents.Event] = deque()
+
+		# the I/O thread sleeps in the selector, .handle() writes to 'waker' to get it going
+		self.selector = selectors.DefaultSelector()
+		self.waker, self.wakeup = socket.socketpair()
+		self.wake_pending = False
 
 		self.lock = threading.Lock()
-		self.read_thread = threading.Thread(target = self.read)
-		self.write_thread = threading.Thread(target = self.write)
+		self.io_thread = threading.Thread(target = self.run, name = "halogen-server")
+
+		# how far behind (in bytes) a client may fall before .handle_slow_client() steps in
+		self.max_pending: int = self.config.get("max_pending", 4 * 1024 * 1024)
+		self.slow_policy: str = self.config.get("slow_client", "drop")
+
+		self.metrics: MetricsEndpoint | None = None
+
+		self.received = HalogenMetrics.counter("halogen_server_received_total", "Events received from clients.")
+		self.sent = HalogenMetrics.counter("halogen_server_sent_total", "Events sent to clients.")
+		self.dropped = HalogenMetrics.counter(
+			"halogen_server_dropped_total", "Events not sent to clients that fell too far behind."
+		)
+		self.disconnected = HalogenMetrics.counter(
+			"halogen_server_slow_disconnects_total", "Clients disconnected for falling too far behind."
+		)
 
 	
 	@classmethod
@@ -54,128 +94,470 @@ class HalogenServer(HalogenModule):
 	
 	def start(self):
 
-		self.socket.settimeout(0.1)
-		self.socket.listen()
-		self.read_thread.start()
-		self.write_thread.start()
+		if self.slow_policy not in self.slow_policies:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Invalid value '{self.slow_policy}' for 'slow_client' under [server]. " \
+				f"Valid values: {list(self.slow_policies)}. Using 'drop'."
+			)
+			self.slow_policy = "drop"
+
+		if self.socket:
+			self.socket.setblocking(False)
+			self.socket.listen(socket.SOMAXCONN)
+			self.listeners.append(self.socket)
+
+		if self.config.get("unix_socket", True) and unix_supported():
+			self.start_unix()
+
+		if not self.listeners:
+			self.log(
+				HalogenEvents.chain(),
+				"critical",
+				"The server is not listening on anything, no client can connect. " \
+				"Turn on 'tcp' or 'unix_socket' under [server]."
+			)
+
+		self.waker.setblocking(False)
+		self.wakeup.setblocking(False)
+
+		for listener in self.listeners:
+			self.selector.register(listener, selectors.EVENT_READ)
+		self.selector.register(self.wakeup, selectors.EVENT_READ)
+		self.io_thread.start()
+
+		if self.config.get("metrics", False):
+			self.start_metrics()
+
+
+	def start_unix(self):
+		path = Path(self.config.get("socket_path", "") or default_socket_path())
+		mode = self.config.get("socket_mode", 0o600)
+
+		try:
+			listener = listen_unix(path, mode)
+		except OSError as e:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Could not listen on the unix socket {path}. Encountered Error = " \
+				f"{e.__class__.__name__}({e})"
+			)
+			return
+
+		listener.setblocking(False)
+		self.listeners.append(listener)
+		self.unix_path = path
+
+		self.log(
+			HalogenEvents.chain(),
+			"info",
+			f"Listening on the unix socket {path} (mode {mode:o})"
+		)
+
+
+	def start_metrics(self):
+		host = self.config.get("metrics_host", "127.0.0.1")
+		port = self.config.get("metrics_port", 6241)
+
+		try:
+			self.metrics = MetricsEndpoint(host, port)
+		except OSError as e:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Could not start the metrics endpoint on {host}:{port}. Encountered Error = " \
+				f"{e.__class__.__name__}({e})"
+			)
+			return
+
+		HalogenMetrics.collector("server", self.collect_metrics)
+		self.metrics.start()
+
+		self.log(
+			HalogenEvents.chain(),
+			"info",
+			f"Serving metrics at {self.metrics.address}"
+		)
+
+
+	def collect_metrics(self):
+		with self.lock: 
+			sessions = len(self.clients)
+			clients = list({id(client) : client for client in self.clients.values()}.values())
+
+		HalogenMetrics.gauge("halogen_clients", "Clients connected to the server.").set(len(clients))
+		HalogenMetrics.gauge(
+			"halogen_client_sessions", "Chain contexts of the clients, sessions included."
+		).set(sessions)
+		HalogenMetrics.gauge(
+			"halogen_server_pending_bytes", "Bytes waiting to be sent to clients."
+		).set(sum(client.pending() for client in clients))
 
 
 	def end(self) -> Tuple[bool, str]:
 
 		self.is_running = False
-		self.read_thread.join(8)
-		self.write_thread.join(8)
 
-		read_alive = self.read_thread.is_alive()
-		write_alive = self.write_thread.is_alive()
-		
-		self.socket.shutdown(socket.SHUT_WR)
-		self.socket.close()
-
-		if read_alive or write_alive:
-			return (
-				False,
-				"Could not close the read and write threads. " \
-				f"Read thread = alive: {read_alive}, " \
-				f"Write thread = alive: {write_alive}"
-		    )
+		if self.metrics:
+			HalogenMetrics.remove_collector("server")
+			self.metrics.end()
+			self.metrics = None
+
+		self.wake()
+		self.io_thread.join(8)
+
+		if self.io_thread.is_alive():
+			return (False, "Could not close the I/O thread.")
+
+		self.selector.close()
+		for listener in self.listeners: listener.close()
+		self.waker.close()
+		self.wakeup.close()
+
+		if self.unix_path:
+			self.unix_path.unlink(missing_ok = True)
 		
 		return (True, "")
 	
 
 	def handled_events(self) -> list[type[HalogenEvents.Event]]:
-		return [
-			HalogenEvents.AIResponseEvent,
-			HalogenEvents.CommandExecutedEvent,
-			HalogenEvents.ConfirmationEvent,
-			HalogenEvents.ErrorEvent,
-			HalogenEvents.ClientActivationEvent
-		]
+		# clients can subscribe to any event, what nobody wants is skipped right away in .handle()
+		return [HalogenEvents.Event]
 	
 
 	def handle(self, event: HalogenEvents.Event) -> None:
-		match event:
-			case HalogenEvents.Event():
-				self.out_buffer.put(event)
+		if self.routes.filter[type(event)]:
+			self.out_buffer.append(event)
+			self.wake()
+
+
+	def wake(self):
+		# one byte is enough however many events are waiting, see .send_events()
+		if self.wake_pending: return
+		self.wake_pending = True
+
+		try:
+			self.waker.send(b"\0")
+		except OSError:
+			pass # full, so the I/O thread has plenty to wake up to
 	
 
-	def serialize_event(self, event: HalogenEvents.Event) -> str:
-		dict_form = {}
+	def parse_client_input(self, client: ClientConnection, messages: list[bytes]) -> None:
+		for msg in messages:
+			try:
+				message = decode(msg)
+			except HalogenProtocolError as e:
+				self.log(
+					HalogenEvents.chain(),
+					"critical",
+					f"Server could not decode an event sent by a client. Encountered Error= {e}"
+				)
+				continue
+
+			match message:
+				case Hello():
+					self.negotiate(client, message)
+				case Subscribe():
+					self.subscribe(client, message)
+				case Session():
+					self.handle_session(client, message)
+				case _:
+					self.received.inc()
+					self.emit_event(message)
 
-		dict_form["type"] = event.__class__.__name__
-		dict_form["payload"] = asdict(event)
 
-		string_form = json.dumps(dict_form)+"\n"
-		return string_form
+	def negotiate(self, client: ClientConnection, hello: Hello):
+		"Picks the codec events are sent to the client with and lets the client know."
+		allowed = self.config.get("codecs", ["binary", "json"])
+		client.codec = pick_codec(hello, allowed)
 
+		client.queue(encode_frame(JSON.control(Hello(allowed, SCHEMA, client.codec.name))))
+		self.flush_client(client)
+
+		self.log(
+			HalogenEvents.chain(),
+			"debug",
+			lambda: f"Client ({client.context}:0) asked for {hello.codecs}, using {client.codec.name}."
+		)
+		
+		
+	def subscribe(self, client: ClientConnection, subscribe: Subscribe):
+		"Replaces the route of a client (or of one of its sessions) with what it subscribed to."
+		context = client.context if subscribe.context is None else subscribe.context
+
+		if context != client.context and context not in client.sessions:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Client ({client.context}:0) subscribed for session {context} which is not its own."
+			)
+			return
 
-	def parse_json(self, json_str: str) -> dict | None:
 		try:
-			return(json.loads(json_str))
-		except json.JSONDecodeError as e:
-			error_msg = "Server could not parse the json string sent by a client." \
-			f"Encountered Error= {e.__class__.__name__}: {e.__str__()}. JSON STRING: {json_str}"
+			route = Route(client, subscribe, context)
+		except TypeError as e:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Client ({context}:0) sent an invalid subscription. Encountered Error= {e}"
+			)
+			return
+
+		known = {t.__name__ for t in event_types()}
+		unknown = sorted(name for name in route.names() if name not in known)
+		if unknown:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Client ({context}:0) subscribed to unknown events {unknown}. " \
+				"They will only match events defined later on, if any."
+			)
+
+		self.routes.add(route)
 
 		self.log(
 			HalogenEvents.chain(),
-			"critical",
-			error_msg
+			"debug",
+			lambda: f"Client ({context}:0) subscribed to {subscribe}."
 		)
 
 
-	def deserialize_event(self, msg: str) -> HalogenEvents.Event | None:
-		d = self.parse_json(msg)
+	def handle_session(self, client: ClientConnection, session: Session):
+		if session.open:
+			self.open_session(client, session.tag)
+		elif session.context in client.sessions:
+			self.close_session(client, session.context)
+		else:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Client ({client.context}:0) tried to close session {session.context} which is not its own."
+			)
 
-		if not d:
-			return None
-		
-		chain = d["payload"].pop("chain")
 
-		# for some reason dataclasses module doesnt recursively intialize
-		# objects from nested dicts so I had to use this primitive method
-		# TODO: improve
+	def open_session(self, client: ClientConnection, tag: int):
+		"Gives the client a new chain context on the same connection, see codec.Session."
+		chain_id = HalogenEvents.new_context_chain()
+		client.sessions.add(chain_id.context)
+
+		# the answer goes out before the ClientActivationEvent so the client knows the context by then
+		client.queue(encode_frame(JSON.control(Session(tag, chain_id.context))))
+		self.flush_client(client)
+
+		if self.clients.get(client.context) is client:
+			self.activate(client, chain_id)
+
+
+	def close_session(self, client: ClientConnection, context: int):
+		client.sessions.discard(context)
+		self.routes.remove(context)
+		with self.lock:
+			self.clients.pop(context, None)
+
+
+	def run(self):
+		"The I/O thread: accepts, reads and writes every client in a single non-blocking loop."
+
+		while self.is_running:
+			for key, mask in self.selector.select():
+				if key.fileobj is self.wakeup:
+					self.send_events()
+				elif key.data is None:
+					self.accept_clients(key.fileobj)
+				else:
+					self.serve_client(key.data, mask)
+
+		# whatever the clients take right away, nothing is waited for
+		self.send_events()
+
+		for client in list(self.clients.values()):
+			self.cleanup_client(client)
+
 
+	def serve_client(self, client: ClientConnection, mask: int):
+		"Whatever goes wrong with a single client drops that client, not the I/O thread of all of them."
 		try:
-			event_type = HalogenEvents.serialize(d["type"])
-			event = event_type(
-				**d["payload"], chain=Chain(chain["context"], chain["flow"])
+			if mask & selectors.EVENT_READ:
+				self.handle_client(client)
+			if mask & selectors.EVENT_WRITE and client.context in self.clients:
+				self.flush_client(client)
+		except Exception as e:
+			self.log(
+				HalogenEvents.chain(),
+				"critical",
+				f"Dropping client ({client.context}:0) after an unexpected error. " \
+				f"Encountered Error= {e.__class__.__name__}: {e}"
+			)
+			self.cleanup_client(client)
+
+
+	def accept_clients(self, listener: socket.socket):
+		while True:
+			try:
+				sock, _ = listener.accept()
+			except (BlockingIOError, InterruptedError):
+				return
+			except OSError as e:
+				self.log(
+					HalogenEvents.chain(),
+					"warning",
+					f"Could not accept a client. Encountered Error= {e.__class__.__name__}: {e}"
 				)
-			return event
-		except KeyError as e:
-			error_msg = "Server encountered a key error in the input event sent by a client. " \
-			f"Encountered Error= {e.__class__.__name__} : {e.__str__()}. JSON STRING: {msg}"
+				return
 
-		self.log(
-			HalogenEvents.chain(),
-			"critical",
-			error_msg
-		)
-		
-	
-	def parse_client_input(self, msg: str) -> None:
-		for part in msg.splitlines():
-			event = self.deserialize_event(part)
-			if event:
-				self.emit_event(event)
-		
-		
-	def handle_client(self, client: socket.socket):
+			sock.setblocking(False)
+			if listener is self.socket:
+				# frames are sent whole, waiting to fill a segment only adds latency
+				sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			self.greet_client(sock)
+
+
+	def handle_client(self, client: ClientConnection):
 		try:
-			with self.lock: data = client.recv(1024)
-		except ConnectionResetError:
-			data = None
+			received = client.reader.recv(client.socket)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			received = 0
 
-		if not data:
+		if not received:
+			self.cleanup_client(client)
+			return
+
+		try:
+			messages = client.reader.frames()
+		except HalogenProtocolError as e:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				f"Dropping a client that sent an invalid frame. Encountered Error= {e}"
+			)
 			self.cleanup_client(client)
 			return
 		
-		self.parse_client_input(data.decode())
+		self.parse_client_input(client, messages)
+
+
+	def send_events(self):
+		"Encodes the events handed over by .handle() into the buffers of their clients."
+		try:
+			while self.wakeup.recv(4096): pass
+		except (BlockingIOError, InterruptedError):
+			pass
+
+		# cleared before taking the events, an event added after this wakes the thread up again
+		self.wake_pending = False
+
+		pending: dict[int, ClientConnection] = {}
+
+		while self.out_buffer:
+			event = self.out_buffer.popleft()
+
+			# an event going to many clients is only encoded once per codec
+			frames: dict[EventCodec, bytes | None] = {}
+
+			for client in self.routes.match(event):
+				if client.codec in frames:
+					frame = frames[client.codec]
+				else:
+					frame = frames[client.codec] = self.encode_event(client.codec, event)
+				if frame is None: continue
+
+				if not client.fits(len(frame)):
+					self.handle_slow_client(client, event)
+					continue
+
+				client.queue(frame)
+				self.sent.inc()
+				pending[client.context] = client
+
+		# a client gets everything queued for it in as few sends as it takes
+		for client in pending.values():
+			if self.clients.get(client.context) is client:
+				self.flush_client(client)
+
+
+	def encode_event(self, codec: EventCodec, event: HalogenEvents.Event) -> bytes | None:
+		try:
+			return encode_frame(codec.encode(event))
+		except (HalogenProtocolError, TypeError, ValueError) as e:
+			self.log(event.chain, "warning", f"Could not send output event to client. {e}")
+			return None
+
+
+	def handle_slow_client(self, client: ClientConnection, event: HalogenEvents.Event):
+		"""
+		Called for an event that would put a client more than 'max_pending' bytes behind. With 
+		'slow_client' set to drop, the event is dropped and the client gets the events after it once
+		it catches up. With disconnect, the client is disconnected.
+		Either way, the other clients are never held up by it.
+		"""
+		if self.slow_policy == "disconnect":
+			self.log(
+				event.chain,
+				"warning",
+				f"Disconnecting client ({client.context}:0), it is over {client.max_pending} bytes behind."
+			)
+			self.disconnected.inc()
+			self.cleanup_client(client)
+			return
 
+		if not client.dropped:
+			self.log(
+				event.chain,
+				"warning",
+				f"Client ({client.context}:0) is over {client.max_pending} bytes behind. " \
+				"Dropping events sent to it until it catches up."
+			)
 
-	def greet_client(self, client: socket.socket):
+		client.dropped += 1
+		self.dropped.inc()
+
+
+	def flush_client(self, client: ClientConnection):
+		try:
+			done = client.flush()
+		except OSError as e:
+			self.log(
+				HalogenEvents.chain(),
+				"warning",
+				"Could not send output event to client. " \
+				f"Encountered Error= {e.__class__.__name__}: {e.__str__()}. " \
+				f"Client has chain id: ({client.context}:0)" 
+			)
+			self.cleanup_client(client)
+			return
+
+		if done and client.dropped:
+			self.log(
+				HalogenEvents.chain(),
+				"info",
+				f"Client ({client.context}:0) caught up, {client.dropped} events sent to it were dropped."
+			)
+			client.dropped = 0
+
+		# only wait for the socket to be writable while there is something left to write
+		if done == client.writing:
+			client.writing = not done
+			events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.writing else 0)
+			self.selector.modify(client.socket, events, client)
+
+
+	def greet_client(self, sock: socket.socket):
 
 		chain_id = HalogenEvents.new_context_chain()
 
+		client = ClientConnection(sock, chain_id.context, self.max_pending)
+		self.selector.register(sock, selectors.EVENT_READ, client)
+
+		self.activate(client, chain_id)
+
+
+	def activate(self, client: ClientConnection, chain_id: Chain):
+		"Starts routing the events of a new context (a client or a session) to the client."
+
 		msg = f"Client successfully registered to the server with Chain ID: {chain_id}"
 
 		event = HalogenEvents.ClientActivationEvent(
@@ -191,76 +573,46 @@ class HalogenServer(HalogenModule):
 			msg
 		)
 
+		self.routes.add(Route(client, context = chain_id.context))
+
 		with self.lock:
 			self.clients[chain_id.context] = client 
 
 		self.emit_event(event)
 
 
-	def cleanup_client(self, client: socket.socket):
-		client.close()
-		for items in self.clients.items():
-			if client is items[1]:
-				with self.lock: 
-					self.clients.pop(items[0])
-				break
-
-
-	def read(self):
-		
-		while self.is_running:
-
-			try:
-				conn, _ = self.socket.accept()
-				self.greet_client(conn)
-			except socket.timeout:
-				pass
-
-			readable: list[socket.socket] = select.select(self.clients.values(), [], [], 0.2)[0]
-
-			for client in readable:
-				self.handle_client(client)
-					
-
-	def write(self):
-		
-		while self.is_running:
-			
-			try:
-				event = self.out_buffer.get(True, 0.1)
-			except queue.Empty:
-				continue
-
-
-			client = self.clients.get(event.chain.context, None)
-
-			if client is None: continue
-			
-			payload = self.serialize_event(event)
+	def cleanup_client(self, client: ClientConnection):
+		try:
+			self.selector.unregister(client.socket)
+		except (KeyError, ValueError):
+			pass
 
-			try:
-				client.sendall(payload.encode())
-			except (BrokenPipeError, ConnectionResetError, OSError) as e:
-				self.log(
-					event.chain,
-					"warning",
-					"Could not send output event to client. " \
-					f"Encountered Error= {e.__class__.__name__}: {e.__str__()}. " \
-					f"Client has chain id: {event.chain}" 
-				)
-				self.cleanup_client(client)
+		client.close()
+		for context in [client.context, *client.sessions]:
+			self.close_session(client, context)
 
 
 	
 	@HalogenCommand("address", "Get the socket address of the halogen server.")
 	def get_address(self, args: list[str], chain: Chain) -> tuple[bool, str]:
-		return (True, f"{self.HOST}:{self.PORT}")
+		addresses = []
+		if self.socket: addresses.append(f"{self.HOST}:{self.PORT}")
+		if self.unix_path: addresses.append(f"unix:{self.unix_path}")
+		return (True, "\n".join(addresses) or "The server is not listening on anything.")
+
+	@HalogenCommand("metrics", "Get the address of the metrics endpoint, if it is on.")
+	def get_metrics(self, args: list[str], chain: Chain) -> tuple[bool, str]:
+		if not self.metrics:
+			return (False, "The metrics endpoint is off. Turn it on with 'metrics = true' under [server].")
+		return (True, self.metrics.address)
 
 	@HalogenCommand("clients", "Get all connected clients and their info.")
 	def get_clients(self, args: list[str], chain: Chain) -> tuple[bool, str]:
 		string = []
-		for context, client in self.clients.items():
-			string.append(f"Client : ({context}:0)")
+		with self.lock: clients = list({id(client) : client for client in self.clients.values()}.values())
+		for client in clients:
+			sessions = "".join(f", session ({context}:0)" for context in sorted(client.sessions))
+			string.append(f"Client : ({client.context}:0){sessions}, {client.pending()} bytes waiting to be sent")
 		return (True, "\n".join(string))
 
 
@@ -0,0 +1,120 @@
+"""
+How the server and its clients reach each other: TCP on 127.0.0.1:6240 and, where the platform
+has them, unix domain sockets. The protocol on top (see protocol.py) is the same on both.
+
+A unix socket skips the TCP stack, so messages are cheaper, and access is controlled by the file
+permissions of the socket instead of anyone on the host being able to connect. Several Halogen
+instances on one machine only need a socket path each, not a port each.
+"""
+
+import os, socket, stat, tempfile, getpass
+from pathlib import Path
+
+
+ENV_VAR = "HALOGEN_SOCKET"
+
+
+def unix_supported() -> bool:
+	return hasattr(socket, "AF_UNIX")
+
+
+def default_socket_path() -> Path:
+	"""
+	$XDG_RUNTIME_DIR/halogen.sock if there is a runtime directory (private to the user already),
+	else a private directory in the temp directory.
+	"""
+	runtime = os.environ.get("XDG_RUNTIME_DIR")
+	if runtime and os.path.isdir(runtime):
+		return Path(runtime) / "halogen.sock"
+
+	return fallback_dir() / "halogen.sock"
+
+
+def fallback_dir() -> Path:
+	uid = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+	return Path(tempfile.gettempdir()) / f"halogen-{uid}"
+
+
+def check_private(directory: Path):
+	"""
+	Raises PermissionError unless the directory is a real directory (not a symlink) of this user
+	that nobody else can get into. Anyone can make the fallback directory in the shared temp
+	directory first and then take over the socket in it.
+	"""
+	if not hasattr(os, "getuid"): return
+
+	st = os.lstat(directory)
+	if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+		raise PermissionError(f"{directory} is not a private directory of this user, refusing to use it.")
+
+
+def listen_unix(path: Path, mode: int = 0o600) -> socket.socket:
+	"""
+	Binds and listens on a unix socket. A file left behind at path by an instance that is no
+	longer running is replaced, one that still accepts connections raises FileExistsError.
+	Raises PermissionError if the fallback directory is not private (see check_private()).
+	"""
+	# only the owner can get to the socket until its own permissions are set
+	path.parent.mkdir(mode = 0o700, parents = True, exist_ok = True)
+	if path.parent == fallback_dir(): check_private(path.parent)
+
+	if path.exists():
+		if is_alive(path):
+			raise FileExistsError(f"Another server is listening on {path}.")
+		path.unlink()
+
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.bind(str(path))
+		os.chmod(path, mode)
+		sock.listen(socket.SOMAXCONN)
+	except OSError:
+		sock.close()
+		raise
+
+	return sock
+
+
+def is_trusted(path: Path) -> bool:
+	if path.parent != fallback_dir(): return True
+	try:
+		check_private(path.parent)
+		return True
+	except OSError:
+		return False
+
+
+def is_alive(path: Path) -> bool:
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(str(path))
+		return True
+	except OSError:
+		return False
+	finally:
+		probe.close()
+
+
+def open_connection(host: str, port: int, path: Path | None = None, timeout: float | None = None) -> socket.socket:
+	"""
+	Connects to the server. The unix socket is tried first: 'path', else $HALOGEN_SOCKET, else the
+	default path if it exists. If that fails (or unix sockets are not supported) TCP is used.
+	A socket in a fallback directory that is not private is never connected to.
+	Raises OSError if neither works.
+	"""
+	if path is None:
+		env = os.environ.get(ENV_VAR)
+		path = Path(env) if env else default_socket_path()
+
+	if unix_supported() and path.exists() and is_trusted(path):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(timeout)
+		try:
+			sock.connect(str(path))
+			return sock
+		except OSError:
+			sock.close()
+
+	sock = socket.create_connection((host, port), timeout)
+	sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	return sock
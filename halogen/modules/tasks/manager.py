@@ -1,3 +1,4 @@
+import time
 from collections.abc import Callable
 from typing import Tuple
 from halogen.base import (
@@ -6,6 +7,7 @@ from halogen.base import (
 	HalogenModule,
 	HalogenError,
 	HalogenCommand,
+	HalogenMetrics,
 	Chain
 )
 
@@ -23,6 +25,15 @@ class HalogenTaskManager(HalogenModule):
 	
 		super().__init__(emit_event, config)
 		self.namespaces: dict[str, TaskNamespace] = {}
+		self.execution = "worker" # tasks can do slow filesystem work
+
+		self.durations = HalogenMetrics.histogram(
+			"halogen_task_seconds",
+			"Time taken by task functions.",
+			("namespace", "task", "success"),
+			low = 10,
+			high = 36
+		)
 		
 	
 	@classmethod
@@ -120,6 +131,7 @@ class HalogenTaskManager(HalogenModule):
 			return
 
 		func = namespace.tasks[ev.task_name].func
+		start = time.perf_counter_ns()
 
 		try:
 			output = func(ev.chain, *ev.args)
@@ -131,6 +143,11 @@ class HalogenTaskManager(HalogenModule):
 			output = f"Unexpected Error({e.__class__.__name__}): {str(e)}"
 			success = False
 
+		self.durations.observe(
+			time.perf_counter_ns() - start,
+			(ev.namespace, ev.task_name, "true" if success else "false")
+		)
+
 		output_event = HalogenEvents.TaskCompletionEvent(
 			self.name(),
 			HalogenEvents.make_timestamp(),
@@ -153,7 +170,7 @@ class HalogenTaskManager(HalogenModule):
 		self.log(
 			HalogenEvents.chain(ev),
 			"debug" if success else "warning",
-			f"Executed task {ev.chain} {ev.namespace}::{ev.task_name} returned {output}"
+			lambda: f"Executed task {ev.chain} {ev.namespace}::{ev.task_name} returned {output}"
 		)
 
 